@@ -0,0 +1,135 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Projects and topology of a whole organization or folder from Cloud Asset Inventory, used when INVENTORY_BACKEND
+is "asset_inventory".
+
+One paged searchAllResources call returns active projects and resources of all entity extractors that declare
+asset types, instead of listing projects and calling every extractor for every project. Resource data of the
+search results is mapped by the extractors into the same entities they create from their list APIs.
+Extractors are still called for services without asset types and for projects with resources returned
+without data.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set, Text, Tuple
+
+from lib import json_codec
+from lib.configuration import config
+from lib.context import MetricsContext
+from lib.entities import entities_extractors
+from lib.entities.model import Entity
+from lib.metrics import GCPService
+
+PROJECT_ASSET_TYPE = "cloudresourcemanager.googleapis.com/Project"
+_ACTIVE_PROJECT_STATE = "ACTIVE"
+_SEARCH_PARAMS = [
+    ("pageSize", "500"),
+    ("readMask", "name,assetType,project,state,additionalAttributes,versionedResources"),
+]
+
+
+class AssetInventory:
+    def __init__(self, service_types: Iterable[str]) -> None:
+        self.project_ids: List[str] = []
+        self.service_types: Set[str] = set(service_types)
+        self._resources: Dict[Tuple[str, str], List[Dict[Text, Any]]] = {}
+        self._without_data: Set[Tuple[str, str]] = set()
+
+    def covers(self, project_id: str, service_name: str) -> bool:
+        return service_name in self.service_types and (project_id, service_name) not in self._without_data
+
+    def entities(self, project_id: str, svc_def: GCPService) -> List[Entity]:
+        resources = self._resources.get((project_id, svc_def.name), [])
+        return entities_extractors[svc_def.name].asset_mapper(resources, svc_def, project_id)
+
+    def add_results(self, results: List[Dict[Text, Any]]) -> None:
+        # Other resources refer to projects by number only
+        project_id_by_number = {}
+        for result in results:
+            if result.get("assetType") == PROJECT_ASSET_TYPE:
+                project_id = _project_id(result)
+                if project_id:
+                    project_id_by_number[result.get("project", "")] = project_id
+                    if result.get("state", _ACTIVE_PROJECT_STATE) == _ACTIVE_PROJECT_STATE:
+                        self.project_ids.append(project_id)
+
+        service_type_by_asset_type = {
+            asset_type: service_type
+            for service_type in self.service_types
+            for asset_type in entities_extractors[service_type].asset_types
+        }
+        for result in results:
+            service_type = service_type_by_asset_type.get(result.get("assetType"))
+            project_id = project_id_by_number.get(result.get("project", ""))
+            if not service_type or not project_id:
+                continue
+            data = _resource_data(result)
+            if data is None:
+                self._without_data.add((project_id, service_type))
+            else:
+                self._resources.setdefault((project_id, service_type), []).append(data)
+
+
+async def fetch_asset_inventory(context: MetricsContext, scope: str,
+                                services: Optional[List[GCPService]]) -> Optional[AssetInventory]:
+    """Search projects and entities in scope (e.g. organizations/123), None if the search failed."""
+    service_names = {service.name for service in services} if services is not None else set(entities_extractors)
+    service_types = [
+        service_type for service_type, extractor in entities_extractors.items()
+        if extractor.asset_types and extractor.asset_mapper and service_type in service_names
+    ]
+    asset_types = [PROJECT_ASSET_TYPE] + [
+        asset_type for service_type in service_types for asset_type in entities_extractors[service_type].asset_types
+    ]
+
+    url = f"{config.gcp_cloud_asset_url()}/{scope}:searchAllResources"
+    headers = context.create_gcp_request_headers(context.project_id_owner)
+    params = [("assetTypes", asset_type) for asset_type in asset_types] + _SEARCH_PARAMS
+    results = []
+    page_token = None
+    while True:
+        page_params = params + [("pageToken", page_token)] if page_token else params
+        resp = await context.gcp_session.request("GET", url=url, params=page_params, headers=headers)
+        try:
+            page = await resp.json(loads=json_codec.loads_api_response)
+        except Exception as e:
+            context.log(f"Failed to decode Cloud Asset Inventory response, using project and entity APIs instead. {e}")
+            return None
+        if resp.status != 200:
+            context.log(f"Failed to search Cloud Asset Inventory in {scope}, using project and entity APIs instead."
+                        f" Response: {page}")
+            return None
+
+        results.extend(page.get("results", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            break
+
+    inventory = AssetInventory(service_types)
+    inventory.add_results(results)
+    context.log(f"Cloud Asset Inventory search in {scope} found {len(inventory.project_ids)} active projects"
+                f" and {len(results) - len(inventory.project_ids)} other resources")
+    return inventory
+
+
+def _project_id(result: Dict[Text, Any]) -> Optional[str]:
+    data = _resource_data(result) or {}
+    return data.get("projectId") or result.get("additionalAttributes", {}).get("projectId")
+
+
+def _resource_data(result: Dict[Text, Any]) -> Optional[Dict[Text, Any]]:
+    versioned_resources = result.get("versionedResources", [])
+    for versioned_resource in versioned_resources:
+        if versioned_resource.get("version") == "v1":
+            return versioned_resource.get("resource")
+    return versioned_resources[0].get("resource") if versioned_resources else None
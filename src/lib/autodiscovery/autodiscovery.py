@@ -13,7 +13,7 @@ from lib.autodiscovery.autodiscovery_utils import (
     send_metric_metadata,
 )
 from lib.autodiscovery.models import AutodiscoveryResourceLinking, AutodiscoveryResult, ServiceStub
-from lib.clientsession_provider import init_dt_client_session, init_gcp_client_session
+from lib.clientsession_provider import connection_manager
 from lib.context import LoggingContext
 from lib.credentials import create_token
 from lib.metrics import AutodiscoveryGCPService, GCPService, Metric
@@ -21,7 +21,7 @@ from lib.utilities import (
     read_autodiscovery_block_list_yaml,
     read_autodiscovery_config_yaml,
 )
-from main import get_metric_context
+from lib.metric_context import get_metric_context
 
 
 class AutodiscoveryContext:
@@ -169,7 +169,7 @@ class AutodiscoveryContext:
             return None
 
         try:
-            async with init_gcp_client_session() as gcp_session, init_dt_client_session() as dt_session:
+            async with connection_manager.gcp_session() as gcp_session, connection_manager.dt_session() as dt_session:
                 token = await create_token(self.logging_context, gcp_session)
                 if not token:
                     logging_context.error(
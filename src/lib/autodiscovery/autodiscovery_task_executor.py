@@ -35,18 +35,14 @@ class AutodiscoveryTaskExecutor:
         services: List[GCPService],
         autodiscovery_manager: AutodiscoveryContext,
         current_extension_versions: Dict[str, str],
+        wait_for_first_autodiscovery: bool = True,
     ):
-        observer_list = []
-        init_task_finished = asyncio.Event()
-
-        observer_list.append(lambda: init_task_finished.set())
-
         autodiscovery_executor = AutodiscoveryTaskExecutor(
-            services, autodiscovery_manager, current_extension_versions, observer_list
+            services, autodiscovery_manager, current_extension_versions, []
         )
 
-        if autodiscovery_executor.is_task_running:
-            await init_task_finished.wait()
+        if autodiscovery_executor.is_task_running and wait_for_first_autodiscovery:
+            await autodiscovery_executor.first_autodiscovery_finished.wait()
 
         return autodiscovery_executor
 
@@ -73,7 +69,8 @@ class AutodiscoveryTaskExecutor:
         self.time_since_last_autodiscovery = datetime.now()
         self.lock = asyncio.Lock()
         self.notify_event = asyncio.Event()
-        self.observers = init_observer_list
+        self.first_autodiscovery_finished = asyncio.Event()
+        self.observers = init_observer_list + [self.first_autodiscovery_finished.set]
 
     def _notify_observers(self):
         while self.observers:
@@ -133,6 +130,10 @@ class AutodiscoveryTaskExecutor:
                 if self.autodiscovered_cached_service:
                     services = list(services)
                     services.append(self.autodiscovered_cached_service)
+                elif not self.first_autodiscovery_finished.is_set():
+                    logging_context.log(
+                        "First autodiscovery still running, polling without autodiscovered metrics."
+                    )
                 else:
                     logging_context.error(
                         "Autodiscovery couldn't find any metrics for the given resources."
@@ -12,6 +12,7 @@ from lib.credentials import get_all_accessible_projects
 from lib.gcp_apis import get_disabled_projects_and_disabled_apis_by_project_id
 from lib.metric_ingest import push_ingest_lines
 from lib.metrics import Dimension, GCPService, MetadataIngestLine, Metric
+from lib.replica_sharding import get_replica_shard
 
 logging_context = LoggingContext("AUTODISCOVERY")
 
@@ -31,6 +32,12 @@ label_mapping = {
     "zone": "gcp.region",
 }
 
+# Only the descriptor fields read by GCPMetricDescriptor.create
+_METRIC_DESCRIPTOR_FIELDS = (
+    "nextPageToken,metricDescriptors(type,metricKind,valueType,unit,displayName,description,labels/key,"
+    "metadata/ingestDelay,metadata/samplePeriod,monitoredResourceTypes,launchStage)"
+)
+
 
 async def get_project_ids(
     metric_context: MetricsContext,
@@ -38,6 +45,8 @@ async def get_project_ids(
     token: str,
 ) -> List[str]:
     projects_ids = await get_all_accessible_projects(metric_context, gcp_session, token)
+    # Every replica discovers metrics of the projects it polls
+    projects_ids = get_replica_shard().assigned_projects(projects_ids, config.metrics_scope_fan_in())
     disabled_projects = []
 
     if not config.scoping_project_support_enabled():
@@ -58,7 +67,7 @@ async def fetch_resource_descriptors(
     headers = {"Accept": "application/json", "Authorization": f"Bearer {token}"}
 
     for project_id in projects_id:
-        params = {}
+        params = {"fields": "type,labels/key"}
         resource_dimensions = {}
         for resource in resources:
             url = f"https://monitoring.googleapis.com/v3/projects/{project_id}/monitoredResourceDescriptors/{resource}"
@@ -129,7 +138,7 @@ async def run_fetch_metric_descriptors(
 ) -> List[FetchMetricDescriptorsResult]:
     headers = {"Accept": "application/json", "Authorization": f"Bearer {token}"}
     url = f"https://monitoring.googleapis.com/v3/projects/{project_id}/metricDescriptors"
-    params = {}
+    params = {"pageSize": 10000, "fields": _METRIC_DESCRIPTOR_FIELDS}
     if config.gcp_autodiscovery_fetch_active_metrics_only():
         params["activeOnly"] = "true"
 
@@ -175,6 +184,8 @@ async def send_metric_metadata(
     previously_discovered_metrics: Dict[str, Any],
 ) -> Dict[str, Any]:
     metrics_metadata = []
+    # Every replica sends metadata of the metrics discovered in its own projects, a metric may have data in the
+    # projects of one replica only. Metadata sent by several replicas is the same.
     for _, metrics_list in metrics.items():
         for metric in metrics_list:
             if metric.dynatrace_name not in previously_discovered_metrics:
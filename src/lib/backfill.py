@@ -0,0 +1,102 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Re-ingestion of a past time range, run by run_backfill.py.
+
+The range is split into chunks per project, fetched and pushed like a polling window, several chunks at once.
+Chunks pushed without dropped lines are recorded in a state file, a run with the same state file skips them.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Set
+
+from lib.checkpoints import CheckpointStore
+from lib.context import MetricsContext
+from lib.metrics import GCPService
+
+BackfillChunk = NamedTuple('BackfillChunk', [('project_id', str), ('start', datetime), ('end', datetime)])
+
+# fetch_and_push_window(context, project_id, services, disabled_apis, excluded_metrics_and_dimensions, start, end)
+FetchAndPushWindow = Callable[[MetricsContext, str, List[GCPService], Set[str], list, datetime, datetime],
+                              Awaitable[bool]]
+
+
+def plan_chunks(project_ids: List[str], start: datetime, end: datetime, chunk: timedelta) -> List[BackfillChunk]:
+    chunks = []
+    for project_id in project_ids:
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + chunk, end)
+            chunks.append(BackfillChunk(project_id, chunk_start, chunk_end))
+            chunk_start = chunk_end
+    return chunks
+
+
+class BackfillState:
+    """Chunks already pushed, kept in the store after every chunk."""
+
+    def __init__(self, store: CheckpointStore) -> None:
+        self.store = store
+        self._done: Dict[str, Dict[str, str]] = store.load()
+
+    @staticmethod
+    def _key(chunk: BackfillChunk) -> str:
+        return f"{chunk.project_id}/{chunk.start.isoformat()}/{chunk.end.isoformat()}"
+
+    def is_done(self, chunk: BackfillChunk) -> bool:
+        return self._key(chunk) in self._done
+
+    def mark_done(self, chunk: BackfillChunk) -> None:
+        self._done[self._key(chunk)] = {"finished_at": datetime.utcnow().isoformat()}
+        self.store.save(self._done)
+
+
+async def run_backfill(context: MetricsContext, chunks: List[BackfillChunk], services: List[GCPService],
+                       disabled_apis_by_project_id: Dict[str, Set[str]], excluded_metrics_and_dimensions: list,
+                       parallel_chunks: int, state: BackfillState,
+                       fetch_and_push_window: FetchAndPushWindow) -> List[BackfillChunk]:
+    """Returns the chunks that failed, running the backfill again retries them."""
+    pending = [chunk for chunk in chunks if not state.is_done(chunk)]
+    if len(pending) < len(chunks):
+        context.log(f"Skipping {len(chunks) - len(pending)} chunks finished by a previous run")
+
+    # Chunks fetch all their metrics concurrently, fewer chunks at once keep GCP quota usage and the
+    # Dynatrace ingest rate in check, fetches and pushes back off on 429 responses. Chunks with failed fetches
+    # are not marked done, a rerun retries them
+    semaphore = asyncio.Semaphore(max(parallel_chunks, 1))
+    start_time = time.time()
+    finished = 0
+    failed = []
+
+    async def run_chunk(chunk: BackfillChunk):
+        nonlocal finished
+        async with semaphore:
+            pushed = await fetch_and_push_window(context, chunk.project_id, services,
+                                                 disabled_apis_by_project_id.get(chunk.project_id, set()),
+                                                 excluded_metrics_and_dimensions, chunk.start, chunk.end)
+        finished += 1
+        if pushed:
+            state.mark_done(chunk)
+        else:
+            failed.append(chunk)
+            context.error(chunk.project_id, f"Backfill of {chunk.start} - {chunk.end} failed, rerun to retry it")
+
+        elapsed = time.time() - start_time
+        remaining = elapsed / finished * (len(pending) - finished)
+        context.log(f"Backfill progress: {finished}/{len(pending)} chunks, {len(failed)} failed, "
+                    f"elapsed {round(elapsed)}s, remaining about {round(remaining)}s")
+
+    await asyncio.gather(*[run_chunk(chunk) for chunk in pending])
+    return failed
@@ -0,0 +1,204 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Checkpoints of the pushed metric windows per project and service, kept between restarts.
+
+A checkpoint holds the end time up to which all windows were pushed. When a live window starts after it,
+because the process restarted or the execution time was hard reset, the missed windows between the two are
+fetched again ("backfilled") in chunks of CHECKPOINT_BACKFILL_CHUNK_MINUTES, after the live data of a polling.
+"""
+import glob
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from lib import metrics_workers
+from lib.configuration import config
+
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+_WORKER_FILE_SUFFIX = re.compile(r"\.\d+")
+
+
+class CheckpointStore(ABC):
+    """Backend of the checkpoints, other backends than a local file implement load() and save()."""
+
+    @abstractmethod
+    def load(self) -> Dict[str, Dict[str, str]]:
+        pass
+
+    @abstractmethod
+    def save(self, checkpoints: Dict[str, Dict[str, str]]) -> None:
+        pass
+
+
+class FileCheckpointStore(CheckpointStore):
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self) -> Dict[str, Dict[str, str]]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding="UTF-8") as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def save(self, checkpoints: Dict[str, Dict[str, str]]) -> None:
+        # A process killed while writing leaves the previous file
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="UTF-8") as checkpoint_file:
+            json.dump(checkpoints, checkpoint_file)
+        os.replace(temporary_path, self.path)
+
+
+class ProcessCheckpointStore(FileCheckpointStore):
+    """
+    File of one process, next to the files of the other metrics worker processes. All of them are loaded,
+    a project moved to another worker after METRICS_PARALLEL_PROCESSES changed keeps its checkpoints.
+    """
+
+    def __init__(self, base_path: str, path: str) -> None:
+        super().__init__(path)
+        self.base_path = base_path
+
+    def load(self) -> Dict[str, Dict[str, str]]:
+        worker_paths = [path for path in glob.glob(f"{glob.escape(self.base_path)}.*")
+                        if _WORKER_FILE_SUFFIX.fullmatch(path[len(self.base_path):])]
+        checkpoints: Dict[str, Dict[str, str]] = {}
+        for path in [self.base_path] + sorted(worker_paths):
+            for key, checkpoint_json in FileCheckpointStore(path).load().items():
+                # Files of earlier worker counts may still hold older checkpoints of a project
+                if key not in checkpoints or _latest_time(checkpoint_json) > _latest_time(checkpoints[key]):
+                    checkpoints[key] = checkpoint_json
+        return checkpoints
+
+
+def _latest_time(checkpoint_json: Dict[str, str]) -> str:
+    # Times of _TIME_FORMAT sort as strings
+    return max(checkpoint_json.values())
+
+
+class Checkpoint:
+    def __init__(self, pushed_until: datetime, live_since: Optional[datetime] = None,
+                 live_until: Optional[datetime] = None) -> None:
+        self.pushed_until = pushed_until
+        # First and last end time of the live windows pushed after a gap, set while it's backfilled
+        self.live_since = live_since
+        self.live_until = live_until
+
+    @property
+    def behind(self) -> bool:
+        return self.live_since is not None and self.pushed_until < self.live_since
+
+    def to_json(self) -> Dict[str, str]:
+        times = {"pushed_until": self.pushed_until, "live_since": self.live_since, "live_until": self.live_until}
+        return {name: time.strftime(_TIME_FORMAT) for name, time in times.items() if time is not None}
+
+    @staticmethod
+    def from_json(checkpoint_json: Dict[str, str]) -> "Checkpoint":
+        times = {name: datetime.strptime(time, _TIME_FORMAT) for name, time in checkpoint_json.items()}
+        return Checkpoint(**times)
+
+
+class Checkpoints:
+    def __init__(self, store: CheckpointStore, chunk_minutes: int, max_backfill_minutes: int) -> None:
+        self.store = store
+        self.chunk = timedelta(minutes=max(chunk_minutes, 1))
+        self.max_backfill = timedelta(minutes=max_backfill_minutes)
+        self._checkpoints: Optional[Dict[str, Checkpoint]] = None
+        # Live windows of the overlapping pollings still running, a gap they are pushing is not backfilled
+        self._running_live_starts: List[datetime] = []
+
+    @property
+    def checkpoints(self) -> Dict[str, Checkpoint]:
+        if self._checkpoints is None:
+            self._checkpoints = {key: Checkpoint.from_json(checkpoint_json)
+                                 for key, checkpoint_json in self.store.load().items()}
+        return self._checkpoints
+
+    def start_live_window(self, start: datetime) -> None:
+        self._running_live_starts.append(start)
+
+    def finish_live_window(self, start: datetime) -> None:
+        self._running_live_starts.remove(start)
+
+    def record_live(self, project_id: str, service_names: List[str], start: datetime, end: datetime) -> None:
+        for service_name in service_names:
+            key = f"{project_id}/{service_name}"
+            checkpoint = self.checkpoints.get(key)
+            if checkpoint is None:
+                # Nothing known from before, there is nothing to backfill
+                self.checkpoints[key] = Checkpoint(end)
+            elif checkpoint.behind and start <= checkpoint.pushed_until:
+                # Window of an older polling which finished after a newer one
+                self._push_until(key, checkpoint, end)
+            elif checkpoint.behind and start <= checkpoint.live_until:
+                checkpoint.live_until = max(checkpoint.live_until, end)
+            elif checkpoint.behind:
+                # Another gap before the first one is backfilled, only the latest one is backfilled
+                checkpoint.pushed_until = max(checkpoint.live_until, start - self.max_backfill)
+                checkpoint.live_since = start
+                checkpoint.live_until = end
+            elif start <= checkpoint.pushed_until:
+                checkpoint.pushed_until = max(checkpoint.pushed_until, end)
+            else:
+                checkpoint.live_since = start
+                checkpoint.live_until = end
+                # Older data can't be ingested anymore
+                checkpoint.pushed_until = max(checkpoint.pushed_until, start - self.max_backfill)
+
+    def record_backfill(self, project_id: str, service_names: List[str], end: datetime) -> None:
+        for service_name in service_names:
+            key = f"{project_id}/{service_name}"
+            self._push_until(key, self.checkpoints[key], end)
+
+    def _push_until(self, key: str, checkpoint: Checkpoint, end: datetime) -> None:
+        checkpoint.pushed_until = max(checkpoint.pushed_until, end)
+        if checkpoint.live_since is not None and not checkpoint.behind:
+            # Gap is closed
+            self.checkpoints[key] = Checkpoint(max(checkpoint.pushed_until, checkpoint.live_until))
+
+    def backfill_windows(self, project_id: str, service_names: List[str]) -> List[Tuple[datetime, datetime, List[str]]]:
+        """Next chunk to backfill of every service behind, services with the same chunk are fetched together."""
+        services_by_window: Dict[Tuple[datetime, datetime], List[str]] = {}
+        running_since = min(self._running_live_starts, default=None)
+        for service_name in service_names:
+            checkpoint = self.checkpoints.get(f"{project_id}/{service_name}")
+            if checkpoint and checkpoint.behind:
+                end = min(checkpoint.pushed_until + self.chunk, checkpoint.live_since)
+                if running_since is not None:
+                    end = min(end, running_since)
+                if end > checkpoint.pushed_until:
+                    services_by_window.setdefault((checkpoint.pushed_until, end), []).append(service_name)
+        return [(start, end, services) for (start, end), services in services_by_window.items()]
+
+    def save(self) -> None:
+        if self._checkpoints is not None:
+            self.store.save({key: checkpoint.to_json() for key, checkpoint in self._checkpoints.items()})
+
+
+@lru_cache(maxsize=1)
+def checkpoints_from_config() -> Optional[Checkpoints]:
+    """Checkpoints shared by all pollings of the process, None if CHECKPOINT_FILE is not configured."""
+    base_path = config.checkpoint_file()
+    if not base_path:
+        return None
+    path = base_path
+    if metrics_workers.is_worker():
+        # Worker processes poll different projects and would overwrite each other's file
+        path = f"{base_path}.{metrics_workers.worker_index()}"
+    return Checkpoints(ProcessCheckpointStore(base_path, path), config.checkpoint_backfill_chunk_minutes(),
+                       config.checkpoint_backfill_max_minutes())
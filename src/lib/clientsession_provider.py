@@ -12,11 +12,15 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Set
 
 import aiohttp
 
 from lib.configuration import config
 from lib.configuration.config import get_int_environment_value
+from lib.context import LoggingContext
 from lib.sfm.api_call_latency import ApiCallLatency
 
 
@@ -38,6 +42,11 @@ _REQUEST_TIMEOUT_TOTAL = get_int_environment_value("REQUEST_TIMEOUT_TOTAL", 120)
 _REQUEST_TIMEOUT_SOCK_CONNECT = get_int_environment_value("REQUEST_TIMEOUT_SOCK_CONNECT", 30)
 _REQUEST_TIMEOUT_SOCK_READ = get_int_environment_value("REQUEST_TIMEOUT_SOCK_READ", 60)
 _GCP_CONNECTOR_LIMIT = get_int_environment_value("GCP_CONNECTOR_LIMIT", 500)
+_DT_CONNECTOR_LIMIT = get_int_environment_value("DT_CONNECTOR_LIMIT", 100)
+_GCP_CONNECTOR_LIMIT_PER_HOST = get_int_environment_value("GCP_CONNECTOR_LIMIT_PER_HOST", 0)
+_HTTP_KEEPALIVE_TIMEOUT = get_int_environment_value("HTTP_KEEPALIVE_TIMEOUT", 60)
+_HTTP_DNS_CACHE_TTL = get_int_environment_value("HTTP_DNS_CACHE_TTL", 300)
+_HTTP_SESSION_RECREATE_AFTER_ERRORS = get_int_environment_value("HTTP_SESSION_RECREATE_AFTER_ERRORS", 5)
 
 _default_timeout = aiohttp.ClientTimeout(
     total=_REQUEST_TIMEOUT_TOTAL,
@@ -47,21 +56,172 @@ _default_timeout = aiohttp.ClientTimeout(
 )
 
 
-def init_dt_client_session() -> aiohttp.ClientSession:
-    connector = aiohttp.TCPConnector(enable_cleanup_closed=True)
+def init_dt_client_session(extra_trace_configs: Sequence[aiohttp.TraceConfig] = ()) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        enable_cleanup_closed=True,
+        limit=_DT_CONNECTOR_LIMIT,
+        keepalive_timeout=_HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=_HTTP_DNS_CACHE_TTL,
+    )
     return aiohttp.ClientSession(
         connector=connector,
         timeout=_default_timeout,
-        trace_configs=[trace_config],
+        trace_configs=[trace_config, *extra_trace_configs],
         trust_env=(config.use_proxy() in ["ALL", "DT_ONLY"]),
     )
 
 
-def init_gcp_client_session() -> aiohttp.ClientSession:
-    connector = aiohttp.TCPConnector(enable_cleanup_closed=True, limit=_GCP_CONNECTOR_LIMIT)
+def init_gcp_client_session(extra_trace_configs: Sequence[aiohttp.TraceConfig] = ()) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        enable_cleanup_closed=True,
+        limit=_GCP_CONNECTOR_LIMIT,
+        limit_per_host=_GCP_CONNECTOR_LIMIT_PER_HOST,
+        keepalive_timeout=_HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=_HTTP_DNS_CACHE_TTL,
+    )
     return aiohttp.ClientSession(
         connector=connector,
         timeout=_default_timeout,
-        trace_configs=[trace_config],
+        trace_configs=[trace_config, *extra_trace_configs],
         trust_env=(config.use_proxy() in ["ALL", "GCP_ONLY"]),
     )
+
+
+class _PooledSession:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.leases = 0
+        self.consecutive_errors = 0
+        self.retired = False
+
+
+class ConnectionManager:
+    """
+    GCP and Dynatrace sessions kept open between polling cycles, so cycles reuse pooled keep-alive connections
+    and cached DNS lookups instead of connecting and handshaking with the same hosts again.
+
+    A session is replaced after recreate_after_errors consecutive connection errors or when it got closed,
+    the replaced one is closed when its last user releases it. With enabled=False every use gets its own
+    session, closed at the end of the use.
+    """
+
+    def __init__(self, session_factories: Dict[str, Callable[[List[aiohttp.TraceConfig]], aiohttp.ClientSession]],
+                 enabled: bool = True, recreate_after_errors: int = _HTTP_SESSION_RECREATE_AFTER_ERRORS) -> None:
+        self.enabled = enabled
+        self.recreate_after_errors = recreate_after_errors
+        self._session_factories = session_factories
+        self._pools: Dict[str, _PooledSession] = {}
+        # The loop keeps only weak references to tasks
+        self._closing_sessions: Set[asyncio.Task] = set()
+        self.recreated_sessions: Dict[str, int] = defaultdict(int)
+
+    def gcp_session(self):
+        return self.session("gcp")
+
+    def dt_session(self):
+        return self.session("dt")
+
+    @asynccontextmanager
+    async def session(self, name: str) -> AsyncIterator[aiohttp.ClientSession]:
+        if not self.enabled:
+            async with self._session_factories[name]([]) as session:
+                yield session
+            return
+
+        pooled = self._acquire(name)
+        try:
+            yield pooled.session
+        finally:
+            pooled.leases -= 1
+            if pooled.retired and pooled.leases == 0:
+                await pooled.session.close()
+
+    async def close(self) -> None:
+        pools, self._pools = self._pools, {}
+        for pooled in pools.values():
+            pooled.retired = True
+            if pooled.leases == 0 and pooled.loop is asyncio.get_running_loop():
+                await pooled.session.close()
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Connections per host of the shared sessions: in use, idle in the pool and limits."""
+        stats = {}
+        for name, pooled in list(self._pools.items()):
+            connector = pooled.session.connector
+            hosts = defaultdict(lambda: {"in_use": 0, "idle": 0})
+            # The connector doesn't expose its pools per host
+            for key, connections in list(getattr(connector, "_conns", {}).items()):
+                hosts[f"{key.host}:{key.port}"]["idle"] = len(connections)
+            for key, connections in list(getattr(connector, "_acquired_per_host", {}).items()):
+                hosts[f"{key.host}:{key.port}"]["in_use"] = len(connections)
+            stats[name] = {
+                "limit": connector.limit,
+                "limit_per_host": connector.limit_per_host,
+                "leases": pooled.leases,
+                "consecutive_errors": pooled.consecutive_errors,
+                "recreated": self.recreated_sessions[name],
+                "hosts": dict(hosts),
+            }
+        return stats
+
+    def log_pool_stats(self, context: LoggingContext) -> None:
+        for name, stats in self.pool_stats().items():
+            hosts = ", ".join(f"{host}: in use {host_stats['in_use']}, idle {host_stats['idle']}"
+                              for host, host_stats in stats["hosts"].items())
+            context.log(f"Connection pool {name}: recreated {stats['recreated']} times, hosts: [{hosts}]")
+
+    def _acquire(self, name: str) -> _PooledSession:
+        loop = asyncio.get_running_loop()
+        pooled = self._pools.get(name)
+        if pooled is not None and (pooled.retired or pooled.session.closed or pooled.loop is not loop):
+            if pooled.loop is loop:
+                self.recreated_sessions[name] += 1
+                if pooled.leases == 0 and not pooled.session.closed:
+                    closing = asyncio.create_task(pooled.session.close())
+                    self._closing_sessions.add(closing)
+                    closing.add_done_callback(self._closing_sessions.discard)
+            # Sessions of an earlier event loop can't be used or closed anymore, they are dropped
+            pooled = None
+
+        if pooled is None:
+            pooled = _PooledSession(loop)
+            pooled.session = self._session_factories[name]([self._error_tracking(pooled)])
+            self._pools[name] = pooled
+        pooled.leases += 1
+        return pooled
+
+    def _error_tracking(self, pooled: _PooledSession) -> aiohttp.TraceConfig:
+        async def on_request_end(session, trace_config_ctx, params):
+            pooled.consecutive_errors = 0
+
+        async def on_request_exception(session, trace_config_ctx, params):
+            if isinstance(params.exception, aiohttp.ClientConnectionError):
+                pooled.consecutive_errors += 1
+                if pooled.consecutive_errors >= self.recreate_after_errors > 0:
+                    pooled.retired = True
+
+        error_tracking = aiohttp.TraceConfig()
+        error_tracking.on_request_end.append(on_request_end)
+        error_tracking.on_request_exception.append(on_request_exception)
+        return error_tracking
+
+
+async def prewarm_connections(session: aiohttp.ClientSession, url: str, connections: int) -> None:
+    """Open connections to the host of url in the background, before the requests needing them are sent."""
+    async def open_connection():
+        try:
+            async with session.head(url, allow_redirects=False):
+                pass
+        except Exception:
+            # The requests will connect on their own
+            pass
+
+    if url and connections > 0:
+        await asyncio.gather(*[open_connection() for _ in range(connections)])
+
+
+connection_manager = ConnectionManager(
+    session_factories={"gcp": init_gcp_client_session, "dt": init_dt_client_session},
+    enabled=config.shared_http_sessions(),
+)
@@ -37,6 +37,59 @@ def scoping_project_support_enabled():
     return os.environ.get("SCOPING_PROJECT_SUPPORT_ENABLED", "FALSE").upper() in ["TRUE", "YES"]
 
 
+def metrics_scope_fan_in():
+    return scoping_project_support_enabled() and \
+        os.environ.get("METRICS_SCOPE_FAN_IN", "FALSE").upper() in ["TRUE", "YES"]
+
+
+def cumulative_server_side_reduction():
+    return os.environ.get("CUMULATIVE_SERVER_SIDE_REDUCTION", "FALSE").upper() in ["TRUE", "YES"]
+
+
+def labels_grouping_single_query():
+    return os.environ.get("LABELS_GROUPING_SINGLE_QUERY", "FALSE").upper() in ["TRUE", "YES"]
+
+
+def metric_sharding_page_threshold():
+    return get_int_environment_value("METRIC_SHARDING_PAGE_THRESHOLD", 0)
+
+
+def metric_sharding_max_shards():
+    return get_int_environment_value("METRIC_SHARDING_MAX_SHARDS", 8)
+
+
+def topology_cache_ttl_seconds():
+    return get_int_environment_value("TOPOLOGY_CACHE_TTL_SECONDS", 0)
+
+
+def project_list_cache_ttl_seconds():
+    return get_int_environment_value("PROJECT_LIST_CACHE_TTL_SECONDS", 0)
+
+
+def disabled_apis_cache_ttl_seconds():
+    return get_int_environment_value("DISABLED_APIS_CACHE_TTL_SECONDS", 0)
+
+
+def user_project_header_cache_ttl_seconds():
+    return get_int_environment_value("USER_PROJECT_HEADER_CACHE_TTL_SECONDS", 0)
+
+
+def token_refresh_margin_seconds():
+    return get_int_environment_value("TOKEN_REFRESH_MARGIN_SECONDS", 300)
+
+
+def secret_cache_ttl_seconds():
+    return get_int_environment_value("SECRET_CACHE_TTL_SECONDS", 0)
+
+
+def gce_topology_filter():
+    return os.environ.get("GCE_TOPOLOGY_FILTER", "")
+
+
+def topology_cache_stale_while_revalidate_seconds():
+    return get_int_environment_value("TOPOLOGY_CACHE_STALE_WHILE_REVALIDATE_SECONDS", 3600)
+
+
 def query_interval_min():
     return os.environ.get('QUERY_INTERVAL_MIN', None)
 
@@ -93,6 +146,18 @@ def gcp_cloud_resource_manager_url():
     return os.environ.get('GCP_CLOUD_RESOURCE_MANAGER_URL', 'https://cloudresourcemanager.googleapis.com/v1')
 
 
+def gcp_cloud_asset_url():
+    return os.environ.get("GCP_CLOUD_ASSET_URL", "https://cloudasset.googleapis.com/v1")
+
+
+def inventory_backend():
+    return os.environ.get("INVENTORY_BACKEND", "api").lower()
+
+
+def asset_inventory_scope():
+    return os.environ.get("ASSET_INVENTORY_SCOPE", "")
+
+
 def gcp_service_usage_url():
     return os.environ.get("GCP_SERVICE_USAGE_URL", "https://serviceusage.googleapis.com/v1")
 
@@ -101,6 +166,86 @@ def gcp_monitoring_url():
     return os.environ.get("GCP_MONITORING_URL", "https://monitoring.googleapis.com/v3")
 
 
+def gcp_prometheus_url():
+    return os.environ.get("GCP_PROMETHEUS_URL", "https://monitoring.googleapis.com/v1")
+
+
+def gcp_json_streaming():
+    return os.environ.get("GCP_JSON_STREAMING", "FALSE").upper() in ["TRUE", "YES"]
+
+
+def shared_http_sessions():
+    return os.environ.get("SHARED_HTTP_SESSIONS", "TRUE").upper() in ["TRUE", "YES"]
+
+
+def prewarm_dynatrace_connections():
+    return os.environ.get("PREWARM_DYNATRACE_CONNECTIONS", "TRUE").upper() in ["TRUE", "YES"]
+
+
+def max_concurrent_pollings():
+    return get_int_environment_value("MAX_CONCURRENT_POLLINGS", 1)
+
+
+def metrics_parallel_processes():
+    return get_int_environment_value("METRICS_PARALLEL_PROCESSES", 1)
+
+
+def shard_count():
+    return get_int_environment_value("SHARD_COUNT", 1)
+
+
+def shard_index():
+    return os.environ.get("SHARD_INDEX", "")
+
+
+def checkpoint_file():
+    return os.environ.get("CHECKPOINT_FILE", "")
+
+
+def checkpoint_backfill_chunk_minutes():
+    return get_int_environment_value("CHECKPOINT_BACKFILL_CHUNK_MINUTES", 15)
+
+
+def checkpoint_backfill_max_minutes():
+    return get_int_environment_value("CHECKPOINT_BACKFILL_MAX_MINUTES", 55)
+
+
+def polling_push_reserve_seconds():
+    return get_int_environment_value("POLLING_PUSH_RESERVE_SECONDS", 30)
+
+
+def normal_priority_shed_seconds():
+    return get_int_environment_value("NORMAL_PRIORITY_SHED_SECONDS", 60)
+
+
+def project_fetch_deadline_seconds():
+    return get_int_environment_value("PROJECT_FETCH_DEADLINE_SECONDS", 0)
+
+
+def service_fetch_deadline_seconds():
+    return get_int_environment_value("SERVICE_FETCH_DEADLINE_SECONDS", 0)
+
+
+def critical_projects():
+    return os.environ.get("CRITICAL_PROJECTS", "")
+
+
+def critical_services():
+    return os.environ.get("CRITICAL_SERVICES", "")
+
+
+def metrics_fetch_backend():
+    return os.environ.get("METRICS_FETCH_BACKEND", "rest").lower()
+
+
+def gcp_monitoring_grpc_target():
+    return os.environ.get("GCP_MONITORING_GRPC_TARGET", "monitoring.googleapis.com:443")
+
+
+def gcp_monitoring_grpc_insecure():
+    return os.environ.get("GCP_MONITORING_GRPC_INSECURE", "FALSE").upper() in ["TRUE", "YES"]
+
+
 def gcp_allowed_metric_dimension_value_length():
     return get_int_environment_value("ALLOWED_METRIC_DIMENSION_VALUE_LENGTH", 250)
 
@@ -66,6 +66,10 @@ def get_query_interval_minutes() -> int:
     return query_interval_min
 
 
+def get_query_timeout_seconds() -> int:
+    return (get_query_interval_minutes() + 2) * 60
+
+
 class LoggingContext:
     def __init__(self, *scheduled_execution_id ):
         self.scheduled_execution_id: str = '[' + ']['.join(scheduled_execution_id) + ']' if scheduled_execution_id and any(scheduled_execution_id) else ""
@@ -312,6 +316,8 @@ class MetricsContext(SfmContext):
             SfmKeys.fetch_gcp_data_execution_time: SFMMetricFetchGCPDataExecutionTime(),
             SfmKeys.push_to_dynatrace_execution_time: SFMMetricPushToDynatraceExecutionTime(),
             SfmKeys.dynatrace_request_count: SFMMetricDynatraceRequestCount(),
+            SfmKeys.shed_fetch_tasks: SFMMetricShedFetchTasks(),
+            SfmKeys.failed_fetch_tasks: SFMMetricFailedFetchTasks(),
         }
         self.dynatrace_connectivity = None
         self.dt_session = dt_session
@@ -322,6 +328,12 @@ class MetricsContext(SfmContext):
         self.metric_ingest_batch_size = config.get_int_environment_value("METRIC_INGEST_BATCH_SIZE", 3000)
         self.metric_ingest_concurrent_pushes = config.get_int_environment_value("METRIC_INGEST_CONCURRENT_PUSHES", 1)
         self.use_x_goog_user_project_header = {project_id_owner: False}
+        # lib.asset_inventory.AssetInventory of the polling when INVENTORY_BACKEND is "asset_inventory"
+        self.asset_inventory = None
+        # lib.polling_deadlines.PollingDeadlines of the polling, None without configured deadlines
+        self.polling_deadlines = None
+        # lib.checkpoints.Checkpoints of the pushed windows, None without CHECKPOINT_FILE
+        self.checkpoints = None
 
         self.update_dt_connectivity_status(DynatraceConnectivity.Ok)
         self.start_processing_timestamp = 0
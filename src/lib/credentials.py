@@ -17,6 +17,7 @@ import base64
 import json
 import os
 import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
 from urllib.parse import urlparse
 
 import jwt
@@ -24,6 +25,7 @@ from aiohttp import ClientSession
 
 from lib.configuration import config
 from lib.context import LoggingContext
+from lib.utilities import is_running_in_current_loop
 
 
 _METADATA_ROOT = config.gcp_metadata_url()
@@ -38,6 +40,8 @@ _DYNATRACE_ACCESS_KEY_SECRET_NAME = config.dynatrace_access_key_secret_name() or
 _DYNATRACE_URL_SECRET_NAME = config.dynatrace_url_secret_name() or "DYNATRACE_URL"
 _DYNATRACE_LOG_INGEST_URL_SECRET_NAME = config.dynatrace_log_ingest_url_secret_name()
 
+_DEFAULT_TOKEN_LIFETIME_SECONDS = 3600
+
 
 async def _read_json_file_async(file_path: str) -> dict:
     """Asynchronously read and parse a JSON file."""
@@ -94,18 +98,7 @@ async def fetch_dynatrace_log_ingest_url(gcp_session: ClientSession, project_id:
     return urlparse(dynatrace_log_ingest_url.rstrip("/") + "/api/v2/logs/ingest").geturl()
 
 async def fetch_secret(secret_name: str, session: ClientSession, project_id: str, token: str) -> str:
-    url = _MANAGER_ROOT + "/projects/{project_id}/secrets/{secret_name}/versions/latest:access" \
-        .format(project_id=project_id, secret_name=secret_name)
-
-    headers = {"Authorization": "Bearer {token}".format(token=token)}
-    response = await session.get(url, headers=headers)
-    response_json = await response.json()
-
-    if response.status == 200:
-        return base64.b64decode(response_json['payload']['data']).decode('utf-8')
-    else:
-        raise Exception("Failed to fetch secret {name}, cause: {response_json}"
-                        .format(name=secret_name, response_json=response_json))
+    return await credential_provider.get_secret(secret_name, session, project_id, token)
 
 
 async def create_default_service_account_token(context: LoggingContext, session: ClientSession):
@@ -114,27 +107,11 @@ async def create_default_service_account_token(context: LoggingContext, session:
     :param session:
     :return: access_token string, or None if failed
     """
-    url = _METADATA_ROOT + "/instance/service-accounts/{0}/token".format("default")
-    try:
-        response = await session.get(url, headers=_METADATA_HEADERS)
-        if response.status >= 300:
-            body = await response.text()
-            context.log(f"Failed to authorize with Service Account from Metadata Service, "
-                        f"response is {response.status} => {body}")
-            return None
-        response_json = await response.json()
-        return response_json["access_token"]
-    except Exception as e:
-        context.log(f"Failed to authorize with Service Account from Metadata Service due to '{e}'")
-        return None
+    response_json = await _fetch_default_service_account_token(context, session)
+    return response_json["access_token"] if response_json else None
 
 
-async def create_default_service_account_token_with_expiry(context: LoggingContext, session: ClientSession):
-    """
-    Enhanced version that returns token with expiration information for proactive refresh
-    :param session:
-    :return: dictionary with access_token and expires_at timestamp, or None if failed
-    """
+async def _fetch_default_service_account_token(context: LoggingContext, session: ClientSession):
     url = _METADATA_ROOT + "/instance/service-accounts/{0}/token".format("default")
     try:
         response = await session.get(url, headers=_METADATA_HEADERS)
@@ -144,48 +121,23 @@ async def create_default_service_account_token_with_expiry(context: LoggingConte
                         f"response is {response.status} => {body}")
             return None
         response_json = await response.json()
-        
-        # Validate response structure
         if "access_token" not in response_json:
             context.log("Invalid response from Metadata Service: missing access_token")
             return None
-            
-        # Calculate expiration time with robust fallback
-        expires_in = response_json.get("expires_in", 3600)
-        if not isinstance(expires_in, (int, float)) or expires_in <= 0:
-            context.log(f"Invalid expires_in value: {expires_in}, using default 3600 seconds")
-            expires_in = 3600
-            
-        # Use 10 minutes buffer for safety, but ensure we don't set negative expiration
-        buffer = min(600, expires_in // 2)  # Max 10 min buffer, but no more than half the token lifetime
-        expires_at = time.time() + expires_in - buffer
-
-        context.log(f"Using service account token with expiry info, expires_at={expires_at}")
-        return {
-            "access_token": response_json["access_token"],
-            "expires_at": expires_at
-        }
+        return response_json
     except Exception as e:
         context.log(f"Failed to authorize with Service Account from Metadata Service due to '{e}'")
         return None
 
 
-async def create_token(context: LoggingContext, session: ClientSession, validate: bool = False):
-    credentials_path = config.credentials_path()
-
-    if credentials_path:
-        context.log(f"Using credentials from {credentials_path}")
-        credentials_data = await _read_json_file_async(credentials_path)
-
-        gcp_token = await get_token(
-            key=credentials_data['private_key'],
-            service=credentials_data['client_email'],
-            uri=credentials_data['token_uri'],
-            session=session
-        )
-    else:
-        context.log("Trying to use default service account")
-        gcp_token = await create_default_service_account_token(context, session)
+async def create_token(context: LoggingContext, session: ClientSession, validate: bool = False,
+                       valid_for_seconds: int = 0):
+    """
+    :param valid_for_seconds: how long the token must stay valid, e.g. the timeout of a polling cycle using it.
+        Cached tokens expiring sooner are refreshed ahead of time.
+    """
+    token = await credential_provider.get_token(context, session, valid_for_seconds)
+    gcp_token = token.value if token else None
 
     if validate:
         if gcp_token is None:
@@ -199,48 +151,27 @@ async def create_token(context: LoggingContext, session: ClientSession, validate
 
 
 async def create_token_with_expiry(context: LoggingContext, session: ClientSession, validate: bool = False):
-    # Enhanced version that returns token with expiration information for proactive refresh.
-    # Only used by components that need proactive token refresh.
-    credentials_path = config.credentials_path()
-
-    if credentials_path:
-        context.log(f"Using credentials from {credentials_path}")
-        credentials_data = await _read_json_file_async(credentials_path)
-
-        # Service account tokens from files typically last 1 hour
-        token = await get_token(
-            key=credentials_data['private_key'],
-            service=credentials_data['client_email'],
-            uri=credentials_data['token_uri'],
-            session=session
-        )
-        expires_at = time.time() + 3000  # 50 minutes for safety
-        context.log(f"Using service account token with expiry info, expires_at={expires_at}")
-        return {
-            "access_token": token,
-            "expires_at": expires_at
-        }
+    # Returns token with expiration information for proactive refresh.
+    # expires_at is the time the cached token is refreshed, so asking again after it gives a new token.
+    token = await credential_provider.get_token(context, session)
 
-    else:
-        context.log("Trying to use default service account")
-        token_info = await create_default_service_account_token_with_expiry(context, session)
-        
-        if validate:
-            if token_info is None:
-                raise Exception("Failed to fetch access token. No value")
-            if not isinstance(token_info, dict) or 'access_token' not in token_info:
-                token_info_description = f"type={type(token_info).__name__}"
-                if isinstance(token_info, dict):
-                    token_info_description += f", keys={list(token_info.keys())}"
-                raise Exception(
-                    "Failed to fetch access token. Got invalid token info structure: "
-                    + token_info_description
-                )
-        
-        return token_info
+    if validate and token is None:
+        raise Exception("Failed to fetch access token. No value")
+    if token is None:
+        return None
+
+    return {
+        "access_token": token.value,
+        "expires_at": token.expires_at - credential_provider.token_refresh_margin_seconds
+    }
 
 
 async def get_token(key: str, service: str, uri: str, session: ClientSession):
+    response = await _request_token(key, service, uri, session)
+    return response["access_token"]
+
+
+async def _request_token(key: str, service: str, uri: str, session: ClientSession):
     now = int(time.time())
 
     assertion = {
@@ -253,15 +184,118 @@ async def get_token(key: str, service: str, uri: str, session: ClientSession):
     assertion_signed = jwt.encode(assertion, key, 'RS256')
     request = {'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer', 'assertion': assertion_signed}
     async with session.post(uri, data=request) as resp:
-        response = await resp.json()
-        return response["access_token"]
+        return await resp.json()
+
+
+class _CachedValue:
+    def __init__(self, value: Any, expires_at: float) -> None:
+        self.value = value
+        self.expires_at = expires_at
+
+
+class CredentialProvider:
+    """
+    Access tokens and secrets shared by all components of the process.
+
+    Tokens are kept until token_refresh_margin_seconds before they expire and secrets for secret_ttl_seconds.
+    Concurrent callers missing the same value wait for one request instead of sending their own.
+    """
+
+    def __init__(self, token_refresh_margin_seconds: int, secret_ttl_seconds: int,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.token_refresh_margin_seconds = token_refresh_margin_seconds
+        self.secret_ttl_seconds = secret_ttl_seconds
+        self._clock = clock
+        self._values: Dict[Hashable, _CachedValue] = {}
+        self._requests: Dict[Hashable, asyncio.Task] = {}
+
+    async def get_token(self, context: LoggingContext, session: ClientSession,
+                        valid_for_seconds: int = 0) -> Optional[_CachedValue]:
+        """Token with expires_at, None if it couldn't be fetched."""
+        key = ("token", config.credentials_path())
+        token = self._values.get(key)
+        if token and token.expires_at - self._clock() > self.token_refresh_margin_seconds + valid_for_seconds:
+            return token
+        return await self._single_flight(key, lambda: self._fetch_token(context, session))
+
+    async def get_secret(self, secret_name: str, session: ClientSession, project_id: str, token: str) -> str:
+        key = ("secret", project_id, secret_name)
+        secret = self._values.get(key)
+        if secret and secret.expires_at > self._clock():
+            return secret.value
+        secret = await self._single_flight(key, lambda: self._fetch_secret(secret_name, session, project_id, token))
+        return secret.value
+
+    def invalidate_token(self, access_token: str) -> None:
+        """Drop a token rejected by an API before it expires, e.g. revoked."""
+        for key, value in list(self._values.items()):
+            if key[0] == "token" and value.value == access_token:
+                self._values.pop(key, None)
+
+    async def _single_flight(self, key: Hashable, fetch: Callable[[], Awaitable[Optional[_CachedValue]]]):
+        request = self._requests.get(key)
+        if not is_running_in_current_loop(request):
+            request = asyncio.create_task(self._fetch_and_keep(key, fetch))
+            self._requests[key] = request
+        # A cancelled caller, e.g. a timed out polling cycle, doesn't cancel the request of the others
+        return await asyncio.shield(request)
+
+    async def _fetch_and_keep(self, key: Hashable, fetch: Callable[[], Awaitable[Optional[_CachedValue]]]):
+        value = await fetch()
+        if value is not None and value.expires_at > self._clock():
+            self._values[key] = value
+        return value
+
+    async def _fetch_token(self, context: LoggingContext, session: ClientSession) -> Optional[_CachedValue]:
+        credentials_path = config.credentials_path()
+        if credentials_path:
+            context.log(f"Using credentials from {credentials_path}")
+            credentials_data = await _read_json_file_async(credentials_path)
+            response_json = await _request_token(
+                key=credentials_data['private_key'],
+                service=credentials_data['client_email'],
+                uri=credentials_data['token_uri'],
+                session=session
+            )
+        else:
+            context.log("Trying to use default service account")
+            response_json = await _fetch_default_service_account_token(context, session)
+            if response_json is None:
+                return None
+
+        expires_in = response_json.get("expires_in", _DEFAULT_TOKEN_LIFETIME_SECONDS)
+        if not isinstance(expires_in, (int, float)) or expires_in <= 0:
+            context.log(f"Invalid expires_in value: {expires_in}, using default {_DEFAULT_TOKEN_LIFETIME_SECONDS} seconds")
+            expires_in = _DEFAULT_TOKEN_LIFETIME_SECONDS
+        return _CachedValue(response_json["access_token"], self._clock() + expires_in)
+
+    async def _fetch_secret(self, secret_name: str, session: ClientSession, project_id: str, token: str) -> _CachedValue:
+        url = _MANAGER_ROOT + "/projects/{project_id}/secrets/{secret_name}/versions/latest:access" \
+            .format(project_id=project_id, secret_name=secret_name)
+
+        headers = {"Authorization": "Bearer {token}".format(token=token)}
+        response = await session.get(url, headers=headers)
+        response_json = await response.json()
+
+        if response.status == 200:
+            secret = base64.b64decode(response_json['payload']['data']).decode('utf-8')
+            return _CachedValue(secret, self._clock() + self.secret_ttl_seconds)
+        else:
+            raise Exception("Failed to fetch secret {name}, cause: {response_json}"
+                            .format(name=secret_name, response_json=response_json))
+
+
+credential_provider = CredentialProvider(
+    token_refresh_margin_seconds=config.token_refresh_margin_seconds(),
+    secret_ttl_seconds=config.secret_cache_ttl_seconds(),
+)
 
 
 async def get_all_accessible_projects(context: LoggingContext, session: ClientSession, token: str):
     url = _CLOUD_RESOURCE_MANAGER_ROOT + "/projects"
     headers = {"Authorization": "Bearer {token}".format(token=token)}
     all_projects = []
-    params = {"filter": "lifecycleState:ACTIVE"}
+    params = {"filter": "lifecycleState:ACTIVE", "pageSize": 1000, "fields": "nextPageToken,projects/projectId"}
 
     while True:
         response = await session.get(url, headers=headers, params=params)
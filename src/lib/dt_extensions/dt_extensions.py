@@ -2,7 +2,7 @@ from typing import Dict, Optional, List
 
 from aiohttp import ClientSession
 
-from lib.clientsession_provider import init_gcp_client_session, init_dt_client_session
+from lib.clientsession_provider import connection_manager
 from lib.configuration import config
 from lib.context import LoggingContext
 from lib.credentials import fetch_dynatrace_url, fetch_dynatrace_api_key, create_token
@@ -14,7 +14,7 @@ logging_context = LoggingContext("EXTENSIONS")
 
 async def prepare_services_config_for_next_polling(current_services: List[GCPService], current_extension_versions: Dict[str,str]) -> ExtensionsFetchResult:
     try:
-        async with init_gcp_client_session() as gcp_session, init_dt_client_session() as dt_session:
+        async with connection_manager.gcp_session() as gcp_session, connection_manager.dt_session() as dt_session:
             token = await create_token(logging_context, gcp_session)
             if not token:
                 raise Exception('Failed to fetch token')
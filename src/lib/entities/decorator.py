@@ -15,22 +15,25 @@
 #     limitations under the License.
 
 from functools import wraps
-from typing import Dict, Iterable, Text
+from typing import Dict, Iterable, Optional, Text, Tuple
 
 from lib.context import MetricsContext
-from lib.entities.model import Entity, ExtractEntitiesFunc, EntitiesExtractorData
+from lib.entities.model import Entity, ExtractEntitiesFunc, EntitiesExtractorData, MapAssetsFunc
 from lib.metrics import GCPService
 
 entities_extractors: Dict[Text, EntitiesExtractorData] = {}
 
 
-def entity_extractor(service_type: Text, service_api: Text):
+def entity_extractor(service_type: Text, service_api: Text, asset_types: Tuple[Text, ...] = (),
+                     asset_mapper: Optional[MapAssetsFunc] = None):
     """
     Denotes a function responsible for extracting additional info about GCP service.
 
     Function wrapped by this decorator should be placed under "lib.entities.extractors"
     package, or otherwise it will not be automatically called.
     The decorator extends given function by uploading retrieved data to dynatrace server.
+    asset_types and asset_mapper let lib.asset_inventory create the same entities from
+    Cloud Asset Inventory search results instead of calling the function.
     """
 
     def register_extractor(fun: ExtractEntitiesFunc) -> ExtractEntitiesFunc:
@@ -44,7 +47,7 @@ def entity_extractor(service_type: Text, service_api: Text):
 
             return entities
 
-        entities_extractors[service_type] = EntitiesExtractorData(get_and_upload, service_api)
+        entities_extractors[service_type] = EntitiesExtractorData(get_and_upload, service_api, asset_types, asset_mapper)
         return get_and_upload
 
     return register_extractor
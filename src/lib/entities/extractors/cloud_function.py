@@ -14,15 +14,21 @@
 
 import re
 from functools import partial
-from typing import Any, Dict, Iterable, Text
+from typing import Any, Dict, Iterable, List, Text
 
 from lib.context import MetricsContext
 from lib.entities.decorator import entity_extractor
 from lib.entities.google_api import generic_paging
-from lib.entities.ids import get_func_create_entity_id, LabelToApiRspMapping
+from lib.entities.ids import get_func_create_entity_id, LabelToApiRspMapping, with_project_id_in_name
 from lib.entities.model import CdProperty, Entity
 from lib.metrics import GCPService
 
+_LIST_PARAMS = {
+    "pageSize": "1000",
+    "fields": "nextPageToken,functions(name,state,buildConfig/entryPoint,buildConfig/runtime,"
+              "serviceConfig/availableMemory,serviceConfig/ingressSettings)",
+}
+
 export_labels_regex = re.compile(
     r"^projects\/([\w,-]*)\/locations\/([\w,-]*)\/functions\/([\w,-]*)$"
 )
@@ -83,9 +89,37 @@ def _cloud_function_resp_to_monitored_entities(page: Dict[Text, Any], svc_def: G
     ]
 
 
-@entity_extractor("cloud_function", "cloudfunctions.googleapis.com")
+def _v1_function_to_v2(resource: Dict[Text, Any]) -> Dict[Text, Any]:
+    """Rename fields of a cloudfunctions v1 CloudFunction to how the v2 API lists 1st gen functions."""
+    if "buildConfig" in resource:
+        return resource
+    return {
+        "name": resource.get("name", ""),
+        "state": resource.get("status", "N/A"),
+        "buildConfig": {"entryPoint": resource.get("entryPoint", "N/A"), "runtime": resource.get("runtime", "")},
+        "serviceConfig": {
+            "availableMemory": f"{resource['availableMemoryMb']}M" if "availableMemoryMb" in resource else "N/A",
+            "ingressSettings": resource.get("ingressSettings", ""),
+        },
+    }
+
+
+def _cloud_function_assets_to_monitored_entities(
+        resources: List[Dict[Text, Any]], svc_def: GCPService, project_id: str):
+    # 2nd gen functions can be reported as both asset types, the v2 data is kept then
+    functions_by_name = {}
+    for resource in resources:
+        function = _v1_function_to_v2(with_project_id_in_name(resource, project_id))
+        if function["name"] not in functions_by_name or "buildConfig" in resource:
+            functions_by_name[function["name"]] = function
+    return _cloud_function_resp_to_monitored_entities({"functions": list(functions_by_name.values())}, svc_def)
+
+
+@entity_extractor("cloud_function", "cloudfunctions.googleapis.com",
+                  asset_types=("cloudfunctions.googleapis.com/Function", "cloudfunctions.googleapis.com/CloudFunction"),
+                  asset_mapper=_cloud_function_assets_to_monitored_entities)
 async def get_cloud_function_entity(ctx: MetricsContext, project_id: str, svc_def: GCPService) -> Iterable[Entity]:
     """ Retrieve entity info on GCP cloud functions from google api. """
     url = f"https://cloudfunctions.googleapis.com/v2/projects/{project_id}/locations/-/functions"
     mapper_func = partial(_cloud_function_resp_to_monitored_entities, svc_def=svc_def)
-    return await generic_paging(project_id, url, ctx, mapper_func)
+    return await generic_paging(project_id, url, ctx, mapper_func, _LIST_PARAMS)
@@ -13,7 +13,7 @@
 #     limitations under the License.
 
 from functools import partial
-from typing import Any, Dict, Iterable, Text
+from typing import Any, Dict, Iterable, List, Text
 
 from lib.context import MetricsContext
 from lib.entities.decorator import entity_extractor
@@ -23,6 +23,10 @@ from lib.entities.model import CdProperty, Entity
 from lib.metrics import GCPService
 
 _SQL_ENDPOINT = "https://sqladmin.googleapis.com"
+_LIST_PARAMS = {
+    "maxResults": "1000",
+    "fields": "nextPageToken,items(name,project,region,connectionName,ipAddresses/ipAddress,settings/tier)",
+}
 
 LabelToApiResponseMapping: LabelToApiRspMapping = {
     "resource.labels.project_id": lambda x: str(x["project"]),
@@ -60,10 +64,16 @@ def _cloud_sql_resp_to_monitored_entities(page: Dict[Text, Any], svc_def: GCPSer
     ]
 
 
-@entity_extractor("cloudsql_database", "sqladmin.googleapis.com")
+def _cloud_sql_assets_to_monitored_entities(resources: List[Dict[Text, Any]], svc_def: GCPService, project_id: str):
+    return _cloud_sql_resp_to_monitored_entities({"items": resources}, svc_def)
+
+
+@entity_extractor("cloudsql_database", "sqladmin.googleapis.com",
+                  asset_types=("sqladmin.googleapis.com/Instance",),
+                  asset_mapper=_cloud_sql_assets_to_monitored_entities)
 async def get_cloud_sql_entity(ctx: MetricsContext, project_id: str, svc_def: GCPService) -> Iterable[Entity]:
     """ Retrieve entity info on GCP Cloud SQL from google api. """
 
     url = f"{_SQL_ENDPOINT}/sql/v1beta4/projects/{project_id}/instances"
     mapper_func = partial(_cloud_sql_resp_to_monitored_entities, svc_def=svc_def)
-    return await generic_paging(project_id, url, ctx, mapper_func)
+    return await generic_paging(project_id, url, ctx, mapper_func, _LIST_PARAMS)
@@ -15,15 +15,20 @@
 import itertools
 import re
 from functools import partial
-from typing import Any, Dict, Iterable, Text
+from typing import Any, Dict, Iterable, List, Text
 
 from lib.context import MetricsContext
 from lib.entities.decorator import entity_extractor
 from lib.entities.google_api import generic_paging
-from lib.entities.ids import get_func_create_entity_id, LabelToApiRspMapping
+from lib.entities.ids import get_func_create_entity_id, LabelToApiRspMapping, with_project_id_in_name
 from lib.entities.model import CdProperty, Entity
 from lib.metrics import GCPService
 
+_LIST_PARAMS = {
+    "pageSize": "1000",
+    "fields": "nextPageToken,instances(name,state,tier,networks/ipAddresses)",
+}
+
 export_labels_regex = re.compile(
     r"^projects\/([\w,-]*)\/locations\/([\w,-]*)\/instances\/([\w,-]*)$"
 )
@@ -81,9 +86,17 @@ def _filestore_instance_resp_to_monitored_entities(page: Dict[Text, Any], svc_de
     ]
 
 
-@entity_extractor("filestore_instance", "file.googleapis.com")
+def _filestore_instance_assets_to_monitored_entities(
+        resources: List[Dict[Text, Any]], svc_def: GCPService, project_id: str):
+    instances = [with_project_id_in_name(resource, project_id) for resource in resources]
+    return _filestore_instance_resp_to_monitored_entities({"instances": instances}, svc_def)
+
+
+@entity_extractor("filestore_instance", "file.googleapis.com",
+                  asset_types=("file.googleapis.com/Instance",),
+                  asset_mapper=_filestore_instance_assets_to_monitored_entities)
 async def get_filestore_instance_entity(ctx: MetricsContext, project_id: str, svc_def: GCPService) -> Iterable[Entity]:
     """ Retrieve entity info on GCP filestore instance from google api. """
     url = f"https://file.googleapis.com/v1/projects/{project_id}/locations/-/instances"
     mapper_func = partial(_filestore_instance_resp_to_monitored_entities, svc_def=svc_def)
-    return await generic_paging(project_id, url, ctx, mapper_func)
+    return await generic_paging(project_id, url, ctx, mapper_func, _LIST_PARAMS)
@@ -12,14 +12,14 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
-import asyncio
 import re
 from functools import partial
-from typing import Any, Dict, Iterable, Text
+from typing import Any, Dict, Iterable, List, Text
 
+from lib.configuration import config
 from lib.context import MetricsContext
 from lib.entities.decorator import entity_extractor
-from lib.entities.google_api import generic_paging, fetch_zones
+from lib.entities.google_api import generic_paging
 from lib.entities.ids import get_func_create_entity_id, LabelToApiRspMapping
 from lib.entities.model import CdProperty, Entity
 from lib.metrics import GCPService
@@ -29,6 +29,13 @@ export_labels_regex = re.compile(
 )
 
 _GCP_COMPUTE_ENDPOINT = "https://compute.googleapis.com"
+_LIST_PARAMS = {
+    "maxResults": "500",
+    "returnPartialSuccess": "true",
+    "fields": "nextPageToken,unreachables,"
+              "items/*/instances(id,name,labels,networkInterfaces/networkIP,status,cpuPlatform,machineType)",
+}
+_ZONE_SCOPE_PREFIX = "zones/"
 
 
 def _extract_label(gfun_name: Text, group_index: int) -> Text:
@@ -68,18 +75,24 @@ def _get_properties(rsp: Dict[Text, Any]) -> Iterable[CdProperty]:
     ]
 
 
-def _cloud_function_resp_to_monitored_entities(page: Dict[Text, Any], svc_def: GCPService):
-    """ Create CustomDevice instanace from google api response."""
-    items = page.get("items", [])
-    if not items:
-        return []
+def _cloud_function_resp_to_monitored_entities(
+        page: Dict[Text, Any], svc_def: GCPService, ctx: MetricsContext, project_id: str):
+    """ Create CustomDevice instanace from google api aggregatedList response, items are grouped by zone."""
+    if page.get("unreachables"):
+        ctx.log(project_id, f"Instances from unreachable zones are missing in GCE topology: {', '.join(page['unreachables'])}")
+
+    entities = []
+    for scope, scoped_list in page.get("items", {}).items():
+        if not scope.startswith(_ZONE_SCOPE_PREFIX):
+            continue
+        entities.extend(_zone_instances_to_monitored_entities(
+            scoped_list.get("instances", []), svc_def, project_id, scope[len(_ZONE_SCOPE_PREFIX):]
+        ))
+    return entities
 
-    page_id = page.get("id", None)
-    if page_id is None:
-        return []
-    project_id = _extract_label(page_id, 1)
-    zone_id = _extract_label(page_id, 2)
 
+def _zone_instances_to_monitored_entities(
+        items: Iterable[Dict[Text, Any]], svc_def: GCPService, project_id: str, zone_id: str):
     mappings = {
         "resource.labels.instance_id": lambda x: x.get("id", ""),
         "resource.labels.zone": lambda x: zone_id,
@@ -110,20 +123,28 @@ def _cloud_function_resp_to_monitored_entities(page: Dict[Text, Any], svc_def: G
     return entities
 
 
-@entity_extractor("gce_instance", "compute.googleapis.com")
+def _gce_instance_assets_to_monitored_entities(resources: List[Dict[Text, Any]], svc_def: GCPService, project_id: str):
+    instances_by_zone: Dict[str, List[Dict[Text, Any]]] = {}
+    for resource in resources:
+        zone_id = resource.get("zone", "").split("/")[-1]
+        instances_by_zone.setdefault(zone_id, []).append(resource)
+
+    entities = []
+    for zone_id, instances in instances_by_zone.items():
+        entities.extend(_zone_instances_to_monitored_entities(instances, svc_def, project_id, zone_id))
+    return entities
+
+
+@entity_extractor("gce_instance", "compute.googleapis.com",
+                  asset_types=("compute.googleapis.com/Instance",),
+                  asset_mapper=_gce_instance_assets_to_monitored_entities)
 async def get_gce_instance_entity(ctx: MetricsContext, project_id: str, svc_def: GCPService) -> Iterable[Entity]:
     """ Retrieve entity info on GCP cloud functions from google api. """
-    zones = await fetch_zones(ctx, project_id)
-
-    tasks = []
-    for zone in zones:
-        url = f"{_GCP_COMPUTE_ENDPOINT}/compute/v1/projects/{project_id}/zones/{zone}/instances"
-        mapper_func = partial(_cloud_function_resp_to_monitored_entities, svc_def=svc_def)
-        tasks.append(generic_paging(project_id, url, ctx, mapper_func))
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    url = f"{_GCP_COMPUTE_ENDPOINT}/compute/v1/projects/{project_id}/aggregated/instances"
+    mapper_func = partial(_cloud_function_resp_to_monitored_entities, svc_def=svc_def, ctx=ctx, project_id=project_id)
 
-    all_results = []
-    for result in results:
-        all_results.extend(result)
+    params = dict(_LIST_PARAMS)
+    if config.gce_topology_filter():
+        params["filter"] = config.gce_topology_filter()
 
-    return all_results
+    return await generic_paging(project_id, url, ctx, mapper_func, params)
@@ -14,15 +14,20 @@
 
 import re
 from functools import partial
-from typing import Any, Dict, Iterable, Text
+from typing import Any, Dict, Iterable, List, Text
 
 from lib.context import MetricsContext
 from lib.entities.decorator import entity_extractor
 from lib.entities.google_api import generic_paging
-from lib.entities.ids import get_func_create_entity_id, LabelToApiRspMapping
+from lib.entities.ids import get_func_create_entity_id, LabelToApiRspMapping, with_project_id_in_name
 from lib.entities.model import CdProperty, Entity
 from lib.metrics import GCPService
 
+_LIST_PARAMS = {
+    "pageSize": "1000",
+    "fields": "nextPageToken,subscriptions(name,topic,ackDeadlineSeconds)",
+}
+
 export_labels_regex = re.compile(
     r"^projects\/([\w,-]*)\/subscriptions\/([\w,-.]*)$"
 )
@@ -78,9 +83,17 @@ def _cloud_function_resp_to_monitored_entities(page: Dict[Text, Any], svc_def: G
     ]
 
 
-@entity_extractor("pubsub_subscription", "pubsub.googleapis.com")
+def _pubsub_subscription_assets_to_monitored_entities(
+        resources: List[Dict[Text, Any]], svc_def: GCPService, project_id: str):
+    subscriptions = [with_project_id_in_name(resource, project_id) for resource in resources]
+    return _cloud_function_resp_to_monitored_entities({"subscriptions": subscriptions}, svc_def)
+
+
+@entity_extractor("pubsub_subscription", "pubsub.googleapis.com",
+                  asset_types=("pubsub.googleapis.com/Subscription",),
+                  asset_mapper=_pubsub_subscription_assets_to_monitored_entities)
 async def get_pubsub_subscription_entity(ctx: MetricsContext, project_id: str, svc_def: GCPService) -> Iterable[Entity]:
     """ Retrieve entity info on GCP cloud functions from google api. """
     url = f"https://pubsub.googleapis.com/v1/projects/{project_id}/subscriptions/"
     mapper_func = partial(_cloud_function_resp_to_monitored_entities, svc_def=svc_def)
-    return await generic_paging(project_id, url, ctx, mapper_func)
+    return await generic_paging(project_id, url, ctx, mapper_func, _LIST_PARAMS)
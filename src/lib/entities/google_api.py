@@ -15,23 +15,27 @@
 
 from typing import Any, Callable, Dict, List, Text, Optional
 
+from lib import json_codec
 from lib.context import MetricsContext
 from lib.entities.model import Entity
 
-_GCP_COMPUTE_ENDPOINT = "https://compute.googleapis.com"
-
 
 async def generic_paging(
         project_id: str,
         url: Text,
         ctx: MetricsContext,
-        mapper: Callable[[Dict[Any, Any]], List[Entity]]
+        mapper: Callable[[Dict[Any, Any]], List[Entity]],
+        params: Optional[Dict[Text, Text]] = None
 ) -> List[Entity]:
-    """Apply mapper function on any page returned by gcp api url."""
+    """Apply mapper function on any page returned by gcp api url.
+
+    params are sent with every page request, callers use them for page size and a fields mask
+    limited to what their mapper reads.
+    """
     headers = ctx.create_gcp_request_headers(project_id)
 
     get_page = True
-    params: Dict[Text, Text] = {}
+    params: Dict[Text, Text] = dict(params or {})
     entities: List[Entity] = []
     while get_page:
         resp = await ctx.gcp_session.request(
@@ -42,7 +46,7 @@ async def generic_paging(
         )
 
         try:
-            page = await resp.json()
+            page = await resp.json(loads=json_codec.loads_api_response)
         except Exception:
             error_message = await resp.text()
             error_message = ' '.join(error_message.split())
@@ -64,25 +68,3 @@ async def generic_paging(
             params["pageToken"] = page.get("nextPageToken", None)
 
     return entities
-
-
-async def fetch_zones(
-        context: MetricsContext,
-        project_id: str
-) -> List[str]:
-    headers = context.create_gcp_request_headers(project_id)
-
-    resp = await context.gcp_session.request(
-        "GET",
-        params={},
-        url=f"{_GCP_COMPUTE_ENDPOINT}/compute/v1/projects/{project_id}/zones",
-        headers=headers,
-        raise_for_status=True
-    )
-
-    response_json = await resp.json()
-    if resp.status != 200:
-        raise Exception(f"Failed to fetch available zones, response is {response_json}")
-
-    zone_items = response_json.get("items", [])
-    return [zone["name"] for zone in zone_items]
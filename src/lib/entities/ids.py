@@ -30,6 +30,15 @@ def _create_mmh3_hash(components: Iterable[Text]) -> Text:
     ))
 
 
+def with_project_id_in_name(resource: Dict[Text, Any], project_id: str) -> Dict[Text, Any]:
+    """Return resource with 'projects/<number or id>/...' name using the project id, as list APIs return it."""
+    name = resource.get("name", "")
+    if not name.startswith("projects/"):
+        return resource
+    _, _, rest = name[len("projects/"):].partition("/")
+    return {**resource, "name": f"projects/{project_id}/{rest}"}
+
+
 def get_func_create_entity_id(
         mapping: LabelToApiRspMapping
 ) -> Callable[[Dict[Text, Any], GCPService], Text]:
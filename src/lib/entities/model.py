@@ -16,7 +16,7 @@
 
 from dataclasses import dataclass
 from json import dumps
-from typing import Callable, FrozenSet, Iterable, NamedTuple, Text, List
+from typing import Any, Callable, Dict, FrozenSet, Iterable, NamedTuple, Optional, Text, Tuple, List
 
 from lib.context import MetricsContext
 from lib.metrics import GCPService
@@ -46,9 +46,13 @@ class Entity:  # pylint: disable=R0902
 
 
 ExtractEntitiesFunc = Callable[[MetricsContext, str, GCPService], Iterable[Entity]]
+# Maps resource data of Cloud Asset Inventory search results of one project
+MapAssetsFunc = Callable[[List[Dict[Text, Any]], GCPService, str], List[Entity]]
 
 
 @dataclass(frozen=True)
 class EntitiesExtractorData:
     extractor: ExtractEntitiesFunc
     used_api: Text
+    asset_types: Tuple[Text, ...] = ()
+    asset_mapper: Optional[MapAssetsFunc] = None
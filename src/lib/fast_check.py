@@ -12,25 +12,15 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-import asyncio
 import json
 import os
 import re
-from datetime import datetime
-from queue import Queue
 from typing import NamedTuple, List, Optional
 
 from aiohttp import ClientSession
 
 from lib.configuration import config
-from lib.context import LoggingContext, create_logs_context
-from lib.credentials import create_token, fetch_dynatrace_api_key, fetch_dynatrace_log_ingest_url, fetch_dynatrace_url
-from lib.instance_metadata import InstanceMetadata
-
-from lib.clientsession_provider import init_dt_client_session, init_gcp_client_session
-from lib.logs.dynatrace_client import DynatraceClient
-from lib.logs.logs_processor import LogBatch
-from lib.sfm.for_logs.log_sfm_metrics import LogSelfMonitoring
+from lib.context import LoggingContext
 
 service_name_pattern = re.compile(r"^projects\/([\w,-]*)\/services\/([\w,-.]*)$")
 
@@ -50,22 +40,6 @@ METRICS_CONFIGURATION_FLAGS = [
     "KEEP_REFRESHING_EXTENSIONS_CONFIG",
 ]
 
-LOGS_CONFIGURATION_FLAGS = [
-    "REQUIRE_VALID_CERTIFICATE",
-    "DYNATRACE_LOG_INGEST_CONTENT_MAX_LENGTH",
-    "DYNATRACE_LOG_INGEST_ATTRIBUTE_VALUE_MAX_LENGTH",
-    "DYNATRACE_LOG_INGEST_REQUEST_MAX_EVENTS",
-    "DYNATRACE_LOG_INGEST_REQUEST_MAX_SIZE",
-    "DYNATRACE_TIMEOUT_SECONDS",
-    "DYNATRACE_LOG_INGEST_EVENT_MAX_AGE_SECONDS",
-    "GCP_PROJECT",
-    "LOGS_SUBSCRIPTION_PROJECT",
-    "LOGS_SUBSCRIPTION_ID",
-    "DYNATRACE_LOG_INGEST_SENDING_WORKER_EXECUTION_PERIOD",
-    "SELF_MONITORING_ENABLED",
-    "USE_PROXY"
-]
-
 REQUIRED_SERVICES = [
     'monitoring.googleapis.com',
     'cloudresourcemanager.googleapis.com'
@@ -151,50 +125,3 @@ def valid_dynatrace_scopes(token_metadata: dict):
     """Check whether Dynatrace token metadata has required scopes to start ingest metrics"""
     token_scopes = token_metadata.get('scopes', [])
     return all(scope in token_scopes for scope in DYNATRACE_REQUIRED_TOKEN_SCOPES) if token_scopes else False
-
-
-class LogsFastCheck:
-    def __init__(self, logging_context: LoggingContext, instance_metadata: InstanceMetadata):
-        self.instance_metadata = instance_metadata
-        self.logging_context = logging_context
-
-    async def execute(self):
-        _print_configuration_flags(self.logging_context, LOGS_CONFIGURATION_FLAGS)
-        check_version(self.logging_context)
-        self.logging_context.log("Sending the startup message")
-        container_name = self.instance_metadata.hostname if self.instance_metadata else "local deployment"
-        fast_check_event = {
-            'timestamp': datetime.utcnow().isoformat(" "),
-            'cloud.provider': 'gcp',
-            'content': f'GCP Log Forwarder has started at {container_name}',
-            'severity': 'INFO'
-        }
-
-        async with init_gcp_client_session() as gcp_session:
-            gcp_token = await create_token(session=gcp_session, context=self.logging_context, validate=True)
-            dynatrace_log_ingest_url = await fetch_dynatrace_log_ingest_url(
-                gcp_session=gcp_session,
-                project_id=config.project_id(),
-                token=gcp_token,
-            )
-            dynatrace_api_key = await fetch_dynatrace_api_key(
-                gcp_session=gcp_session,
-                project_id=config.project_id(),
-                token=gcp_token,
-            )
-
-        dynatrace_client = DynatraceClient(url=dynatrace_log_ingest_url, api_key=dynatrace_api_key)
-        async with init_dt_client_session() as dt_session:
-            fake_ack_ids = []
-            await dynatrace_client.send_logs(create_logs_context(asyncio.Queue()), dt_session, LogBatch(json.dumps([fast_check_event]), 1, [], len(json.dumps([fast_check_event])), LogSelfMonitoring()), fake_ack_ids)
-
-
-def _print_configuration_flags(logging_context: LoggingContext, flags_to_check: List[str]):
-    configuration_flag_values = []
-    for key in flags_to_check:
-        value = os.environ.get(key, None)
-        if value is None:
-            configuration_flag_values.append(f"{key} is None")
-        else:
-            configuration_flag_values.append(f"{key} = '{value}'")
-    logging_context.log(f"Found configuration flags: {', '.join(configuration_flag_values)}")
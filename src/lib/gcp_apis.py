@@ -15,7 +15,7 @@ import asyncio
 import os
 
 from aiohttp import ClientResponseError
-from typing import Set, List, Dict, Tuple
+from typing import Set, List, Dict, Optional, Tuple
 
 from lib.context import MetricsContext
 from lib.configuration import config
@@ -33,7 +33,7 @@ async def _get_all_disabled_apis(context: MetricsContext, project_id: str):
     next_token = None
     url = _GCP_SERVICE_USAGE_URL + f'/projects/{project_id}/services'
     headers = context.create_gcp_request_headers(project_id)
-    params = {"filter": "state:DISABLED", "pageSize": 200}
+    params = {"filter": "state:DISABLED", "pageSize": 200, "fields": "nextPageToken,services/config/name"}
     disabled_apis = []
     try:
         while fetch_next_page:
@@ -79,44 +79,57 @@ async def get_disabled_projects_and_disabled_apis_by_project_id(context, project
 
 
 async def _check_if_project_is_disabled_and_get_disabled_api_set(context: MetricsContext, project_id: str) -> Tuple[str, bool, Set[str]]:
-    try:
-        await _check_x_goog_user_project_header_permissions(context, project_id)
-    except Exception as e:
-        context.log(project_id, f"Unexpected exception when checking 'x-goog-user-project' header: {e}")
+    await _check_x_goog_user_project_header_permissions(context, project_id)
+    is_project_disabled, disabled_apis = await get_project_disabled_state(context, project_id)
+    return project_id, is_project_disabled, disabled_apis
+
 
+async def get_project_disabled_state(context: MetricsContext, project_id: str) -> Tuple[bool, Set[str]]:
+    """Return whether the project can't be monitored because of disabled required services, and its disabled APIs."""
     disabled_apis = await _get_all_disabled_apis(context, project_id)
     is_project_disabled = False
     if any(required_service in disabled_apis for required_service in REQUIRED_SERVICES):
         is_project_disabled = True
         context.log(project_id, f"Cannot monitor project. Enable required services to do so: {REQUIRED_SERVICES}")
-    return project_id, is_project_disabled, disabled_apis
+    return is_project_disabled, set(disabled_apis)
 
 
 async def _check_x_goog_user_project_header_permissions(context: MetricsContext, project_id: str):
     if project_id in context.use_x_goog_user_project_header:
         return
 
-    service_usage_booking = os.environ['SERVICE_USAGE_BOOKING'] if 'SERVICE_USAGE_BOOKING' in os.environ.keys() \
-        else 'source'
-    if service_usage_booking.casefold().strip() != 'destination':
-        context.log(project_id, "Using SERVICE_USAGE_BOOKING = source")
-        context.use_x_goog_user_project_header[project_id] = False
-        return
+    use_header = await probe_x_goog_user_project_header(context, project_id)
+    if use_header is not None:
+        context.use_x_goog_user_project_header[project_id] = use_header
+
 
-    url = f"https://monitoring.googleapis.com/v3/projects/{project_id}/metricDescriptors"
-    params = [('pageSize', 1)]
-    headers = {
-        "Authorization": "Bearer {token}".format(token=context.token),
-        "x-goog-user-project": project_id
-    }
-    resp = await context.gcp_session.get(url=url, params=params, headers=headers)
-    page = await resp.json()
-
-    if resp.status == 200:
-        context.use_x_goog_user_project_header[project_id] = True
-        context.log(project_id, "Using SERVICE_USAGE_BOOKING = destination")
-    elif resp.status == 403 and 'serviceusage.services.use' in page['error']['message']:
-        context.use_x_goog_user_project_header[project_id] = False
-        context.log(project_id, "Ignoring destination SERVICE_USAGE_BOOKING. Missing permission: 'serviceusage.services.use'")
-    else:
-        context.log(project_id, f"Unexpected response when checking 'x-goog-user-project' header: {str(page)}")
\ No newline at end of file
+async def probe_x_goog_user_project_header(context: MetricsContext, project_id: str) -> Optional[bool]:
+    """Return whether requests for the project should be billed to it with 'x-goog-user-project', None if unknown."""
+    try:
+        service_usage_booking = os.environ['SERVICE_USAGE_BOOKING'] if 'SERVICE_USAGE_BOOKING' in os.environ.keys() \
+            else 'source'
+        if service_usage_booking.casefold().strip() != 'destination':
+            context.log(project_id, "Using SERVICE_USAGE_BOOKING = source")
+            return False
+
+        url = f"https://monitoring.googleapis.com/v3/projects/{project_id}/metricDescriptors"
+        params = [('pageSize', 1)]
+        headers = {
+            "Authorization": "Bearer {token}".format(token=context.token),
+            "x-goog-user-project": project_id
+        }
+        resp = await context.gcp_session.get(url=url, params=params, headers=headers)
+        page = await resp.json()
+
+        if resp.status == 200:
+            context.log(project_id, "Using SERVICE_USAGE_BOOKING = destination")
+            return True
+        elif resp.status == 403 and 'serviceusage.services.use' in page['error']['message']:
+            context.log(project_id, "Ignoring destination SERVICE_USAGE_BOOKING. Missing permission: 'serviceusage.services.use'")
+            return False
+        else:
+            context.log(project_id, f"Unexpected response when checking 'x-goog-user-project' header: {str(page)}")
+            return None
+    except Exception as e:
+        context.log(project_id, f"Unexpected exception when checking 'x-goog-user-project' header: {e}")
+        return None
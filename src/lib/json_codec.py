@@ -0,0 +1,67 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+JSON codec for hot paths, backed by orjson when it is installed and by the json module otherwise.
+
+Both backends produce the same text: compact separators and non-ASCII characters written as is.
+Values orjson can't handle the same way (integers beyond 64 bits, custom types) are left to the json module.
+Only floats in exponent notation are spelled differently (1e-05 vs 0.00001), they decode to the same value.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# Maps digits to "0" and everything else to " ", a run of 19 zeros then marks a possibly too big integer
+_DIGITS_TABLE = bytes(ord("0") if chr(byte) in "0123456789" else ord(" ") for byte in range(256))
+_LONG_DIGIT_RUN = b"0" * 19
+
+
+def loads(text: Union[str, bytes]) -> Any:
+    """Decode any JSON document, e.g. a log record. Gives exactly the same value as json.loads."""
+    if orjson:
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        # orjson decodes integers beyond 64 bits into floats, such documents go to the json module
+        if _LONG_DIGIT_RUN not in data.translate(_DIGITS_TABLE):
+            return _orjson_loads(text)
+    return json.loads(text)
+
+
+def loads_api_response(text: Union[str, bytes]) -> Any:
+    """Decode a Google API response body. 64-bit integers are JSON strings there, so no check for long integers."""
+    if orjson:
+        return _orjson_loads(text)
+    return json.loads(text)
+
+
+def _orjson_loads(text: Union[str, bytes]) -> Any:
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        # orjson is stricter (NaN, Infinity), the json module decides what is invalid
+        return json.loads(text)
+
+
+def dumps(obj: Any) -> str:
+    if orjson:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,145 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Incremental decoding of JSON response bodies with one big array member, e.g. timeSeries pages.
+
+Items of the array are decoded one at a time as soon as the body contains all of their text,
+so only the not yet decoded tail of the body is kept in memory instead of the full dict tree.
+Single values are decoded by json.JSONDecoder.raw_decode, only the top-level object and the
+array itself are walked here.
+"""
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List
+
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_OBJECT_START, _MEMBER, _COLON, _VALUE, _ARRAY_ITEM, _END = range(6)
+
+
+class IncompleteJson(Exception):
+    pass
+
+
+class JsonArrayStream:
+    """Decodes a JSON object fed in pieces, returning items of array_key as they complete."""
+
+    def __init__(self, array_key: str) -> None:
+        self.array_key = array_key
+        self.members: Dict[str, Any] = {}
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._state = _OBJECT_START
+        self._key = None
+        # A value that failed to decode is retried only once the buffer doubled, keeping decoding linear
+        self._retry_at = 0
+        self._final = False
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        """Add the next piece of the body, final marks the last one. Returns items completed by it."""
+        self._buffer += text
+        self._final = final
+        if len(self._buffer) < self._retry_at and not final:
+            return []
+
+        items = []
+        position = self._parse(items)
+        self._buffer = self._buffer[position:]
+        return items
+
+    def close(self) -> Dict[str, Any]:
+        """Return all other members of the object, raise ValueError if the body was not a complete object."""
+        if self._state != _END or self._buffer.strip():
+            raise ValueError(f"Incomplete JSON object, {len(self._buffer)} characters left undecoded")
+        return self.members
+
+    def _parse(self, items: List[Any]) -> int:
+        buffer = self._buffer
+        position = 0
+        try:
+            while self._state != _END:
+                position = _WHITESPACE.match(buffer, position).end()
+                if position >= len(buffer):
+                    break
+                char = buffer[position]
+
+                if self._state == _OBJECT_START:
+                    self._expect(char, "{")
+                    position += 1
+                    self._state = _MEMBER
+                elif self._state == _MEMBER:
+                    if char == "}":
+                        position += 1
+                        self._state = _END
+                    elif char == ",":
+                        position += 1
+                    else:
+                        self._key, position = self._decode(buffer, position)
+                        self._state = _COLON
+                elif self._state == _COLON:
+                    self._expect(char, ":")
+                    position += 1
+                    self._state = _VALUE
+                elif self._state == _VALUE:
+                    if self._key == self.array_key and char == "[":
+                        position += 1
+                        self._state = _ARRAY_ITEM
+                    else:
+                        self.members[self._key], position = self._decode(buffer, position)
+                        self._state = _MEMBER
+                elif self._state == _ARRAY_ITEM:
+                    if char == "]":
+                        position += 1
+                        self._state = _MEMBER
+                    elif char == ",":
+                        position += 1
+                    else:
+                        item, position = self._decode(buffer, position)
+                        items.append(item)
+        except IncompleteJson:
+            self._retry_at = 2 * (len(buffer) - position)
+        else:
+            self._retry_at = 0
+        return position
+
+    def _decode(self, buffer: str, position: int):
+        try:
+            value, end = self._decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            raise IncompleteJson()
+        # A number at the end of the buffer may continue in the next piece
+        if end == len(buffer) and not self._final and isinstance(value, (int, float)):
+            raise IncompleteJson()
+        return value, end
+
+    def _expect(self, char: str, expected: str) -> None:
+        if char != expected:
+            raise ValueError(f"Unexpected '{char}' in JSON object, expected '{expected}'")
+
+
+async def iter_json_array(response, array_key: str, members: Dict[str, Any]) -> AsyncIterator[Any]:
+    """Yield items of array_key from an aiohttp response body, other members are put into members at the end."""
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    stream = JsonArrayStream(array_key)
+    try:
+        async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+            for item in stream.feed(text_decoder.decode(chunk)):
+                yield item
+        for item in stream.feed(text_decoder.decode(b"", final=True), final=True):
+            yield item
+        members.update(stream.close())
+    finally:
+        response.release()
@@ -19,6 +19,7 @@ from typing import Any, Awaitable, Dict, List, Callable
 
 from aiohttp import ClientSession
 
+from lib import json_codec
 from lib.context import LoggingContext
 from lib.logs.log_forwarder_variables import (
     LOGS_SUBSCRIPTION_ID,
@@ -129,7 +130,7 @@ class GCPClient:
         async with gcp_session.request(
             method="POST", url=self.pull_url, data=self.body_payload, headers=auth_state['headers']
         ) as response:
-            response_json = await response.json()
+            response_json = await response.json(loads=json_codec.loads_api_response)
             resp_status = response.status
 
             if resp_status == 401:
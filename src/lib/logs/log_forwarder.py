@@ -26,6 +26,7 @@ from lib.logs.log_forwarder_variables import (
 )
 from lib.logs.log_self_monitoring import create_sfm_loop
 from lib.logs.log_integration_service import LogIntegrationService
+from lib.logs.logs_processor import get_metadata_engine
 
 
 def run_logs_wrapper(logging_context, instance_metadata, process_number):
@@ -43,6 +44,9 @@ async def run_logs(
     # Each process starts later than the previous one
     await asyncio.sleep(process_number * LOG_PROCESS_STARTUP_DELAY_SECONDS)
 
+    # Load the metadata rules before pulling, not while processing the first messages
+    get_metadata_engine()
+
     sfm_queue = Queue(MAX_SFM_MESSAGES_PROCESSED)
     log_integration_service = await LogIntegrationService.create(sfm_queue=sfm_queue, logging_context=logging_context)
 
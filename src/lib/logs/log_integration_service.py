@@ -6,7 +6,8 @@ from aiohttp import ClientSession
 from lib.clientsession_provider import init_gcp_client_session, init_dt_client_session
 from lib.configuration import config
 from lib.context import LoggingContext, LogsContext, LogsProcessingContext, create_logs_context
-from lib.credentials import create_token_with_expiry, fetch_dynatrace_api_key, fetch_dynatrace_log_ingest_url
+from lib.credentials import create_token_with_expiry, credential_provider, fetch_dynatrace_api_key, \
+    fetch_dynatrace_log_ingest_url
 from lib.logs.dynatrace_client import DynatraceClient
 from lib.logs.gcp_client import GCPClient
 from lib.logs.log_self_monitoring import put_sfm_into_queue
@@ -115,6 +116,9 @@ class LogIntegrationService:
             # hasn't reached its local expiry time (e.g. server-side revocation, clock skew).
             if not self.gcp_client.is_token_expired() and not self.gcp_client.update_gcp_client_in_the_next_loop:
                 return
+            if not self.gcp_client.is_token_expired():
+                # Rejected before its expiry, the token shared with other components must not be handed out again
+                credential_provider.invalidate_token(self.gcp_client.api_token)
 
             # Refresh token and get expiry information for proactive refresh
             token_info = await create_token_with_expiry(context=logging_context, session=self.gcp_session, validate=True)
@@ -21,7 +21,7 @@ from typing import Dict, List
 
 import aiohttp
 
-from lib.clientsession_provider import init_gcp_client_session
+from lib.clientsession_provider import connection_manager
 from lib.configuration import config
 from lib.context import LoggingContext, LogsSfmContext, DynatraceConnectivity, LogsContext
 from lib.credentials import create_token, fetch_dynatrace_log_ingest_url
@@ -81,7 +81,7 @@ async def _loop_single_period(self_monitoring: LogSelfMonitoring,
     try:
         sfm_list = await _pull_sfm(sfm_queue)
         if sfm_list:
-            async with init_gcp_client_session() as gcp_session:
+            async with connection_manager.gcp_session() as gcp_session:
                 context = await _create_sfm_logs_context(sfm_queue, context, gcp_session, instance_metadata)
                 self_monitoring = aggregate_self_monitoring_metrics(self_monitoring, sfm_list)
                 _log_self_monitoring_data(self_monitoring, context)
@@ -0,0 +1,91 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import List
+
+from lib.clientsession_provider import init_dt_client_session, init_gcp_client_session
+from lib.configuration import config
+from lib.context import LoggingContext, create_logs_context
+from lib.credentials import create_token, fetch_dynatrace_api_key, fetch_dynatrace_log_ingest_url
+from lib.fast_check import check_version
+from lib.instance_metadata import InstanceMetadata
+from lib.logs.dynatrace_client import DynatraceClient
+from lib.logs.logs_processor import LogBatch
+from lib.sfm.for_logs.log_sfm_metrics import LogSelfMonitoring
+
+LOGS_CONFIGURATION_FLAGS = [
+    "REQUIRE_VALID_CERTIFICATE",
+    "DYNATRACE_LOG_INGEST_CONTENT_MAX_LENGTH",
+    "DYNATRACE_LOG_INGEST_ATTRIBUTE_VALUE_MAX_LENGTH",
+    "DYNATRACE_LOG_INGEST_REQUEST_MAX_EVENTS",
+    "DYNATRACE_LOG_INGEST_REQUEST_MAX_SIZE",
+    "DYNATRACE_TIMEOUT_SECONDS",
+    "DYNATRACE_LOG_INGEST_EVENT_MAX_AGE_SECONDS",
+    "GCP_PROJECT",
+    "LOGS_SUBSCRIPTION_PROJECT",
+    "LOGS_SUBSCRIPTION_ID",
+    "DYNATRACE_LOG_INGEST_SENDING_WORKER_EXECUTION_PERIOD",
+    "SELF_MONITORING_ENABLED",
+    "USE_PROXY"
+]
+
+
+class LogsFastCheck:
+    def __init__(self, logging_context: LoggingContext, instance_metadata: InstanceMetadata):
+        self.instance_metadata = instance_metadata
+        self.logging_context = logging_context
+
+    async def execute(self):
+        _print_configuration_flags(self.logging_context, LOGS_CONFIGURATION_FLAGS)
+        check_version(self.logging_context)
+        self.logging_context.log("Sending the startup message")
+        container_name = self.instance_metadata.hostname if self.instance_metadata else "local deployment"
+        fast_check_event = {
+            'timestamp': datetime.utcnow().isoformat(" "),
+            'cloud.provider': 'gcp',
+            'content': f'GCP Log Forwarder has started at {container_name}',
+            'severity': 'INFO'
+        }
+
+        async with init_gcp_client_session() as gcp_session:
+            gcp_token = await create_token(session=gcp_session, context=self.logging_context, validate=True)
+            dynatrace_log_ingest_url = await fetch_dynatrace_log_ingest_url(
+                gcp_session=gcp_session,
+                project_id=config.project_id(),
+                token=gcp_token,
+            )
+            dynatrace_api_key = await fetch_dynatrace_api_key(
+                gcp_session=gcp_session,
+                project_id=config.project_id(),
+                token=gcp_token,
+            )
+
+        dynatrace_client = DynatraceClient(url=dynatrace_log_ingest_url, api_key=dynatrace_api_key)
+        async with init_dt_client_session() as dt_session:
+            fake_ack_ids = []
+            await dynatrace_client.send_logs(create_logs_context(asyncio.Queue()), dt_session, LogBatch(json.dumps([fast_check_event]), 1, [], len(json.dumps([fast_check_event])), LogSelfMonitoring()), fake_ack_ids)
+
+
+def _print_configuration_flags(logging_context: LoggingContext, flags_to_check: List[str]):
+    configuration_flag_values = []
+    for key in flags_to_check:
+        value = os.environ.get(key, None)
+        if value is None:
+            configuration_flag_values.append(f"{key} is None")
+        else:
+            configuration_flag_values.append(f"{key} = '{value}'")
+    logging_context.log(f"Found configuration flags: {', '.join(configuration_flag_values)}")
@@ -20,6 +20,7 @@ from datetime import datetime, timezone
 from typing import Any, Dict, List, NamedTuple, Optional
 
 import ciso8601
+from lib import json_codec
 from lib.context import LogsProcessingContext
 from lib.logs.log_forwarder_variables import (
     ATTRIBUTE_VALUE_LENGTH_LIMIT, CLOUD_LOG_FORWARDER, CLOUD_LOG_FORWARDER_POD,
@@ -31,7 +32,15 @@ from lib.logs.log_self_monitoring import (LogSelfMonitoring,
 from lib.logs.metadata_engine import (ATTRIBUTE_CONTENT, ATTRIBUTE_TIMESTAMP,
                                       MetadataEngine)
 
-_metadata_engine = MetadataEngine()
+_metadata_engine: Optional[MetadataEngine] = None
+
+
+def get_metadata_engine() -> MetadataEngine:
+    # Loading the config_logs files takes a while, it's done on first use instead of at import
+    global _metadata_engine
+    if _metadata_engine is None:
+        _metadata_engine = MetadataEngine()
+    return _metadata_engine
 
 
 class LogProcessingJob:
@@ -164,7 +173,7 @@ def _process_message(
         put_sfm_into_queue(context)
         return None
     else:
-        job = LogProcessingJob(json.dumps(payload), context.self_monitoring, ack_id)
+        job = LogProcessingJob(json_codec.dumps(payload), context.self_monitoring, ack_id)
         return job
 
 
@@ -191,6 +200,7 @@ def _create_dt_log_payload(context: LogsProcessingContext, message_data: str) ->
     content = parsed_record.get(ATTRIBUTE_CONTENT, None)
     if content:
         if not isinstance(content, str):
+            # Content is shown to users as is, it keeps the json module formatting
             parsed_record[ATTRIBUTE_CONTENT] = json.dumps(parsed_record[ATTRIBUTE_CONTENT])
         if len(parsed_record[ATTRIBUTE_CONTENT]) > CONTENT_LENGTH_LIMIT:
             trimmed_len = CONTENT_LENGTH_LIMIT - len(DYNATRACE_LOG_INGEST_CONTENT_MARK_TRIMMED)
@@ -205,11 +215,11 @@ def _create_dt_log_payload(context: LogsProcessingContext, message_data: str) ->
 
 def _create_parsed_record(context: LogsProcessingContext, message_data: str):
     try:
-        record = json.loads(message_data)
+        record = json_codec.loads(message_data)
     except ValueError:
         record = {ATTRIBUTE_CONTENT: message_data}
     parsed_record = {}
-    _metadata_engine.apply(context, record, parsed_record)
+    get_metadata_engine().apply(context, record, parsed_record)
 
     if ATTRIBUTE_TIMESTAMP not in parsed_record.keys() or _is_invalid_datetime(
         parsed_record[ATTRIBUTE_TIMESTAMP]
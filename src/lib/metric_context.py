@@ -0,0 +1,70 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Creation of the MetricsContext of a polling, shared by the polling, autodiscovery and backfill.
+"""
+from datetime import datetime
+from typing import Optional
+
+from aiohttp import ClientSession
+
+from lib.configuration import config
+from lib.context import LoggingContext, MetricsContext, get_query_interval_minutes
+from lib.credentials import fetch_dynatrace_api_key, fetch_dynatrace_url
+from lib.fast_check import check_dynatrace, check_version
+
+
+async def get_metric_context(
+    gcp_session: ClientSession,
+    dt_session: ClientSession,
+    token: str,
+    logging_context: LoggingContext,
+    timestamp_utc: Optional[datetime] = None,
+    effective_interval_seconds: Optional[int] = None,
+) -> MetricsContext:
+    project_id_owner = config.project_id()
+
+    dynatrace_api_key = await fetch_dynatrace_api_key(
+        gcp_session=gcp_session, project_id=project_id_owner, token=token
+    )
+    dynatrace_url = await fetch_dynatrace_url(
+        gcp_session=gcp_session, project_id=project_id_owner, token=token
+    )
+    check_version(logging_context=logging_context)
+    await check_dynatrace(
+        logging_context=logging_context,
+        project_id=project_id_owner,
+        dt_session=dt_session,
+        dynatrace_url=dynatrace_url,
+        dynatrace_access_key=dynatrace_api_key,
+    )
+
+    query_interval_min = get_query_interval_minutes()
+    interval_seconds = effective_interval_seconds if effective_interval_seconds is not None else 60 * query_interval_min
+
+    context = MetricsContext(
+        gcp_session=gcp_session,
+        dt_session=dt_session,
+        project_id_owner=project_id_owner,
+        token=token,
+        execution_time=timestamp_utc or datetime.utcnow(),
+        execution_interval_seconds=interval_seconds,
+        dynatrace_api_key=dynatrace_api_key,
+        dynatrace_url=dynatrace_url,
+        print_metric_ingest_input=config.print_metric_ingest_input(),
+        self_monitoring_enabled=config.self_monitoring_enabled(),
+        scheduled_execution_id=logging_context.scheduled_execution_id,
+    )
+
+    return context
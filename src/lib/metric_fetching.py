@@ -0,0 +1,249 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Fetching and pushing the metrics of a project, shared by the polling and backfill.
+"""
+import asyncio
+import copy
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from lib.configuration import config
+from lib.context import MetricsContext, DynatraceConnectivity, get_query_interval_minutes
+from lib.entities.model import Entity
+from lib.metric_ingest import fetch_metric, fetch_metric_for_groupings, fetch_promql_metric, push_ingest_lines, \
+    flatten_and_enrich_metric_results, should_exclude_metric
+from lib.metrics import GCPService, Metric, IngestLine, AutodiscoveryGCPService
+from lib.sfm.for_metrics.metrics_definitions import SfmKeys
+from lib.topology.topology_cache import topology_cache
+from lib.utilities import read_labels_grouping_by_service_yaml, NO_GROUPING_CATEGORY
+
+
+async def fetch_ingest_lines_task(context: MetricsContext, project_id: str, services: List[GCPService],
+                                  disabled_apis: Set[str], excluded_metrics_and_dimensions: list,
+                                  monitored_project_ids: Optional[Set[str]] = None) -> List[IngestLine]:
+    """
+    Fetch ingest lines of all enabled services in project_id. With monitored_project_ids, project_id is
+    a scoping project whose queries return series of all these monitored projects.
+    """
+    # Log the polling time window for debugging
+    base_end_time = context.execution_time
+    base_start_time = base_end_time - context.execution_interval
+    interval_s = int(context.execution_interval.total_seconds())
+    default_interval_s = get_query_interval_minutes() * 60
+    interval_info = f"{interval_s}s" if interval_s == default_interval_s else f"{interval_s}s (catch-up from {default_interval_s}s)"
+    context.log(project_id, 
+        f"=== METRIC POLLING CYCLE === "
+        f"execution_time={base_end_time.strftime('%Y-%m-%d %H:%M:%S')}Z | "
+        f"query_window=[<={base_start_time.strftime('%H:%M:%S')}Z -> <={base_end_time.strftime('%H:%M:%S')}Z] | "
+        f"interval={interval_info}"
+    )
+
+    def set_groupings(service: GCPService, metric: Optional[Metric] = None):
+        service_name = service.name
+        if metric and metric.autodiscovered_metric and isinstance(service, AutodiscoveryGCPService):
+            linked = service.metrics_to_linking.get(metric.google_metric)
+            if linked and linked.possible_service_linking:
+                service_name = linked.possible_service_linking[0].name
+            else:
+                service_name = service.metrics_to_resources.get(metric.google_metric)
+
+        groupings = []
+        for configured_service_to_group in configured_services_to_group:
+            if configured_service_to_group.get("service") == service_name:
+                for configured_grouping in configured_service_to_group.get("groupings"):
+                    groupings.append(configured_grouping)
+        if not groupings:
+            groupings.append(NO_GROUPING_CATEGORY)
+
+        return groupings
+
+    fetch_metric_coros = []
+    metrics_metadata = []
+    topology: Dict[GCPService, Iterable[Entity]] = {}
+
+    # Topology fetching: retrieving additional instances info about enabled services
+    # Using metrics scope feature, fetching topology is not needed,
+    # because we can't fetch details from instances in other projects
+    if not config.scoping_project_support_enabled():
+        topology = await topology_cache.get_topology(context, project_id, services, disabled_apis)
+
+    # Using metrics scope feature, topology and disabled_apis will be empty, so no filtering is applied
+    # and metrics from all projects are being collected
+    skipped_services_with_no_instances = []
+    skipped_disabled_apis = set()
+    skipped_excluded_metrics = []
+
+    # Grouping by user_labels: per service, users can define groupings (based on user_labels)
+    # by which metrics will be queried. In this way, included labels will be added to metrics as dimensions.
+    # Default behavior: all metrics are collected with no added labels as dimensions.
+    configured_services_to_group = read_labels_grouping_by_service_yaml()
+    single_query_for_groupings = config.labels_grouping_single_query()
+
+    # Fetches past their deadline are shed
+    deadlines = context.polling_deadlines
+    def with_deadline(service: GCPService, fetch_coro):
+        return deadlines.run_fetch(context, project_id, service, fetch_coro) if deadlines else fetch_coro
+
+    for service in services:
+        if not service.is_enabled:
+            continue  # skip disabled services
+        if service in topology and not topology[service]:
+            skipped_services_with_no_instances.append(f"{service.name}/{service.feature_set}")
+            continue  # skip fetching the metrics because there are no instances
+
+        for metric in service.metrics:
+            if should_exclude_metric(metric.google_metric, excluded_metrics_and_dimensions):
+                context.log(f"Skipping fetching all the data for the metric {metric.google_metric}")
+                continue
+
+            # Fetch metric only if it's metric from extensions or is autodiscovered in project_id
+            if metric.autodiscovered_metric:
+                if monitored_project_ids is None and project_id not in metric.project_ids:
+                    continue
+                if monitored_project_ids is not None and monitored_project_ids.isdisjoint(metric.project_ids):
+                    continue
+
+            gcp_api_last_index = metric.google_metric.find("/")
+            api = metric.google_metric[:gcp_api_last_index]
+            if api in disabled_apis:
+                skipped_disabled_apis.add(api)
+                continue  # skip fetching the metrics because service API is disabled
+
+            labels_groupings = set_groupings(service, metric)
+            if single_query_for_groupings and len(labels_groupings) > 1 and not metric.distribution_percentiles:
+                # One query grouped by all grouping labels, each grouping is rolled up locally
+                fetch_metric_coros.append(with_deadline(service, run_fetch_metric_for_groupings(
+                    context=context, project_id=project_id, service=service, metric=metric,
+                    excluded_metrics_and_dimensions=excluded_metrics_and_dimensions, groupings=labels_groupings
+                )))
+                continue
+
+            for grouping in labels_groupings:
+                fetch_metric_coro = run_fetch_metric(
+                    context=context, project_id=project_id, service=service, metric=metric,
+                    excluded_metrics_and_dimensions=excluded_metrics_and_dimensions, grouping=grouping
+                )
+                fetch_metric_coros.append(with_deadline(service, fetch_metric_coro))
+
+        # Derived values defined as PromQL queries are computed by GCP, only the reduced series are fetched
+        for metric in service.promql_metrics:
+            fetch_metric_coros.append(with_deadline(service, run_fetch_promql_metric(
+                context=context, project_id=project_id, service=service, metric=metric
+            )))
+
+    context.log(f"Prepared {len(fetch_metric_coros)} fetch metric tasks")
+
+    if skipped_services_with_no_instances:
+        skipped_services_string = ', '.join(skipped_services_with_no_instances)
+        context.log(project_id, f"Skipped fetching metrics for {skipped_services_string} due to no instances detected")
+    if skipped_disabled_apis:
+        skipped_disabled_apis_string = ", ".join(skipped_disabled_apis)
+        context.log(project_id, f"Skipped fetching metrics for disabled APIs: {skipped_disabled_apis_string}")
+
+    if skipped_excluded_metrics:
+        context.log(project_id, f"Skipped fetching for excluded metrics: {', '.join(skipped_excluded_metrics)}")
+
+    fetch_metric_results = await asyncio.gather(*fetch_metric_coros, return_exceptions=True)
+    if not config.shared_http_sessions():
+        # The refresh uses the session of this cycle, which is closed when the cycle ends
+        await topology_cache.wait_for_refreshes(project_id)
+    # Otherwise the cached entities are used, a refresh still running is used from the next cycle on
+    entity_id_map = topology_cache.entity_id_map(project_id, topology)
+    flat_metric_results = flatten_and_enrich_metric_results(context, fetch_metric_results, entity_id_map)
+
+    flat_metric_results.extend(metrics_metadata)
+    return flat_metric_results
+
+
+async def run_fetch_metric(
+        context: MetricsContext,
+        project_id: str,
+        service: GCPService,
+        metric: Metric,
+        excluded_metrics_and_dimensions: list,
+        grouping: str
+):
+    try:
+        return await fetch_metric(context, project_id, service, metric, excluded_metrics_and_dimensions, grouping)
+    except Exception as e:
+        context.log(project_id, f"Failed to finish task for [{metric.google_metric}], reason is {type(e).__name__} {e}")
+        context.sfm[SfmKeys.failed_fetch_tasks].update(project_id, service.name)
+        return []
+
+
+async def run_fetch_metric_for_groupings(
+        context: MetricsContext,
+        project_id: str,
+        service: GCPService,
+        metric: Metric,
+        excluded_metrics_and_dimensions: list,
+        groupings: List[str]
+):
+    try:
+        return await fetch_metric_for_groupings(
+            context, project_id, service, metric, excluded_metrics_and_dimensions, groupings
+        )
+    except Exception as e:
+        context.log(project_id, f"Failed to finish task for [{metric.google_metric}], reason is {type(e).__name__} {e}")
+        context.sfm[SfmKeys.failed_fetch_tasks].update(project_id, service.name)
+        return []
+
+
+async def run_fetch_promql_metric(
+        context: MetricsContext,
+        project_id: str,
+        service: GCPService,
+        metric: Metric
+):
+    try:
+        return await fetch_promql_metric(context, project_id, service, metric)
+    except Exception as e:
+        context.log(project_id, f"Failed to finish PromQL task for [{metric.dynatrace_name}], reason is {type(e).__name__} {e}")
+        context.sfm[SfmKeys.failed_fetch_tasks].update(project_id, service.name)
+        return []
+
+
+_LIVE_POLLING_TIMINGS = {SfmKeys.setup_execution_time, SfmKeys.fetch_gcp_data_execution_time,
+                         SfmKeys.push_to_dynatrace_execution_time}
+
+
+async def fetch_and_push_window(context: MetricsContext, project_id: str, services: List[GCPService],
+                                disabled_apis: Set[str], excluded_metrics_and_dimensions: list,
+                                start: datetime, end: datetime) -> bool:
+    """
+    Fetch and push the past window from start to end of project_id. True if all fetches succeeded and none
+    of its lines was dropped, so the window doesn't need to be fetched again.
+    """
+    window_context = copy.copy(context)
+    window_context.execution_time = end
+    window_context.execution_interval = end - start
+    window_context.polling_deadlines = None
+    # Own SFM to tell dropped lines of this window apart, added to the SFM of context afterwards
+    window_context.sfm = {key: type(sfm_metric)() for key, sfm_metric in context.sfm.items()}
+    try:
+        ingest_lines = await fetch_ingest_lines_task(window_context, project_id, services, disabled_apis,
+                                                     excluded_metrics_and_dimensions)
+        await push_ingest_lines(window_context, project_id, ingest_lines)
+        return window_context.dynatrace_connectivity == DynatraceConnectivity.Ok and \
+            not window_context.sfm[SfmKeys.dynatrace_ingest_lines_dropped_count].value and \
+            not window_context.sfm[SfmKeys.failed_fetch_tasks].value
+    except Exception as e:
+        context.t_exception(f"Failed to fetch and push window ending {end} due to {e}")
+        return False
+    finally:
+        for key, sfm_metric in window_context.sfm.items():
+            # Per project timings are replaced on merge, they stay the ones of the live polling
+            if key not in _LIVE_POLLING_TIMINGS:
+                context.sfm[key].merge(sfm_metric)
@@ -12,11 +12,13 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 import asyncio
+import calendar
 import gzip
+import math
 import time
 from datetime import timezone, datetime, timedelta
 from http.client import InvalidURL
-from typing import Dict, List, Any, Optional, Set
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 
 from lib.configuration import config
 from lib.context import MetricsContext, LoggingContext, DynatraceConnectivity
@@ -24,6 +26,8 @@ from lib.entities.ids import _create_mmh3_hash
 from lib.entities.model import Entity
 from lib.metrics import (
     DISTRIBUTION_VALUE_KEY,
+    DOUBLE_VALUE_KEY,
+    INT_VALUE_KEY,
     TYPED_VALUE_KEY_MAPPING,
     AutodiscoveryGCPService,
     Dimension,
@@ -32,6 +36,9 @@ from lib.metrics import (
     IngestLine,
     Metric,
 )
+from lib import json_codec, monitoring_grpc
+from lib.json_stream import iter_json_array
+from lib.metric_sharding import ShardObservation, shard_planner
 from lib.sfm.for_metrics.metrics_definitions import SfmKeys
 from lib.utilities import NO_GROUPING_CATEGORY
 
@@ -40,10 +47,36 @@ MAX_DIMENSION_NAME_LENGTH = config.max_dimension_name_length()
 MAX_DIMENSION_VALUE_LENGTH = config.max_dimension_value_length()
 
 GCP_MONITORING_URL = config.gcp_monitoring_url()
+GCP_PROMETHEUS_URL = config.gcp_prometheus_url()
+METRICS_FETCH_BACKEND = config.metrics_fetch_backend()
+GCP_JSON_STREAMING = config.gcp_json_streaming()
 DT_SECURITY_CONTEXT_VALUE = config.get_dt_security_context_value()
 METRIC_SOURCE_DIMENSION_KEY = "dt.source"
 METRIC_SOURCE_DIMENSION_VALUE = "com.dynatrace.gcp"
 RESOURCE_LABEL_ALIASES = {"project_id": "gcp.project.id"}
+PROJECT_ID_GROUP_BY_FIELD = "resource.labels.project_id"
+
+# Partial response with only the parts of a series read during conversion, drops kinds, units, types and start times
+_TIME_SERIES_FIELDS = "timeSeries(valueType,metric/labels,resource/labels,metadata,points(interval/endTime,value)),nextPageToken"
+
+# Distribution metrics with percentiles enabled are queried per percentile instead of downloading buckets
+_DISTRIBUTION_PERCENTILE_REDUCERS = (
+    ("p50", "REDUCE_PERCENTILE_50"),
+    ("p95", "REDUCE_PERCENTILE_95"),
+    ("p99", "REDUCE_PERCENTILE_99"),
+)
+_DISTRIBUTION_PERCENTILE_FIELDS = (
+    "timeSeries(metric/labels,resource/labels,metadata,points(interval/endTime,value/doubleValue)),nextPageToken"
+)
+_DISTRIBUTION_SUMMARY_FIELDS = (
+    "timeSeries(metric/labels,resource/labels,metadata,"
+    "points(interval/endTime,value/distributionValue/count,value/distributionValue/mean)),nextPageToken"
+)
+
+_SHARD_KEY_IGNORED_PARAMS = frozenset({'interval.startTime', 'interval.endTime', 'pageToken'})
+# Series fetched by the shards of a query and not converted yet, bounded like a single streamed page
+_SHARD_SERIES_BUFFER = 100
+_SHARD_FINISHED = object()
 
 # Retry configuration for Dynatrace ingest API
 _RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
@@ -51,6 +84,19 @@ _MAX_PUSH_RETRIES = 3
 _INITIAL_RETRY_DELAY_S = 1.0
 _MAX_RETRY_AFTER_S = 10.0
 
+# GCP Monitoring quota errors (HTTP 429, RESOURCE_EXHAUSTED with gRPC) are retried after a backoff
+_MAX_FETCH_RETRIES = 3
+_INITIAL_FETCH_RETRY_DELAY_S = 2.0
+
+
+def _retry_delay(retry_after_header: Optional[str], attempt: int, initial_delay_s: float) -> float:
+    try:
+        if retry_after_header:
+            return min(float(retry_after_header), _MAX_RETRY_AFTER_S)
+    except (ValueError, TypeError):
+        pass
+    return initial_delay_s * (2 ** attempt)
+
 
 def find_excluded_metric(metric_name: str, excluded_metrics_and_dimensions: list):
     def metric_prefix(excluded_metric):
@@ -222,12 +268,7 @@ async def _push_to_dynatrace(context: MetricsContext, project_id: str, lines_bat
         # Retryable errors — retry with backoff
         if status in _RETRYABLE_STATUS_CODES and attempt < _MAX_PUSH_RETRIES:
             context.sfm[SfmKeys.dynatrace_request_count].increment(status)
-            retry_after_header = ingest_response.headers.get("Retry-After")
-            try:
-                delay = min(float(retry_after_header), _MAX_RETRY_AFTER_S) if retry_after_header \
-                    else _INITIAL_RETRY_DELAY_S * (2 ** attempt)
-            except (ValueError, TypeError):
-                delay = _INITIAL_RETRY_DELAY_S * (2 ** attempt)
+            delay = _retry_delay(ingest_response.headers.get("Retry-After"), attempt, _INITIAL_RETRY_DELAY_S)
             context.log(project_id,
                 f"Push attempt {attempt + 1}/{_MAX_PUSH_RETRIES + 1} got HTTP {status}, "
                 f"retrying in {delay}s")
@@ -328,14 +369,49 @@ class DtDimensionsMap:
         return dt_dimension_sorted_list
 
 
-async def fetch_metric(
+class MetricQuery:
+    """Prepared timeSeries.list parameters of a metric with everything needed to convert returned series."""
+
+    def __init__(
+            self,
+            params: List[Tuple[str, str]],
+            service_name: str,
+            service_dimensions: List[Dimension],
+            dt_dimensions_mapping: DtDimensionsMap,
+            effective_sample_period: Optional[timedelta],
+            excluded_source_dimensions: Set[str],
+            aggregate_locally: bool,
+    ):
+        self.params = params
+        self.service_name = service_name
+        self.service_dimensions = service_dimensions
+        self.dt_dimensions_mapping = dt_dimensions_mapping
+        self.effective_sample_period = effective_sample_period
+        self.excluded_source_dimensions = excluded_source_dimensions
+        self.aggregate_locally = aggregate_locally
+
+    @property
+    def reducer(self) -> str:
+        return dict(self.params)['aggregation.crossSeriesReducer']
+
+    def describe_series(
+            self, context: MetricsContext, metric: Metric, single_time_series: Dict
+    ) -> Tuple[List[DimensionValue], str]:
+        dimensions = create_dimensions(
+            context, self.service_name, single_time_series, self.dt_dimensions_mapping, metric,
+            self.effective_sample_period, self.excluded_source_dimensions
+        )
+        entity_id = create_entity_id(self.service_name, self.service_dimensions, single_time_series)
+        return dimensions, entity_id
+
+
+def prepare_metric_query(
         context: MetricsContext,
-        project_id: str,
         service: GCPService,
         metric: Metric,
         excluded_metrics_and_dimensions: list,
-        grouping: str
-) -> List[IngestLine]:
+        grouping_labels: List[str]
+) -> MetricQuery:
     end_time = (context.execution_time - metric.ingest_delay)
     start_time = (end_time - context.execution_interval)
 
@@ -386,67 +462,471 @@ async def fetch_metric(
     aligner = _set_aligner(metric.google_metric_kind, metric.value_type)
     reducer = _set_reducer(metric.google_metric_kind, metric.value_type)
 
+    aggregate_locally = (
+        bool(excluded_source_dimensions)
+        and metric.google_metric_kind.lower().startswith('cumulative')
+        and metric.value_type.lower() in ('int64', 'double', 'distribution')
+    )
+    if aggregate_locally and _can_reduce_server_side(metric, service_dimensions, excluded_source_dimensions):
+        # After ALIGN_DELTA GCP can sum the series across excluded dimensions, grouped by the kept fields only
+        reducer = 'REDUCE_SUM'
+        aggregate_locally = False
+
     params = [
         ('filter', f'metric.type = "{metric.google_metric}" {monitoring_filter}'.strip()),
         ('interval.startTime', start_time.isoformat() + "Z"),
         ('interval.endTime', end_time.isoformat() + "Z"),
         ('aggregation.alignmentPeriod', f"{alignment_period.total_seconds()}s"),
         ('aggregation.perSeriesAligner', aligner),
-        ('aggregation.crossSeriesReducer', reducer)
+        ('aggregation.crossSeriesReducer', reducer),
+        ('fields', _TIME_SERIES_FIELDS),
     ]
     params.extend(group_by_params)
 
+    for label in grouping_labels:
+        params.append(('aggregation.groupByFields', 'metadata.user_labels.' + label))
+
+    if config.metrics_scope_fan_in() and PROJECT_ID_GROUP_BY_FIELD not in excluded_source_dimensions \
+            and ('aggregation.groupByFields', PROJECT_ID_GROUP_BY_FIELD) not in params:
+        # Series of all monitored projects come from one query, they are split by project afterwards
+        params.append(('aggregation.groupByFields', PROJECT_ID_GROUP_BY_FIELD))
+
+    return MetricQuery(
+        params, service_name, service_dimensions, dt_dimensions_mapping, effective_sample_period,
+        excluded_source_dimensions, aggregate_locally
+    )
+
+
+def grouping_to_labels(grouping: str) -> List[str]:
+    labels = []
     for label in grouping.split(","):
         if label == NO_GROUPING_CATEGORY:
             break
-        params.append(('aggregation.groupByFields', 'metadata.user_labels.' + label))
+        labels.append(label)
+    return labels
 
+
+async def fetch_metric(
+        context: MetricsContext,
+        project_id: str,
+        service: GCPService,
+        metric: Metric,
+        excluded_metrics_and_dimensions: list,
+        grouping: str
+) -> List[IngestLine]:
+    query = prepare_metric_query(
+        context, service, metric, excluded_metrics_and_dimensions, grouping_to_labels(grouping)
+    )
     headers = context.create_gcp_request_headers(project_id)
 
-    should_fetch = True
+    def describe_series(single_time_series):
+        return query.describe_series(context, metric, single_time_series)
+
+    if metric.distribution_percentiles:
+        return await _fetch_distribution_percentiles(context, project_id, metric, query.params, headers, describe_series)
 
+    aggregate_locally = query.aggregate_locally
     lines = []
-    aggregate_locally = (
-        bool(excluded_source_dimensions)
-        and metric.google_metric_kind.lower().startswith('cumulative')
-        and metric.value_type.lower() in ('int64', 'double', 'distribution')
-    )
     aggregated_lines = {} if aggregate_locally else None
-    while should_fetch:
+    async for single_time_series in _list_time_series(context, project_id, query.params, headers):
+        typed_value_key = _extract_typed_value_key(single_time_series)
+        dimensions, entity_id = describe_series(single_time_series)
+
+        for point in single_time_series['points']:
+            line = _convert_point_to_ingest_line(
+                context, dimensions, metric, point, typed_value_key, entity_id, aggregate_locally
+            )
+            if line:
+                if aggregate_locally:
+                    _add_aggregated_line(aggregated_lines, line, metric.value_type)
+                else:
+                    lines.append(line)
+
+    return _finalize_aggregated_lines(aggregated_lines, metric) if aggregate_locally else lines
+
+
+async def fetch_metric_for_groupings(
+        context: MetricsContext,
+        project_id: str,
+        service: GCPService,
+        metric: Metric,
+        excluded_metrics_and_dimensions: list,
+        groupings: List[str]
+) -> List[IngestLine]:
+    """
+    Fetch a metric once, grouped by the union of labels of all groupings, and roll the series up locally
+    into each grouping. Summed metrics are summed over the labels a grouping doesn't include, averaged
+    metrics are queried as sum and count so that the rolled up mean is weighted like REDUCE_MEAN.
+    """
+    labels_by_grouping = {grouping: grouping_to_labels(grouping) for grouping in groupings}
+    union_labels = sorted({label for labels in labels_by_grouping.values() for label in labels})
+    query = prepare_metric_query(context, service, metric, excluded_metrics_and_dimensions, union_labels)
+    headers = context.create_gcp_request_headers(project_id)
+
+    if query.reducer == 'REDUCE_MEAN':
+        sum_params = _with_param(query.params, 'aggregation.crossSeriesReducer', 'REDUCE_SUM')
+        count_params = _with_param(query.params, 'aggregation.crossSeriesReducer', 'REDUCE_COUNT')
+        sum_series, count_series = await asyncio.gather(
+            _collect_time_series(context, project_id, sum_params, headers),
+            _collect_time_series(context, project_id, count_params, headers),
+        )
+    else:
+        sum_series = await _collect_time_series(context, project_id, query.params, headers)
+        count_series = None
+
+    lines = []
+    for labels in labels_by_grouping.values():
+        rolled_up = _roll_up_time_series(context, metric, query, sum_series, labels)
+        if count_series is not None:
+            counts = _roll_up_counts(context, metric, query, count_series, labels)
+            rolled_up = {
+                key: IngestLine(
+                    entity_id=line.entity_id,
+                    metric_name=line.metric_name,
+                    metric_type=line.metric_type,
+                    value=line.value / counts[key],
+                    timestamp=line.timestamp,
+                    dimension_values=line.dimension_values,
+                )
+                for key, line in rolled_up.items()
+                if counts.get(key)
+            }
+        lines.extend(_finalize_aggregated_lines(rolled_up, metric))
+
+    return lines
+
+
+async def _collect_time_series(
+        context: MetricsContext,
+        project_id: str,
+        params: List[Tuple[str, str]],
+        headers: Dict
+) -> List[Dict]:
+    return [single_time_series async for single_time_series in _list_time_series(context, project_id, params, headers)]
+
+
+def _restrict_user_labels(single_time_series: Dict, labels: List[str]) -> Dict:
+    metadata = single_time_series.get('metadata')
+    if not metadata or 'userLabels' not in metadata:
+        return single_time_series
+    user_labels = {key: value for key, value in metadata['userLabels'].items() if key in labels}
+    return {**single_time_series, 'metadata': {**metadata, 'userLabels': user_labels}}
+
+
+def _roll_up_time_series(
+        context: MetricsContext,
+        metric: Metric,
+        query: MetricQuery,
+        time_series: List[Dict],
+        labels: List[str]
+) -> Dict:
+    aggregated = {}
+    for single_time_series in time_series:
+        single_time_series = _restrict_user_labels(single_time_series, labels)
+        typed_value_key = _extract_typed_value_key(single_time_series)
+        dimensions, entity_id = query.describe_series(context, metric, single_time_series)
+        for point in single_time_series['points']:
+            line = _convert_point_to_ingest_line(
+                context, dimensions, metric, point, typed_value_key, entity_id, keep_distribution_stats=True
+            )
+            if line:
+                _add_aggregated_line(aggregated, line, single_time_series['valueType'])
+    return aggregated
+
+
+def _roll_up_counts(
+        context: MetricsContext,
+        metric: Metric,
+        query: MetricQuery,
+        time_series: List[Dict],
+        labels: List[str]
+) -> Dict:
+    counts = {}
+    for single_time_series in time_series:
+        single_time_series = _restrict_user_labels(single_time_series, labels)
+        dimensions, entity_id = query.describe_series(context, metric, single_time_series)
+        for point in single_time_series['points']:
+            # Count is not converted to an ingest line value, so it is never scaled by the metric unit
+            line = IngestLine(
+                entity_id, metric.dynatrace_name, metric.dynatrace_metric_type,
+                int(point['value'][INT_VALUE_KEY]), _point_timestamp(point), dimensions
+            )
+            key = _aggregation_key(line)
+            counts[key] = counts.get(key, 0) + line.value
+    return counts
+
+
+async def fetch_promql_metric(
+        context: MetricsContext,
+        project_id: str,
+        service: GCPService,
+        metric: Metric
+) -> List[IngestLine]:
+    """Run a PromQL range query of the service and convert every returned series like a timeSeries.list one."""
+    end_time = (context.execution_time - metric.ingest_delay)
+    start_time = (end_time - context.execution_interval)
+    step_seconds = int(metric.sample_period_seconds.total_seconds())
+    # Range queries include the start, the previous cycle already reported that point
+    params = [
+        ('query', metric.promql_query),
+        ('start', str(calendar.timegm(start_time.utctimetuple()) + step_seconds)),
+        ('end', str(calendar.timegm(end_time.utctimetuple()))),
+        ('step', f"{step_seconds}s"),
+    ]
+    url = f"{GCP_PROMETHEUS_URL}/projects/{project_id}/location/global/prometheus/api/v1/query_range"
+    headers = context.create_gcp_request_headers(project_id)
+
+    context.sfm[SfmKeys.gcp_metric_request_count].increment(project_id)
+    resp = await context.gcp_session.request('GET', url=url, params=params, headers=headers)
+    response = await resp.json(loads=json_codec.loads_api_response)
+    # response body is https://prometheus.io/docs/prometheus/latest/querying/api/#range-queries
+    if response.get('status') != 'success':
+        raise Exception(str(response))
+
+    dt_dimensions_mapping = DtDimensionsMap()
+    for dimension in service.dimensions:
+        if dimension.key_for_send_to_dynatrace:
+            dt_dimensions_mapping.add_label_mapping(dimension.key_for_fetch_metric, dimension.key_for_send_to_dynatrace)
+    resource_labels = {dimension.key_for_create_entity_id for dimension in service.dimensions} | {"project_id"}
+
+    lines = []
+    for result in response.get('data', {}).get('result', []):
+        labels = {name: value for name, value in result.get('metric', {}).items() if name != '__name__'}
+        single_time_series = {
+            'resource': {'labels': {name: value for name, value in labels.items() if name in resource_labels}},
+            'metric': {'labels': {name: value for name, value in labels.items() if name not in resource_labels}},
+        }
+        dimensions = create_dimensions(context, service.name, single_time_series, dt_dimensions_mapping, metric)
+        entity_id = create_entity_id(service.name, service.dimensions, single_time_series)
+
+        for timestamp, value in result.get('values', []):
+            value = float(value)
+            if math.isnan(value) or math.isinf(value):
+                continue
+            point = {
+                'interval': {'endTime': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(float(timestamp)))},
+                'value': {DOUBLE_VALUE_KEY: value},
+            }
+            line = _convert_point_to_ingest_line(context, dimensions, metric, point, DOUBLE_VALUE_KEY, entity_id)
+            if line:
+                lines.append(line)
+
+    return lines
+
+
+async def _list_time_series(
+        context: MetricsContext,
+        project_id: str,
+        params: List[Tuple[str, str]],
+        headers: Dict
+) -> AsyncIterator[Dict]:
+    if not shard_planner.enabled:
+        async for single_time_series in _list_time_series_pages(context, project_id, params, headers):
+            yield single_time_series
+        return
+
+    shard_key = _shard_key(project_id, params)
+    shard_clauses = shard_planner.plan(shard_key)
+    observation = ShardObservation()
+
+    if not shard_clauses:
+        async for single_time_series in _list_time_series_pages(context, project_id, params, headers, observation):
+            yield single_time_series
+    else:
+        context.log(project_id, f"Fetching [{dict(params)['filter']}] in {len(shard_clauses)} concurrent shards")
+        async for single_time_series in _list_shards_time_series(context, project_id, params, headers,
+                                                                 shard_clauses, observation):
+            yield single_time_series
+
+    shard_planner.record(shard_key, observation)
+
+
+async def _list_time_series_pages(
+        context: MetricsContext,
+        project_id: str,
+        params: List[Tuple[str, str]],
+        headers: Dict,
+        observation: Optional[ShardObservation] = None
+) -> AsyncIterator[Dict]:
+    params = list(params)
+    url = f"{GCP_MONITORING_URL}/projects/{project_id}/timeSeries"
+    while True:
         context.sfm[SfmKeys.gcp_metric_request_count].increment(project_id)
 
-        url = f"{GCP_MONITORING_URL}/projects/{project_id}/timeSeries"
-        resp = await context.gcp_session.request('GET', url=url, params=params, headers=headers)
-        page = await resp.json()
+        page = {}
+        async for single_time_series in _fetch_time_series_page(context, url, project_id, params, headers, page):
+            if observation:
+                observation.observe_series(single_time_series)
+            yield single_time_series
+
         # response body is https://cloud.google.com/monitoring/api/ref_v3/rest/v3/projects.timeSeries/list#response-body
         if 'error' in page:
             raise Exception(str(page))
-        if 'timeSeries' not in page:
-            break
+        if observation:
+            observation.observe_page()
 
-        for single_time_series in page['timeSeries']:
-            typed_value_key = _extract_typed_value_key(single_time_series)
-            dimensions = create_dimensions(
-                context, service_name, single_time_series, dt_dimensions_mapping, metric,
-                effective_sample_period, excluded_source_dimensions
-            )
-            entity_id = create_entity_id(service_name, service_dimensions, single_time_series)
+        next_page_token = page.get('nextPageToken', None)
+        if not next_page_token:
+            return
+        _update_params(next_page_token, params)
 
-            for point in single_time_series['points']:
-                line = _convert_point_to_ingest_line(context, dimensions, metric, point, typed_value_key, entity_id)
-                if line:
-                    if aggregate_locally:
-                        _add_aggregated_line(aggregated_lines, line, metric.value_type)
-                    else:
-                        lines.append(line)
 
-        next_page_token = page.get('nextPageToken', None)
-        if next_page_token:
-            _update_params(next_page_token, params)
+async def _fetch_time_series_page(
+        context: MetricsContext,
+        url: str,
+        project_id: str,
+        params: List[Tuple[str, str]],
+        headers: Dict,
+        page: Dict
+) -> AsyncIterator[Dict]:
+    """Yield the series of one page, all other members of the response body are put into page."""
+    if METRICS_FETCH_BACKEND == 'grpc':
+        for attempt in range(_MAX_FETCH_RETRIES + 1):
+            grpc_page = await monitoring_grpc.request_time_series_page(project_id, params, headers)
+            if grpc_page.get('error', {}).get('status') != 'RESOURCE_EXHAUSTED' or attempt == _MAX_FETCH_RETRIES:
+                break
+            await _back_off_gcp_quota(context, project_id, attempt, None)
+        page.update(grpc_page)
+    else:
+        for attempt in range(_MAX_FETCH_RETRIES + 1):
+            resp = await context.gcp_session.request('GET', url=url, params=params, headers=headers)
+            if resp.status != 429 or attempt == _MAX_FETCH_RETRIES:
+                break
+            retry_after_header = resp.headers.get("Retry-After")
+            resp.release()
+            await _back_off_gcp_quota(context, project_id, attempt, retry_after_header)
+        if GCP_JSON_STREAMING:
+            # Series are decoded one by one while the body arrives instead of building the whole page first
+            async for single_time_series in iter_json_array(resp, 'timeSeries', page):
+                yield single_time_series
+            return
+        page.update(await resp.json(loads=json_codec.loads_api_response))
+
+    for single_time_series in page.pop('timeSeries', []):
+        yield single_time_series
+
+
+async def _back_off_gcp_quota(context: MetricsContext, project_id: str, attempt: int,
+                              retry_after_header: Optional[str]):
+    delay = _retry_delay(retry_after_header, attempt, _INITIAL_FETCH_RETRY_DELAY_S)
+    context.log(project_id, f"GCP Monitoring quota exceeded, retry {attempt + 1}/{_MAX_FETCH_RETRIES} in {delay}s")
+    await asyncio.sleep(delay)
+
+
+async def _list_shards_time_series(
+        context: MetricsContext,
+        project_id: str,
+        params: List[Tuple[str, str]],
+        headers: Dict,
+        shard_clauses: List[str],
+        observation: ShardObservation
+) -> AsyncIterator[Dict]:
+    """Yield the series of all shards as they arrive, shards wait while the consumer is behind."""
+    arrived = asyncio.Queue(maxsize=_SHARD_SERIES_BUFFER)
+
+    async def fetch_shard(shard_clause: str):
+        try:
+            shard_params = _with_shard_filter(params, shard_clause)
+            async for single_time_series in _list_time_series_pages(context, project_id, shard_params, headers,
+                                                                    observation):
+                await arrived.put(single_time_series)
+        except Exception as e:
+            await arrived.put(e)
         else:
-            should_fetch = False
+            await arrived.put(_SHARD_FINISHED)
+
+    shard_tasks = [asyncio.create_task(fetch_shard(shard_clause)) for shard_clause in shard_clauses]
+    try:
+        running_shards = len(shard_tasks)
+        while running_shards:
+            item = await arrived.get()
+            if item is _SHARD_FINISHED:
+                running_shards -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for shard_task in shard_tasks:
+            shard_task.cancel()
+
+
+def _shard_key(project_id: str, params: List[Tuple[str, str]]):
+    # The query window moves every cycle, everything else identifies the same query
+    return project_id, tuple(param for param in params if param[0] not in _SHARD_KEY_IGNORED_PARAMS)
+
+
+def _with_shard_filter(params: List[Tuple[str, str]], shard_clause: str) -> List[Tuple[str, str]]:
+    return [
+        # Parentheses keep the shards disjoint for filters with OR
+        (name, f"({value}) AND ({shard_clause})" if name == 'filter' else value)
+        for name, value in params
+    ]
+
+
+async def _fetch_distribution_percentiles(
+        context: MetricsContext,
+        project_id: str,
+        metric: Metric,
+        params: List[Tuple[str, str]],
+        headers: Dict,
+        describe_series: Callable[[Dict], Tuple[List[DimensionValue], str]]
+) -> List[IngestLine]:
+    """
+    Query percentiles and count/sum of a distribution metric instead of full distributions.
+    Percentiles are computed by GCP (REDUCE_PERCENTILE_*) and count/sum come from a response
+    with bucket fields masked out, so bucketCounts/bucketOptions are never downloaded.
+    """
+    async def fetch_percentile(suffix: str, reducer: str) -> List[IngestLine]:
+        percentile_params = _with_param(params, 'aggregation.crossSeriesReducer', reducer)
+        percentile_params = _with_param(percentile_params, 'fields', _DISTRIBUTION_PERCENTILE_FIELDS)
+        lines = []
+        async for single_time_series in _list_time_series(context, project_id, percentile_params, headers):
+            dimensions, entity_id = describe_series(single_time_series)
+            for point in single_time_series['points']:
+                value = point['value'].get(DOUBLE_VALUE_KEY)
+                if value is None:
+                    continue
+                if metric.unit == UNIT_10TO2PERCENT:
+                    value = 100 * value
+                lines.append(IngestLine(
+                    entity_id, f"{metric.dynatrace_name}.{suffix}", "gauge", value,
+                    _point_timestamp(point), dimensions.copy()
+                ))
+        return lines
+
+    async def fetch_count_and_sum() -> List[IngestLine]:
+        summary_params = _with_param(params, 'aggregation.crossSeriesReducer', 'REDUCE_SUM')
+        summary_params = _with_param(summary_params, 'fields', _DISTRIBUTION_SUMMARY_FIELDS)
+        lines = []
+        async for single_time_series in _list_time_series(context, project_id, summary_params, headers):
+            dimensions, entity_id = describe_series(single_time_series)
+            for point in single_time_series['points']:
+                distribution = point['value'].get(DISTRIBUTION_VALUE_KEY, {})
+                count = int(distribution.get('count', '0'))
+                if count == 0:
+                    continue
+                dist_sum = distribution.get('mean', 0) * count
+                if metric.unit == UNIT_10TO2PERCENT:
+                    dist_sum = 100 * dist_sum
+                timestamp = _point_timestamp(point)
+                lines.append(IngestLine(
+                    entity_id, f"{metric.dynatrace_name}.count", "count", count, timestamp, dimensions.copy()
+                ))
+                lines.append(IngestLine(
+                    entity_id, f"{metric.dynatrace_name}.sum", "count", dist_sum, timestamp, dimensions.copy()
+                ))
+        return lines
+
+    results = await asyncio.gather(
+        *[fetch_percentile(suffix, reducer) for suffix, reducer in _DISTRIBUTION_PERCENTILE_REDUCERS],
+        fetch_count_and_sum()
+    )
+    return [line for lines in results for line in lines]
+
 
-    return list(aggregated_lines.values()) if aggregate_locally else lines
+def _with_param(params: List[Tuple[str, str]], name: str, value: str) -> List[Tuple[str, str]]:
+    return [(param_name, value if param_name == name else param_value) for param_name, param_value in params]
 
 
 def _set_aligner(metric_kind, value_type):
@@ -473,21 +953,36 @@ def _set_reducer(metric_kind, value_type):
     return reducer
 
 
-def _add_aggregated_line(aggregated: Dict, line: IngestLine, value_type: str):
-    key = (
+def _can_reduce_server_side(metric: Metric, service_dimensions: List[Dimension], excluded_source_dimensions: Set[str]):
+    if not config.cumulative_server_side_reduction():
+        return False
+    # Distribution min/max are estimated per source series, summing buckets in GCP would change them
+    if metric.value_type.lower() not in ('int64', 'double'):
+        return False
+    # Entity id is built from service dimensions, so series of different entities must not be merged
+    entity_dimensions = {dimension.key_for_fetch_metric for dimension in service_dimensions}
+    return not entity_dimensions & excluded_source_dimensions
+
+
+def _aggregation_key(line: IngestLine):
+    return (
         line.entity_id,
         line.metric_name,
         line.metric_type,
         line.timestamp,
         tuple(sorted(line.dimension_values, key=lambda dimension: (dimension.name, dimension.value))),
     )
+
+
+def _add_aggregated_line(aggregated: Dict, line: IngestLine, value_type: str):
+    key = _aggregation_key(line)
     existing = aggregated.get(key)
     if existing is None:
         aggregated[key] = line
         return
 
     if value_type.lower() == 'distribution':
-        value = _merge_distribution_values(existing.value, line.value)
+        value = existing.value.merge(line.value)
     elif value_type.lower() == 'int64':
         value = int(existing.value) + int(line.value)
     elif value_type.lower() == 'double':
@@ -505,24 +1000,21 @@ def _add_aggregated_line(aggregated: Dict, line: IngestLine, value_type: str):
     )
 
 
-def _merge_distribution_values(first: str, second: str) -> str:
-    first_values = _parse_distribution_value(first)
-    second_values = _parse_distribution_value(second)
-    return _gauge_line(
-        min(float(first_values['min']), float(second_values['min'])),
-        max(float(first_values['max']), float(second_values['max'])),
-        int(first_values['count']) + int(second_values['count']),
-        float(first_values['sum']) + float(second_values['sum']),
-        None,
-    )
-
+def _finalize_aggregated_lines(aggregated: Dict, metric: Metric) -> List[IngestLine]:
+    if metric.value_type.lower() != 'distribution':
+        return list(aggregated.values())
 
-def _parse_distribution_value(value: str) -> Dict[str, str]:
-    result = {}
-    for item in value.split(','):
-        key, item_value = item.split('=', 1)
-        result[key] = item_value
-    return result
+    return [
+        IngestLine(
+            entity_id=line.entity_id,
+            metric_name=line.metric_name,
+            metric_type=line.metric_type,
+            value=line.value.to_gauge_line(metric.unit),
+            timestamp=line.timestamp,
+            dimension_values=line.dimension_values,
+        )
+        for line in aggregated.values()
+    ]
 
 
 def _update_params(next_page_token, params):
@@ -706,6 +1198,19 @@ def flatten_and_enrich_metric_results(
     return results
 
 
+def split_ingest_lines_by_project(lines: List[IngestLine], default_project_id: str) -> Dict[str, List[IngestLine]]:
+    """Split lines fetched through a metrics scope by the monitored project their series came from."""
+    project_id_dimension = RESOURCE_LABEL_ALIASES["project_id"]
+    lines_by_project: Dict[str, List[IngestLine]] = {}
+    for line in lines:
+        project_id = next(
+            (dimension.value for dimension in line.dimension_values if dimension.name == project_id_dimension),
+            default_project_id
+        )
+        lines_by_project.setdefault(project_id, []).append(line)
+    return lines_by_project
+
+
 def create_entity_id(service_name: str, service_dimensions: List[Dimension], time_series):
     resource = time_series['resource']
     resource_labels = resource.get('labels', {})
@@ -720,14 +1225,7 @@ def create_entity_id(service_name: str, service_dimensions: List[Dimension], tim
     return entity_id
 
 
-def _convert_point_to_ingest_line(
-        context: MetricsContext,
-        dimensions: List[DimensionValue],
-        metric: Metric,
-        point: Dict,
-        typed_value_key: str,
-        entity_id: str
-) -> IngestLine:
+def _point_timestamp(point: Dict) -> int:
     # Why endtime? see https://cloud.google.com/monitoring/api/ref_v3/rest/v3/TimeInterval
     timestamp_iso = point['interval']['endTime']
 
@@ -737,12 +1235,27 @@ def _convert_point_to_ingest_line(
         timestamp_parsed = datetime.strptime(timestamp_iso, "%Y-%m-%dT%H:%M:%S.%fZ")
 
     timestamp_datetime = timestamp_parsed.replace(tzinfo=timezone.utc)
-    timestamp = int(timestamp_datetime.timestamp() * 1000)
+    return int(timestamp_datetime.timestamp() * 1000)
+
+
+def _convert_point_to_ingest_line(
+        context: MetricsContext,
+        dimensions: List[DimensionValue],
+        metric: Metric,
+        point: Dict,
+        typed_value_key: str,
+        entity_id: str,
+        keep_distribution_stats: bool = False
+) -> IngestLine:
+    timestamp = _point_timestamp(point)
 
     value = None
     line = None
     try:
-        value = extract_value(point, typed_value_key, metric)
+        if keep_distribution_stats and typed_value_key == DISTRIBUTION_VALUE_KEY:
+            value = extract_distribution_stats(point['value'][typed_value_key])
+        else:
+            value = extract_value(point, typed_value_key, metric)
     except Exception as e:
         context.log(f"Failed to extract value from data point: {point}, due to {type(e).__name__} {e}")
 
@@ -767,69 +1280,92 @@ def _gauge_line(dist_min, dist_max, dist_count, dist_sum, dist_unit) -> str:
     return f"min={dist_min},max={dist_max},count={dist_count},sum={dist_sum}"
 
 
+class DistributionStats(NamedTuple):
+    min: float
+    max: float
+    count: int
+    sum: float
+
+    def merge(self, other: "DistributionStats") -> "DistributionStats":
+        return DistributionStats(
+            float(min(self.min, other.min)),
+            float(max(self.max, other.max)),
+            self.count + other.count,
+            float(self.sum + other.sum),
+        )
+
+    def to_gauge_line(self, unit) -> str:
+        return _gauge_line(self.min, self.max, self.count, self.sum, unit)
+
+
 def extract_value(point, typed_value_key: str, metric: Metric):
     value = point['value'][typed_value_key]
     if typed_value_key == DISTRIBUTION_VALUE_KEY:
-        count = int(value.get('count', '0'))
-
-        if count == 0:
-            return None
-        elif 'mean' in value:
-            mean = value['mean']
-            sum = mean * count
-            min = mean
-            max = mean
-        else:
-            sum = 0
-            min = 0
-            max = 0
-
-        # No point in calculating min and max from distribution here
-        if count == 1 or count == 2:
-            return _gauge_line(min, max, count, sum, metric.unit)
-
-        bucket_options = value['bucketOptions']
-        bucket_counts = [int(bucket_count) for bucket_count in value['bucketCounts']]
-        bucket_counts_length = len(bucket_counts)
-
-        max_bucket = bucket_counts_length - 1
-        min_bucket = max_bucket
-        for index, bucket_count in enumerate(bucket_counts):
-            if bucket_count > 0:
-                min_bucket = index
-                break
-
-        # https://cloud.google.com/monitoring/api/ref_v3/rest/v3/TypedValue#exponential
-        if 'exponentialBuckets' in bucket_options:
-            exponential_buckets_options = bucket_options['exponentialBuckets']
-            num_finite_buckets = exponential_buckets_options['numFiniteBuckets']
-            if bucket_counts_length < num_finite_buckets and min_bucket != 0:
-                growth_factor = exponential_buckets_options['growthFactor']
-                scale = exponential_buckets_options['scale']
-
-                min = scale * (growth_factor ** (min_bucket - 1))
-                max = scale * (growth_factor ** max_bucket)
-        elif 'linearBuckets' in bucket_options:
-            linear_bucket_options = bucket_options['linearBuckets']
-            num_finite_buckets = linear_bucket_options['numFiniteBuckets']
-
-            if bucket_counts_length < num_finite_buckets and min_bucket != 0 \
-                    and 'offset' in linear_bucket_options and 'width' in linear_bucket_options:
-                offset = linear_bucket_options["offset"]
-                width = linear_bucket_options["width"]
-
-                min = offset + (width * (min_bucket - 1))
-                max = offset + (width * max_bucket)
-        elif 'explicitBuckets' in bucket_options:
-            bounds = bucket_options['explicitBuckets']['bounds']
-            if min_bucket != 0 and bounds:
-                # lower bound of the first non-empty bucket
-                min = bounds[min_bucket - 1] if min_bucket - 1 < len(bounds) else bounds[-1]
-                # upper bound of the last bucket (overflow bucket has no finite upper bound)
-                max = bounds[max_bucket] if max_bucket < len(bounds) else bounds[-1]
-
-        return _gauge_line(min, max, count, sum, metric.unit)
+        stats = extract_distribution_stats(value)
+        return stats.to_gauge_line(metric.unit) if stats else None
     else:
         if metric.unit == UNIT_10TO2PERCENT:
             value = 100 * value
         return value
+
+
+def extract_distribution_stats(value: Dict) -> Optional[DistributionStats]:
+    count = int(value.get('count', '0'))
+
+    if count == 0:
+        return None
+    elif 'mean' in value:
+        mean = value['mean']
+        sum = mean * count
+        min = mean
+        max = mean
+    else:
+        sum = 0
+        min = 0
+        max = 0
+
+    # No point in calculating min and max from distribution here
+    if count == 1 or count == 2:
+        return DistributionStats(min, max, count, sum)
+
+    bucket_options = value['bucketOptions']
+    bucket_counts = [int(bucket_count) for bucket_count in value['bucketCounts']]
+    bucket_counts_length = len(bucket_counts)
+
+    max_bucket = bucket_counts_length - 1
+    min_bucket = max_bucket
+    for index, bucket_count in enumerate(bucket_counts):
+        if bucket_count > 0:
+            min_bucket = index
+            break
+
+    # https://cloud.google.com/monitoring/api/ref_v3/rest/v3/TypedValue#exponential
+    if 'exponentialBuckets' in bucket_options:
+        exponential_buckets_options = bucket_options['exponentialBuckets']
+        num_finite_buckets = exponential_buckets_options['numFiniteBuckets']
+        if bucket_counts_length < num_finite_buckets and min_bucket != 0:
+            growth_factor = exponential_buckets_options['growthFactor']
+            scale = exponential_buckets_options['scale']
+
+            min = scale * (growth_factor ** (min_bucket - 1))
+            max = scale * (growth_factor ** max_bucket)
+    elif 'linearBuckets' in bucket_options:
+        linear_bucket_options = bucket_options['linearBuckets']
+        num_finite_buckets = linear_bucket_options['numFiniteBuckets']
+
+        if bucket_counts_length < num_finite_buckets and min_bucket != 0 \
+                and 'offset' in linear_bucket_options and 'width' in linear_bucket_options:
+            offset = linear_bucket_options["offset"]
+            width = linear_bucket_options["width"]
+
+            min = offset + (width * (min_bucket - 1))
+            max = offset + (width * max_bucket)
+    elif 'explicitBuckets' in bucket_options:
+        bounds = bucket_options['explicitBuckets']['bounds']
+        if min_bucket != 0 and bounds:
+            # lower bound of the first non-empty bucket
+            min = bounds[min_bucket - 1] if min_bucket - 1 < len(bounds) else bounds[-1]
+            # upper bound of the last bucket (overflow bucket has no finite upper bound)
+            max = bounds[max_bucket] if max_bucket < len(bounds) else bounds[-1]
+
+    return DistributionStats(min, max, count, sum)
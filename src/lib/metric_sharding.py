@@ -0,0 +1,146 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Adaptive sharding of huge timeSeries.list queries.
+
+A query whose last fetch needed more pages than the configured threshold is split into disjoint
+filter shards which are fetched concurrently. Shards partition either the values of a location label
+observed in the previous fetch, or the last character of the label with the most distinct values.
+Every plan ends with a remainder shard matching everything the other shards don't, so series with
+label values that were not seen before are never lost. Only observations of queries above the threshold
+are kept, until the query is not fetched for a few pollings.
+"""
+import math
+import string
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from lib.configuration import config
+from lib.context import get_query_interval_minutes
+
+# Preferred shard labels - low cardinality, evenly spread and short enough to list in one_of()
+_LOCATION_LABELS = ("resource.labels.zone", "resource.labels.location", "resource.labels.region")
+_HASH_BUCKET_CHARACTERS = string.digits + string.ascii_lowercase
+_MAX_TRACKED_LABEL_VALUES = 1000
+# Queries not fetched in this many pollings are forgotten, e.g. of a removed project or service
+_OBSERVATION_MAX_AGE_POLLINGS = 3
+
+
+class ShardObservation:
+    """Pages and resource label values seen while fetching a query once."""
+
+    def __init__(self) -> None:
+        self.pages = 0
+        self.series_by_label_value: Dict[str, Dict[str, int]] = {}
+
+    def observe_page(self) -> None:
+        self.pages += 1
+
+    def observe_series(self, single_time_series: Dict) -> None:
+        for label, value in single_time_series.get('resource', {}).get('labels', {}).items():
+            values = self.series_by_label_value.setdefault(f"resource.labels.{label}", {})
+            if value in values or len(values) < _MAX_TRACKED_LABEL_VALUES:
+                values[value] = values.get(value, 0) + 1
+
+
+class MetricShardPlanner:
+    def __init__(self, page_threshold: int, max_shards: int, observation_max_age_seconds: float = math.inf,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.page_threshold = page_threshold
+        self.max_shards = max(1, max_shards)
+        self.observation_max_age_seconds = observation_max_age_seconds
+        self._clock = clock
+        self._last_observations: Dict[Hashable, Tuple[float, ShardObservation]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.page_threshold > 0 and self.max_shards > 1
+
+    def plan(self, key: Hashable) -> List[str]:
+        """Return filter clauses of disjoint shards for the query, empty list if it should not be sharded."""
+        _, observation = self._last_observations.get(key, (None, None))
+        if not self.enabled or not observation or observation.pages <= self.page_threshold:
+            return []
+
+        shard_count = min(self.max_shards, math.ceil(observation.pages / self.page_threshold))
+        label, values = _choose_shard_label(observation)
+        if label is None:
+            return []
+
+        if label in _LOCATION_LABELS:
+            return _value_shards(label, values, shard_count)
+        return _hash_bucket_shards(label, shard_count)
+
+    def record(self, key: Hashable, observation: ShardObservation) -> None:
+        now = self._clock()
+        self._evict_expired(now)
+        if observation.pages > self.page_threshold:
+            self._last_observations[key] = (now, observation)
+        else:
+            # Not sharded in the next fetch, nothing to keep
+            self._last_observations.pop(key, None)
+
+    def _evict_expired(self, now: float) -> None:
+        for key, (recorded_at, _) in list(self._last_observations.items()):
+            if now - recorded_at >= self.observation_max_age_seconds:
+                del self._last_observations[key]
+
+
+def _choose_shard_label(observation: ShardObservation) -> Tuple[Optional[str], Dict[str, int]]:
+    for label in _LOCATION_LABELS:
+        values = observation.series_by_label_value.get(label, {})
+        if len(values) > 1:
+            return label, values
+
+    best_label, best_values = None, {}
+    for label, values in observation.series_by_label_value.items():
+        if len(values) > max(1, len(best_values)):
+            best_label, best_values = label, values
+    return best_label, best_values
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _value_shards(label: str, series_by_value: Dict[str, int], shard_count: int) -> List[str]:
+    # Greedy balancing: the biggest remaining value goes to the shard with the fewest series so far
+    shard_count = min(shard_count, len(series_by_value))
+    shards: List[Tuple[int, List[str]]] = [(0, []) for _ in range(shard_count)]
+    for value, series_count in sorted(series_by_value.items(), key=lambda item: (-item[1], item[0])):
+        index = min(range(shard_count), key=lambda i: shards[i][0])
+        shards[index] = (shards[index][0] + series_count, shards[index][1] + [value])
+
+    all_values = ",".join(_quote(value) for value in sorted(series_by_value))
+    clauses = [f'{label} = one_of({",".join(_quote(value) for value in sorted(values))})' for _, values in shards]
+    clauses.append(f'NOT {label} = one_of({all_values})')
+    return clauses
+
+
+def _hash_bucket_shards(label: str, shard_count: int) -> List[str]:
+    shard_count = min(shard_count, len(_HASH_BUCKET_CHARACTERS))
+    buckets = ["" for _ in range(shard_count)]
+    for index, character in enumerate(_HASH_BUCKET_CHARACTERS):
+        buckets[index % shard_count] += character
+
+    clauses = [f'{label} = monitoring.regex.full_match(".*[{bucket}]")' for bucket in buckets]
+    clauses.append(f'NOT {label} = monitoring.regex.full_match(".*[{_HASH_BUCKET_CHARACTERS}]")')
+    return clauses
+
+
+shard_planner = MetricShardPlanner(
+    page_threshold=config.metric_sharding_page_threshold(),
+    max_shards=config.metric_sharding_max_shards(),
+    observation_max_age_seconds=_OBSERVATION_MAX_AGE_POLLINGS * get_query_interval_minutes() * 60,
+)
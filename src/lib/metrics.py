@@ -146,6 +146,8 @@ class Metric:
     autodiscovered_metric: bool
     description: str
     project_ids: List[str]
+    distribution_percentiles: bool
+    promql_query: Optional[str]
 
     def __init__(self, **kwargs):
         gcp_options = kwargs.get("gcpOptions", {})
@@ -160,9 +162,16 @@ class Metric:
         object.__setattr__(self, "autodiscovered_metric", kwargs.get("autodiscovered_metric", False))
         object.__setattr__(self, "description", kwargs.get("description", ""))
         object.__setattr__(self, "project_ids", kwargs.get("project_ids", []))
+        object.__setattr__(self, "promql_query", kwargs.get("promql_query", None))
 
         object.__setattr__(self, "dimensions", [Dimension(**x) for x in kwargs.get("dimensions", {})])
 
+        percentile_metric_prefixes = kwargs.get("distribution_percentile_metrics", None) or []
+        object.__setattr__(self, "distribution_percentiles", (
+            self.value_type.upper() == "DISTRIBUTION"
+            and any(self.google_metric.startswith(prefix) for prefix in percentile_metric_prefixes if prefix)
+        ))
+
         ingest_delay = kwargs.get("gcpOptions", {}).get("ingestDelay", None)
         if ingest_delay:
             object.__setattr__(self, "ingest_delay", timedelta(seconds=ingest_delay))
@@ -201,6 +210,7 @@ class GCPService:
     feature_set: Text
     dimensions: List[Dimension]
     metrics:  List[Metric]
+    promql_metrics: List[Metric]
     monitoring_filter: Text
     activation: Dict[Text, Any]
     min_sample_period_override: int
@@ -228,12 +238,25 @@ class GCPService:
                     f"Invalid minSamplePeriodOverride value {raw_min_sp_override!r} for service {service_name}; using default of 0"
                 )
 
+        distribution_percentile_metrics = activation.get("distributionPercentiles", None) or []
+        if not isinstance(distribution_percentile_metrics, list):
+            LoggingContext(None).log(
+                f"Invalid distributionPercentiles value {distribution_percentile_metrics!r} for service "
+                f"{kwargs.get('service', '')}; expected list of metric types"
+            )
+            distribution_percentile_metrics = []
+
         object.__setattr__(self, "metrics", [
-            Metric(**x, min_sample_period_override=min_sp_override)
+            Metric(
+                **x,
+                min_sample_period_override=min_sp_override,
+                distribution_percentile_metrics=distribution_percentile_metrics,
+            )
             for x
             in kwargs.get("metrics", {})
             if x.get("gcpOptions", {}).get("valueType", "").upper() != "STRING"
         ])
+        object.__setattr__(self, "promql_metrics", _create_promql_metrics(kwargs.get("service", ""), activation))
         object.__setattr__(self, "activation", activation)
         object.__setattr__(self, "min_sample_period_override", min_sp_override)
 
@@ -255,6 +278,38 @@ class GCPService:
         return hash((self.name, self.technology_name, self.feature_set, self.monitoring_filter))
 
 
+def _create_promql_metrics(service_name: str, activation: Dict[Text, Any]) -> List[Metric]:
+    promql_queries = activation.get("promqlQueries", None) or []
+    if not isinstance(promql_queries, list):
+        LoggingContext(None).log(
+            f"Invalid promqlQueries value {promql_queries!r} for service {service_name}; expected list of queries"
+        )
+        return []
+
+    promql_metrics = []
+    for promql_query in promql_queries:
+        if not isinstance(promql_query, dict) or not promql_query.get("key") or not promql_query.get("query"):
+            LoggingContext(None).log(
+                f"Invalid promqlQueries entry {promql_query!r} for service {service_name}; expected key and query"
+            )
+            continue
+        # Query results are already derived values, they are always reported as gauges
+        promql_metrics.append(Metric(
+            key=promql_query["key"],
+            value="promql",
+            type="gauge",
+            promql_query=promql_query["query"],
+            gcpOptions={
+                "valueType": "DOUBLE",
+                "metricKind": "GAUGE",
+                "unit": promql_query.get("unit", None),
+                "samplePeriod": promql_query.get("samplePeriod", None),
+                "ingestDelay": promql_query.get("ingestDelay", None),
+            },
+        ))
+    return promql_metrics
+
+
 class AutodiscoveryGCPService(GCPService):
     """
     AutodiscoveryGCPService is a specialized class for managing autodiscovery-related operations.
@@ -0,0 +1,137 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Metrics mode split across METRICS_PARALLEL_PROCESSES worker processes.
+
+The parent process runs the pre-launch check, extensions refresh and autodiscovery once and hands every
+polling to all workers with the same scheduled time, so their execution times match. Every worker polls the
+projects assigned to it by a stable hash of the project id, so JSON decoding and line building of different
+projects run on different cores. Workers don't push self monitoring metrics of their pollings, they report
+them with the polling duration to the parent process, which merges the reports of all workers and pushes
+them once per polling.
+"""
+import hashlib
+from contextvars import ContextVar
+from datetime import datetime
+from multiprocessing import Queue
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from lib.context import MetricsContext
+from lib.metrics import GCPService
+from lib.sfm.for_metrics.metrics_definitions import SfmKeys, SfmMetric
+
+# services is None when they didn't change since the previous order
+PollingOrder = NamedTuple('PollingOrder', [
+    ('polling_number', int), ('scheduled_time', datetime), ('services', Optional[List[GCPService]])
+])
+PollingReport = NamedTuple('PollingReport', [
+    ('worker_index', int), ('polling_number', int), ('execution_time', datetime), ('dynatrace_url', str),
+    ('sfm', Dict[SfmKeys, SfmMetric])
+])
+PollingTiming = NamedTuple('PollingTiming', [
+    ('worker_index', int), ('polling_number', int), ('duration_s', float), ('finished_before_timeout', bool)
+])
+
+
+class _Worker:
+    def __init__(self, index: int, count: int, report_queue: Queue) -> None:
+        self.index = index
+        self.count = count
+        self.report_queue = report_queue
+
+
+_worker: Optional[_Worker] = None
+# Order of the polling running in the current task, pollings of a worker may overlap
+_current_order: ContextVar[Optional[PollingOrder]] = ContextVar("current_polling_order", default=None)
+
+
+def configure_worker(index: int, count: int, report_queue: Queue) -> None:
+    global _worker
+    _worker = _Worker(index, count, report_queue)
+
+
+def is_worker() -> bool:
+    return _worker is not None
+
+
+def worker_index() -> int:
+    return _worker.index
+
+
+def start_polling(order: PollingOrder) -> None:
+    """Tasks created after this call run the polling of the order."""
+    _current_order.set(order)
+
+
+def scheduled_time() -> Optional[datetime]:
+    order = _current_order.get()
+    return order.scheduled_time if order else None
+
+
+def worker_index_of_project(project_id: str, worker_count: int) -> int:
+    # Python's hash() of strings differs between processes
+    return int.from_bytes(hashlib.md5(project_id.encode("UTF-8")).digest()[:8], "big") % worker_count
+
+
+def assigned_projects(project_ids: List[str], metrics_scope_fan_in: bool = False) -> List[str]:
+    if _worker is None:
+        return project_ids
+    if metrics_scope_fan_in:
+        # One query covers all projects, only the first worker runs it
+        return project_ids if _worker.index == 0 else []
+    return [project_id for project_id in project_ids
+            if worker_index_of_project(project_id, _worker.count) == _worker.index]
+
+
+def report_polling(context: MetricsContext) -> None:
+    _worker.report_queue.put(PollingReport(_worker.index, _current_order.get().polling_number, context.execution_time,
+                                           context.dynatrace_url, context.sfm))
+
+
+def report_timing(polling_number: int, duration_s: float, finished_before_timeout: bool) -> None:
+    _worker.report_queue.put(PollingTiming(_worker.index, polling_number, duration_s, finished_before_timeout))
+
+
+class ReportAggregator:
+    """
+    Groups reports of the same polling sent by the workers. A polling is complete when all workers reported it,
+    earlier pollings still missing reports (e.g. of a worker whose polling timed out) are completed with it.
+    """
+
+    def __init__(self, worker_count: int) -> None:
+        self.worker_count = worker_count
+        self._reports: Dict[Hashable, List[Any]] = {}
+
+    def add(self, key: Hashable, report: Any) -> List[Tuple[Hashable, List[Any]]]:
+        self._reports.setdefault(key, []).append(report)
+        if len(self._reports[key]) < self.worker_count:
+            return []
+
+        completed = []
+        for pending_key in list(self._reports):
+            completed.append((pending_key, self._reports.pop(pending_key)))
+            if pending_key == key:
+                break
+        return completed
+
+
+def merge_sfm(reports: List[PollingReport]) -> Dict[SfmKeys, SfmMetric]:
+    merged = reports[0].sfm
+    for report in reports[1:]:
+        for key, sfm_metric in report.sfm.items():
+            if key in merged:
+                merged[key].merge(sfm_metric)
+            else:
+                merged[key] = sfm_metric
+    return merged
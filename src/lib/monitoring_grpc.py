@@ -0,0 +1,205 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Cloud Monitoring v3 ListTimeSeries over gRPC, used instead of REST when METRICS_FETCH_BACKEND is "grpc".
+
+Pages are decoded from protobuf into the dictionary shape of the REST response, so series go through
+the same conversion in lib.metric_ingest. Numbers arrive typed instead of as JSON strings.
+Requires the grpcio and google-cloud-monitoring packages, which are not part of the default image.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from lib.configuration import config
+from lib.configuration.config import get_int_environment_value
+
+LIST_TIME_SERIES_METHOD = "/google.monitoring.v3.MetricService/ListTimeSeries"
+
+_REQUEST_TIMEOUT_TOTAL = get_int_environment_value("REQUEST_TIMEOUT_TOTAL", 120)
+_FORWARDED_HEADERS = ("authorization", "x-goog-user-project")
+_TYPED_VALUE_FIELDS = {
+    "bool_value": "boolValue",
+    "int64_value": "int64Value",
+    "double_value": "doubleValue",
+    "string_value": "stringValue",
+}
+
+# grpc.aio channels belong to the event loop they were created in
+_channel = None
+_channel_loop = None
+_value_type_names: Dict[int, str] = {}
+
+
+def _import_grpc():
+    try:
+        import grpc
+        from google.cloud.monitoring_v3 import types
+    except ImportError as e:
+        raise Exception("METRICS_FETCH_BACKEND=grpc requires grpcio and google-cloud-monitoring packages") from e
+    return grpc, types
+
+
+def _get_channel(grpc):
+    global _channel, _channel_loop
+    loop = asyncio.get_running_loop()
+    if _channel is None or _channel_loop is not loop:
+        target = config.gcp_monitoring_grpc_target()
+        if config.gcp_monitoring_grpc_insecure():
+            _channel = grpc.aio.insecure_channel(target)
+        else:
+            _channel = grpc.aio.secure_channel(target, grpc.ssl_channel_credentials())
+        _channel_loop = loop
+    return _channel
+
+
+async def request_time_series_page(project_id: str, params: List[Tuple[str, str]], headers: Dict) -> Dict:
+    """Fetch one ListTimeSeries page for REST style query params, returned as the REST response body."""
+    grpc, types = _import_grpc()
+    list_time_series = _get_channel(grpc).unary_unary(
+        LIST_TIME_SERIES_METHOD,
+        request_serializer=types.ListTimeSeriesRequest.serialize,
+        response_deserializer=types.ListTimeSeriesResponse.pb().FromString,
+    )
+    metadata = tuple((name.lower(), value) for name, value in headers.items() if name.lower() in _FORWARDED_HEADERS)
+
+    try:
+        response = await list_time_series(
+            build_list_time_series_request(types, project_id, params), metadata=metadata, timeout=_REQUEST_TIMEOUT_TOTAL
+        )
+    except grpc.aio.AioRpcError as e:
+        return {"error": {"status": e.code().name, "message": e.details()}}
+
+    return response_to_page(response)
+
+
+def build_list_time_series_request(types, project_id: str, params: List[Tuple[str, str]]):
+    values = {}
+    group_by_fields = []
+    for name, value in params:
+        if name == "aggregation.groupByFields":
+            group_by_fields.append(value)
+        else:
+            values[name] = value
+
+    # 'fields' partial response masks have no gRPC counterpart, full series are always returned
+    return types.ListTimeSeriesRequest(
+        name=f"projects/{project_id}",
+        filter=values["filter"],
+        interval=types.TimeInterval(
+            start_time=_parse_time(values["interval.startTime"]),
+            end_time=_parse_time(values["interval.endTime"]),
+        ),
+        aggregation=types.Aggregation(
+            alignment_period=timedelta(seconds=float(values["aggregation.alignmentPeriod"].rstrip("s"))),
+            per_series_aligner=types.Aggregation.Aligner[values["aggregation.perSeriesAligner"]],
+            cross_series_reducer=types.Aggregation.Reducer[values["aggregation.crossSeriesReducer"]],
+            group_by_fields=group_by_fields,
+        ),
+        view=types.ListTimeSeriesRequest.TimeSeriesView.FULL,
+        page_token=values.get("pageToken", ""),
+    )
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value[:-1] if value.endswith("Z") else value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def response_to_page(response) -> Dict:
+    # Mirrors the REST JSON body: empty collections and zero scalars are left out
+    page = {}
+    if response.time_series:
+        page["timeSeries"] = [_time_series_to_dict(single_time_series) for single_time_series in response.time_series]
+    if response.next_page_token:
+        page["nextPageToken"] = response.next_page_token
+    return page
+
+
+def _value_type_name(single_time_series) -> str:
+    value_type = single_time_series.value_type
+    if value_type not in _value_type_names:
+        enum_type = single_time_series.DESCRIPTOR.fields_by_name["value_type"].enum_type
+        _value_type_names[value_type] = enum_type.values_by_number[value_type].name
+    return _value_type_names[value_type]
+
+
+def _time_series_to_dict(single_time_series) -> Dict:
+    series = {
+        "valueType": _value_type_name(single_time_series),
+        "metric": {"type": single_time_series.metric.type, "labels": dict(single_time_series.metric.labels)},
+        "resource": {"type": single_time_series.resource.type, "labels": dict(single_time_series.resource.labels)},
+        "points": [
+            {
+                "interval": {"endTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(point.interval.end_time.seconds))},
+                "value": _typed_value_to_dict(point.value),
+            }
+            for point in single_time_series.points
+        ],
+    }
+
+    if single_time_series.HasField("metadata"):
+        metadata = {}
+        if single_time_series.metadata.user_labels:
+            metadata["userLabels"] = dict(single_time_series.metadata.user_labels)
+        if single_time_series.metadata.HasField("system_labels"):
+            from google.protobuf.json_format import MessageToDict
+            metadata["systemLabels"] = MessageToDict(single_time_series.metadata.system_labels)
+        series["metadata"] = metadata
+
+    return series
+
+
+def _typed_value_to_dict(value) -> Dict:
+    kind = value.WhichOneof("value")
+    if kind == "distribution_value":
+        return {"distributionValue": _distribution_to_dict(value.distribution_value)}
+    if kind in _TYPED_VALUE_FIELDS:
+        return {_TYPED_VALUE_FIELDS[kind]: getattr(value, kind)}
+    return {}
+
+
+def _distribution_to_dict(distribution) -> Dict:
+    value = {}
+    if distribution.count:
+        value["count"] = distribution.count
+    if distribution.mean:
+        value["mean"] = distribution.mean
+    if distribution.bucket_counts:
+        value["bucketCounts"] = list(distribution.bucket_counts)
+
+    bucket_options = distribution.bucket_options
+    kind = bucket_options.WhichOneof("options")
+    if kind == "linear_buckets":
+        value["bucketOptions"] = {"linearBuckets": _non_zero_fields(bucket_options.linear_buckets, {
+            "num_finite_buckets": "numFiniteBuckets", "width": "width", "offset": "offset"
+        })}
+    elif kind == "exponential_buckets":
+        value["bucketOptions"] = {"exponentialBuckets": _non_zero_fields(bucket_options.exponential_buckets, {
+            "num_finite_buckets": "numFiniteBuckets", "growth_factor": "growthFactor", "scale": "scale"
+        })}
+    elif kind == "explicit_buckets":
+        value["bucketOptions"] = {"explicitBuckets": {"bounds": list(bucket_options.explicit_buckets.bounds)}}
+    else:
+        value["bucketOptions"] = {}
+    return value
+
+
+def _non_zero_fields(message, field_names: Dict[str, str]) -> Dict:
+    return {
+        json_name: getattr(message, field_name)
+        for field_name, json_name in field_names.items()
+        if getattr(message, field_name)
+    }
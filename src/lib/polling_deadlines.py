@@ -0,0 +1,117 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Deadlines and priorities of metric fetching within a polling cycle.
+
+Instead of losing the whole cycle when its timeout cancels it, fetches still running at their deadline are
+dropped ("shed") and the lines fetched so far are pushed. The fetch phase ends POLLING_PUSH_RESERVE_SECONDS
+before the timeout of the cycle, leaving that time for pushing. When critical projects or services are
+configured, work of normal priority reaches its deadline NORMAL_PRIORITY_SHED_SECONDS before theirs, so it's
+shed first. Fetching of a project and of a service within a project can also be limited to their own budget,
+counted from when that project or service started fetching.
+"""
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from lib.configuration import config
+from lib.context import MetricsContext
+from lib.metrics import GCPService
+from lib.sfm.for_metrics.metrics_definitions import SfmKeys
+from lib.utilities import parse_config_list
+
+CRITICAL = "critical"
+NORMAL = "normal"
+
+
+class PollingDeadlines:
+    def __init__(self, start: float, timeout_seconds: float, push_reserve_seconds: int = 0,
+                 normal_priority_shed_seconds: int = 0, project_deadline_seconds: int = 0,
+                 service_deadline_seconds: int = 0, critical_projects: Iterable[str] = (),
+                 critical_services: Iterable[str] = (), clock: Callable[[], float] = time.monotonic) -> None:
+        self.start = start
+        self.timeout_seconds = timeout_seconds
+        self.push_reserve_seconds = push_reserve_seconds
+        self.normal_priority_shed_seconds = normal_priority_shed_seconds
+        self.project_deadline_seconds = project_deadline_seconds
+        self.service_deadline_seconds = service_deadline_seconds
+        self.critical_projects: Set[str] = set(critical_projects)
+        self.critical_services: Set[str] = set(critical_services)
+        self._clock = clock
+        # (project id, service name) of fetches shed in this polling
+        self.shed_services: Set[Tuple[str, str]] = set()
+        self._project_starts: Dict[str, float] = {}
+        self._service_starts: Dict[Tuple[str, str], float] = {}
+
+    def priority(self, project_id: str, service_name: str) -> str:
+        if project_id in self.critical_projects or service_name in self.critical_services:
+            return CRITICAL
+        return NORMAL
+
+    def start_project(self, project_id: str) -> None:
+        """The project budget is counted from the first call."""
+        self._project_starts.setdefault(project_id, self._clock())
+
+    def fetch_deadline(self, project_id: str, service_name: str) -> float:
+        deadlines = []
+        if self.push_reserve_seconds > 0:
+            fetch_phase_end = self.start + self.timeout_seconds - self.push_reserve_seconds
+            if self.priority(project_id, service_name) == NORMAL and (self.critical_projects or self.critical_services):
+                fetch_phase_end -= self.normal_priority_shed_seconds
+            deadlines.append(fetch_phase_end)
+        if self.project_deadline_seconds > 0:
+            deadlines.append(self._project_starts.get(project_id, self.start) + self.project_deadline_seconds)
+        if self.service_deadline_seconds > 0:
+            service_start = self._service_starts.get((project_id, service_name), self.start)
+            deadlines.append(service_start + self.service_deadline_seconds)
+        return min(deadlines, default=math.inf)
+
+    def sort_projects(self, project_ids: List[str]) -> List[str]:
+        """Critical projects first, they get connections before the others."""
+        return sorted(project_ids, key=lambda project_id: project_id not in self.critical_projects)
+
+    async def run_fetch(self, context: MetricsContext, project_id: str, service: GCPService,
+                        fetch: Awaitable[list]) -> list:
+        self._service_starts.setdefault((project_id, service.name), self._clock())
+        deadline = self.fetch_deadline(project_id, service.name)
+        if deadline == math.inf:
+            return await fetch
+
+        try:
+            return await asyncio.wait_for(fetch, max(deadline - self._clock(), 0))
+        except asyncio.TimeoutError:
+            priority = self.priority(project_id, service.name)
+            self.shed_services.add((project_id, service.name))
+            context.sfm[SfmKeys.shed_fetch_tasks].update(project_id, priority)
+            context.t_error(project_id, f"Shed {priority} priority fetch of {service.name} at its deadline")
+            return []
+
+
+def polling_deadlines_from_config(start: float, timeout_seconds: float) -> Optional[PollingDeadlines]:
+    """None if no deadline is configured."""
+    deadlines = PollingDeadlines(
+        start=start,
+        timeout_seconds=timeout_seconds,
+        push_reserve_seconds=config.polling_push_reserve_seconds(),
+        normal_priority_shed_seconds=config.normal_priority_shed_seconds(),
+        project_deadline_seconds=config.project_fetch_deadline_seconds(),
+        service_deadline_seconds=config.service_fetch_deadline_seconds(),
+        critical_projects=parse_config_list(config.critical_projects()),
+        critical_services=parse_config_list(config.critical_services()),
+    )
+    if deadlines.fetch_deadline("", "") == math.inf and not deadlines.critical_projects \
+            and not deadlines.critical_services:
+        return None
+    return deadlines
@@ -0,0 +1,152 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Accessible projects, their disabled APIs and 'x-goog-user-project' header mode kept between polling cycles.
+
+Each kind of value has its own TTL. A value is fetched and waited for only when it's not known yet,
+e.g. in the first cycle or for a new project. Values older than their TTL are still returned and
+refreshed concurrently with metric fetching, the cycle joins the refreshes only before closing its session.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from aiohttp import ClientSession
+
+from lib.configuration import config
+from lib.context import MetricsContext
+from lib.credentials import get_all_accessible_projects
+from lib.gcp_apis import get_project_disabled_state, probe_x_goog_user_project_header
+from lib.utilities import is_running_in_current_loop
+
+_PROJECT_LIST_KEY = "projects"
+
+
+class _Entry:
+    def __init__(self, value: Any, fetched_at: float) -> None:
+        self.value = value
+        self.fetched_at = fetched_at
+        self.refresh_task: Optional[asyncio.Task] = None
+
+
+class RefreshingCache:
+    def __init__(self, name: str, ttl_seconds: int, clock: Callable[[], float] = time.monotonic,
+                 is_valid: Callable[[Any], bool] = lambda value: True) -> None:
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # A refreshed value which is not valid doesn't replace the cached one
+        self._is_valid = is_valid
+        self._entries: Dict[Hashable, _Entry] = {}
+
+    async def get(self, context: MetricsContext, keys: Iterable[Hashable],
+                  fetch: Callable[[Hashable], Awaitable[Any]]) -> Dict[Hashable, Any]:
+        keys = list(keys)
+        if self.ttl_seconds <= 0:
+            return dict(zip(keys, await asyncio.gather(*[fetch(key) for key in keys])))
+
+        now = self._clock()
+        # Values are taken before awaiting, an overlapping polling may invalidate entries meanwhile
+        values = {}
+        missing_keys = []
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                missing_keys.append(key)
+                continue
+            values[key] = entry.value
+            if now - entry.fetched_at >= self.ttl_seconds and not is_running_in_current_loop(entry.refresh_task):
+                entry.refresh_task = asyncio.create_task(self._refresh(context, key, fetch))
+
+        for key, value in zip(missing_keys, await asyncio.gather(*[fetch(key) for key in missing_keys])):
+            self._entries[key] = _Entry(value, self._clock())
+            values[key] = value
+
+        return {key: values[key] for key in keys}
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def running_refreshes(self) -> List[asyncio.Task]:
+        return [entry.refresh_task for entry in self._entries.values() if is_running_in_current_loop(entry.refresh_task)]
+
+    async def _refresh(self, context: MetricsContext, key: Hashable, fetch: Callable[[Hashable], Awaitable[Any]]):
+        try:
+            value = await fetch(key)
+            if not self._is_valid(value):
+                context.log(f"Refreshed {self.name} for {key} is not valid, cached value is used")
+                return
+            self._entries[key] = _Entry(value, self._clock())
+        except Exception as e:
+            context.log(f"Failed to refresh {self.name} for {key}, cached value is used, reason is {type(e).__name__} {e}")
+
+
+class ProjectInventory:
+    def __init__(self, project_list_ttl_seconds: int, disabled_apis_ttl_seconds: int,
+                 user_project_header_ttl_seconds: int, clock: Callable[[], float] = time.monotonic) -> None:
+        # Failed listing returns no projects instead of raising
+        self._project_list = RefreshingCache("project list", project_list_ttl_seconds, clock, is_valid=bool)
+        self._disabled_state = RefreshingCache("disabled APIs", disabled_apis_ttl_seconds, clock)
+        self._user_project_header = RefreshingCache("'x-goog-user-project' header mode", user_project_header_ttl_seconds, clock)
+
+    async def get_accessible_projects(self, context: MetricsContext, gcp_session: ClientSession, token: str) -> List[str]:
+        projects = await self._project_list.get(
+            context, [_PROJECT_LIST_KEY], lambda _: get_all_accessible_projects(context, gcp_session, token)
+        )
+        if not projects[_PROJECT_LIST_KEY]:
+            # Empty list usually means missing permissions or a failed call, it's not kept for the whole TTL
+            self._project_list.invalidate(_PROJECT_LIST_KEY)
+        return list(projects[_PROJECT_LIST_KEY])
+
+    async def get_disabled_projects_and_disabled_apis(self, context: MetricsContext, project_ids: List[str]) \
+            -> Tuple[Set[str], Dict[str, Set[str]]]:
+        """Same result as lib.gcp_apis.get_disabled_projects_and_disabled_apis_by_project_id."""
+        # Projects already known to the context, like the owner project, are not probed
+        header_project_ids = [project_id for project_id in project_ids
+                              if project_id not in context.use_x_goog_user_project_header]
+        header_modes = await self._user_project_header.get(
+            context, header_project_ids, lambda project_id: probe_x_goog_user_project_header(context, project_id)
+        )
+        context.use_x_goog_user_project_header.update(
+            (project_id, use_header) for project_id, use_header in header_modes.items() if use_header is not None
+        )
+
+        disabled_states = await self._disabled_state.get(
+            context, project_ids, lambda project_id: get_project_disabled_state(context, project_id)
+        )
+        disabled_projects = set()
+        disabled_apis_by_project_id = {}
+        for project_id, (is_project_disabled, disabled_apis) in disabled_states.items():
+            if is_project_disabled:
+                disabled_projects.add(project_id)
+            else:
+                disabled_apis_by_project_id[project_id] = disabled_apis
+        return disabled_projects, disabled_apis_by_project_id
+
+    async def wait_for_refreshes(self) -> None:
+        """Background refreshes use the session of the cycle which started them, it waits for them before closing
+        a session of its own."""
+        refresh_tasks = [
+            task for cache in (self._project_list, self._disabled_state, self._user_project_header)
+            for task in cache.running_refreshes()
+        ]
+        if refresh_tasks:
+            await asyncio.gather(*refresh_tasks, return_exceptions=True)
+
+
+project_inventory = ProjectInventory(
+    project_list_ttl_seconds=config.project_list_cache_ttl_seconds(),
+    disabled_apis_ttl_seconds=config.disabled_apis_cache_ttl_seconds(),
+    user_project_header_ttl_seconds=config.user_project_header_cache_ttl_seconds(),
+)
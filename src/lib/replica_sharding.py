@@ -0,0 +1,102 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Sharding of projects across SHARD_COUNT replicas of the metrics mode.
+
+Projects are assigned by rendezvous (highest random weight) hashing: every shard gets a weight per project and
+the project goes to the shard with the highest one. Adding or removing a shard only moves the projects it
+wins or held, about 1/SHARD_COUNT of them, all other assignments stay the same.
+"""
+import hashlib
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+from lib.configuration import config
+from operation_mode import OperationMode
+
+_STATEFUL_SET_ORDINAL = re.compile(r"-(\d+)$")
+# Index of a misconfigured replica, no project or key hashes to it
+_UNASSIGNED_INDEX = -1
+
+
+def _weight(shard_index: int, key: str) -> int:
+    return int.from_bytes(hashlib.md5(f"{shard_index}:{key}".encode("UTF-8")).digest()[:8], "big")
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    return max(range(shard_count), key=lambda shard_index: _weight(shard_index, key))
+
+
+class ReplicaShard:
+    def __init__(self, index: int, count: int) -> None:
+        self.index = index
+        self.count = count
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    @property
+    def is_leader(self) -> bool:
+        """The first shard does the work that must be done once across all replicas."""
+        return self.index == 0
+
+    def owns(self, key: str) -> bool:
+        return not self.enabled or shard_of(key, self.count) == self.index
+
+    def assigned_projects(self, project_ids: List[str], metrics_scope_fan_in: bool = False) -> List[str]:
+        if not self.enabled:
+            return project_ids
+        if metrics_scope_fan_in:
+            # One query covers all projects, only the leader runs it
+            return project_ids if self.is_leader else []
+        return [project_id for project_id in project_ids if self.owns(project_id)]
+
+    def sfm_task_id(self, function_name: str) -> str:
+        """Self monitoring series of every shard are separate, replicas don't overwrite each other's points."""
+        return f"{function_name}-shard-{self.index}" if self.enabled else function_name
+
+
+def parse_shard_index(shard_index: str, hostname: str) -> Optional[int]:
+    """SHARD_INDEX, or the ordinal of a StatefulSet pod name like dynatrace-gcp-monitor-2."""
+    if shard_index.strip():
+        return int(shard_index)
+    ordinal = _STATEFUL_SET_ORDINAL.search(hostname)
+    return int(ordinal.group(1)) if ordinal else None
+
+
+def replica_shard_from_config() -> ReplicaShard:
+    count = max(config.shard_count(), 1)
+    if count == 1:
+        return ReplicaShard(0, 1)
+    index = parse_shard_index(config.shard_index(), config.hostname())
+    if index is None or not 0 <= index < count:
+        raise ValueError(f"Shard index {index} of this replica is not within SHARD_COUNT {count}, "
+                         f"set SHARD_INDEX or run as a StatefulSet")
+    return ReplicaShard(index, count)
+
+
+@lru_cache(maxsize=1)
+def get_replica_shard() -> ReplicaShard:
+    """Shard of this replica, resolved on first use. Only the metrics mode is sharded."""
+    if OperationMode.from_environment_string(config.operation_mode()) == OperationMode.Logs:
+        return ReplicaShard(0, 1)
+    try:
+        return replica_shard_from_config()
+    except ValueError as error:
+        # lib.context imports this module through the self monitoring metrics
+        from lib.context import LoggingContext
+        LoggingContext("SHARDING").error(f"Invalid shard configuration, this replica won't poll any project: {error}")
+        return ReplicaShard(_UNASSIGNED_INDEX, max(config.shard_count(), 2))
@@ -16,6 +16,7 @@ import json
 from datetime import datetime
 from typing import Dict, List
 
+from lib import json_codec
 from lib.context import SfmContext, MetricsContext
 from lib.sfm.for_metrics.metric_descriptor import SELF_MONITORING_METRIC_PREFIX
 from lib.sfm.for_metrics.metrics_definitions import SfmMetric
@@ -56,7 +57,7 @@ async def push_single_self_monitoring_time_series(context: SfmContext, is_retry:
     self_monitoring_response = await context.gcp_session.request(
         "POST",
         url=f"https://monitoring.googleapis.com/v3/projects/{context.project_id_owner}/timeSeries",
-        data=json.dumps(time_series),
+        data=json_codec.dumps(time_series),
         headers={"Authorization": "Bearer {token}".format(token=context.token)}
     )
     status = self_monitoring_response.status
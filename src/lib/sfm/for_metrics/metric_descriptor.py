@@ -17,6 +17,8 @@ SELF_MONITORING_CONNECTIVITY_METRIC_TYPE = SELF_MONITORING_METRIC_PREFIX + "/con
 SELF_MONITORING_INGEST_LINES_METRIC_TYPE = SELF_MONITORING_METRIC_PREFIX + "/ingest_lines"
 SELF_MONITORING_REQUEST_COUNT_METRIC_TYPE = SELF_MONITORING_METRIC_PREFIX + "/request_count"
 SELF_MONITORING_PHASE_EXECUTION_TIME_METRIC_TYPE = SELF_MONITORING_METRIC_PREFIX + "/phase_execution_time"
+SELF_MONITORING_SHED_FETCH_TASKS_METRIC_TYPE = SELF_MONITORING_METRIC_PREFIX + "/shed_fetch_tasks"
+SELF_MONITORING_FAILED_FETCH_TASKS_METRIC_TYPE = SELF_MONITORING_METRIC_PREFIX + "/failed_fetch_tasks"
 
 DYNATRACE_TENANT_URL_LABEL_DESCRIPTOR = {
     "key": "dynatrace_tenant_url",
@@ -115,10 +117,52 @@ SELF_MONITORING_PHASE_EXECUTION_TIME_METRIC_DESCRIPTOR = {
     ]
 }
 
+SELF_MONITORING_SHED_FETCH_TASKS_METRIC_DESCRIPTOR = {
+    "type": SELF_MONITORING_SHED_FETCH_TASKS_METRIC_TYPE,
+    "valueType": "INT64",
+    "metricKind": "GAUGE",
+    "description": "Dynatrace integration self monitoring metric",
+    "displayName": "Dynatrace Integration Shed Fetch Tasks",
+    "unit": "1",
+    "monitoredResourceTypes": ["generic_task"],
+    "labels": [
+        FUNCTION_NAME_LABEL_DESCRIPTOR,
+        DYNATRACE_TENANT_URL_LABEL_DESCRIPTOR,
+        PROJECT_ID_LABEL_DESCRIPTOR,
+        {
+            "key": "priority",
+            "valueType": "STRING",
+            "description": "Priority class of the dropped fetches, critical or normal"
+        },
+    ]
+}
+
+SELF_MONITORING_FAILED_FETCH_TASKS_METRIC_DESCRIPTOR = {
+    "type": SELF_MONITORING_FAILED_FETCH_TASKS_METRIC_TYPE,
+    "valueType": "INT64",
+    "metricKind": "GAUGE",
+    "description": "Dynatrace integration self monitoring metric",
+    "displayName": "Dynatrace Integration Failed Fetch Tasks",
+    "unit": "1",
+    "monitoredResourceTypes": ["generic_task"],
+    "labels": [
+        FUNCTION_NAME_LABEL_DESCRIPTOR,
+        DYNATRACE_TENANT_URL_LABEL_DESCRIPTOR,
+        PROJECT_ID_LABEL_DESCRIPTOR,
+        {
+            "key": "service",
+            "valueType": "STRING",
+            "description": "GCP service of the failed fetches"
+        },
+    ]
+}
+
 SELF_MONITORING_METRIC_MAP = {
     SELF_MONITORING_CONNECTIVITY_METRIC_TYPE: SELF_MONITORING_CONNECTIVITY_METRIC_DESCRIPTOR,
     SELF_MONITORING_INGEST_LINES_METRIC_TYPE: SELF_MONITORING_INGEST_LINES_METRIC_DESCRIPTOR,
     SELF_MONITORING_REQUEST_COUNT_METRIC_TYPE: SELF_MONITORING_REQUEST_COUNT_METRIC_DESCRIPTOR,
     SELF_MONITORING_PHASE_EXECUTION_TIME_METRIC_TYPE: SELF_MONITORING_PHASE_EXECUTION_TIME_METRIC_DESCRIPTOR,
+    SELF_MONITORING_SHED_FETCH_TASKS_METRIC_TYPE: SELF_MONITORING_SHED_FETCH_TASKS_METRIC_DESCRIPTOR,
+    SELF_MONITORING_FAILED_FETCH_TASKS_METRIC_TYPE: SELF_MONITORING_FAILED_FETCH_TASKS_METRIC_DESCRIPTOR,
 }
 
@@ -1,6 +1,6 @@
 import enum
 from abc import abstractmethod
-from typing import List
+from typing import List, Set
 
 from lib.sfm.for_metrics.metric_descriptor import SELF_MONITORING_METRIC_PREFIX
 from lib.sfm.metrics_timeseries_datatpoint import create_timeseries_datapoint
@@ -16,6 +16,8 @@ class SfmKeys(enum.Enum):
     fetch_gcp_data_execution_time = 7
     push_to_dynatrace_execution_time = 8
     dynatrace_connectivity = 9
+    shed_fetch_tasks = 10
+    failed_fetch_tasks = 11
 
 
 class SfmMetric:
@@ -28,6 +30,11 @@ class SfmMetric:
     def generate_timeseries_datapoints(self, context, interval) -> List[dict]:
         pass
 
+    def merge(self, other: "SfmMetric"):
+        """Add values of the same metric collected by another metrics worker process."""
+        for key, count in other.value.items():
+            self.value[key] = self.value.get(key, 0) + count
+
 
 class SFMMetricDynatraceRequestCount(SfmMetric):
     key = SELF_MONITORING_METRIC_PREFIX + "/request_count"
@@ -169,6 +176,9 @@ class SFMMetricSetupExecutionTime(SfmMetric):
     def update(self, project, time):
         self.value[project] = time
 
+    def merge(self, other):
+        self.value.update(other.value)
+
     def generate_timeseries_datapoints(self, context, interval):
         time_series = []
         for project_id, time in self.value.items():
@@ -198,6 +208,9 @@ class SFMMetricFetchGCPDataExecutionTime(SfmMetric):
     def update(self, project, time):
         self.value[project] = time
 
+    def merge(self, other):
+        self.value.update(other.value)
+
     def generate_timeseries_datapoints(self, context, interval):
         time_series = []
         for project_id, time in self.value.items():
@@ -227,6 +240,9 @@ class SFMMetricPushToDynatraceExecutionTime(SfmMetric):
     def update(self, project, time):
         self.value[project] = time
 
+    def merge(self, other):
+        self.value.update(other.value)
+
     def generate_timeseries_datapoints(self, context, interval):
         time_series = []
         for project_id, time in self.value.items():
@@ -246,6 +262,65 @@ class SFMMetricPushToDynatraceExecutionTime(SfmMetric):
         return time_series
 
 
+class SFMMetricShedFetchTasks(SfmMetric):
+    key = SELF_MONITORING_METRIC_PREFIX + "/shed_fetch_tasks"
+    description = "Metric fetches dropped at their deadline [per project and priority]"
+
+    def __init__(self):
+        self.value = {}
+
+    def update(self, project, priority):
+        self.value[(project, priority)] = self.value.get((project, priority), 0) + 1
+
+    def generate_timeseries_datapoints(self, context, interval):
+        time_series = []
+        for (project_id, priority), count in self.value.items():
+            time_series.append(create_timeseries_datapoint(
+                context, self.key,
+                {
+                    "function_name": context.function_name,
+                    "dynatrace_tenant_url": context.dynatrace_url,
+                    "project_id": project_id,
+                    "priority": priority,
+                },
+                [{
+                    "interval": interval,
+                    "value": {"int64Value": count}
+                }]))
+        return time_series
+
+
+class SFMMetricFailedFetchTasks(SfmMetric):
+    key = SELF_MONITORING_METRIC_PREFIX + "/failed_fetch_tasks"
+    description = "Metric fetches failed with an error [per project and service]"
+
+    def __init__(self):
+        self.value = {}
+
+    def update(self, project, service_name):
+        self.value[(project, service_name)] = self.value.get((project, service_name), 0) + 1
+
+    def failed_services(self, project) -> Set[str]:
+        return {service_name for (project_id, service_name) in self.value if project_id == project}
+
+    def generate_timeseries_datapoints(self, context, interval):
+        time_series = []
+        for (project_id, service_name), count in self.value.items():
+            time_series.append(create_timeseries_datapoint(
+                context, self.key,
+                {
+                    "function_name": context.function_name,
+                    "dynatrace_tenant_url": context.dynatrace_url,
+                    "project_id": project_id,
+                    "service": service_name,
+                },
+                [{
+                    "interval": interval,
+                    "value": {"int64Value": count}
+                }]))
+        return time_series
+
+
 class SFMMetricDynatraceConnectivity(SfmMetric):
     key = SELF_MONITORING_METRIC_PREFIX + "/connectivity"
     description = "Dynatrace Connectivity"
@@ -256,6 +331,11 @@ class SFMMetricDynatraceConnectivity(SfmMetric):
     def update(self, value):
         self.value = value
 
+    def merge(self, other):
+        # Any worker failing to connect makes the whole polling fail to connect, empty if never updated
+        if other.value and other.value != self.value and other.value.name != "Ok":
+            self.value = other.value
+
     def generate_timeseries_datapoints(self, context, interval):
         return [create_timeseries_datapoint(
             context, self.key,
@@ -1,5 +1,7 @@
 from typing import Dict, List
 
+from lib.replica_sharding import get_replica_shard
+
 
 def create_timeseries_datapoint(
         context,
@@ -15,7 +17,7 @@ def create_timeseries_datapoint(
                 "location": context.location,
                 "namespace": context.function_name,
                 "job": context.function_name,
-                "task_id": context.function_name
+                "task_id": get_replica_shard().sfm_task_id(context.function_name)
             }
         },
         "metric": {
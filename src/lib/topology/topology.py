@@ -13,8 +13,7 @@ async def fetch_topology(context: MetricsContext, project_id: str, services: Lis
     topology_tasks_by_service: Dict[GCPService, Awaitable[Iterable[Entity]]] = {}
 
     for service in choose_services_for_topology_fetch(context, project_id, services, disabled_apis):
-        topology_function = entities_extractors[service.name].extractor(context, project_id, service)
-        topology_task = asyncio.create_task(topology_function)
+        topology_task = asyncio.create_task(fetch_service_topology(context, project_id, service))
         topology_tasks_by_service[service] = topology_task
 
     topology_by_service: Dict[GCPService, Iterable[Entity]] = {}
@@ -25,6 +24,12 @@ async def fetch_topology(context: MetricsContext, project_id: str, services: Lis
     return topology_by_service
 
 
+async def fetch_service_topology(context: MetricsContext, project_id: str, service: GCPService) -> Iterable[Entity]:
+    if context.asset_inventory is not None and context.asset_inventory.covers(project_id, service.name):
+        return context.asset_inventory.entities(project_id, service)
+    return await entities_extractors[service.name].extractor(context, project_id, service)
+
+
 def choose_services_for_topology_fetch(
         context: MetricsContext, project_id: str, services: List[GCPService], disabled_apis: Set[str]):
     services_for_topology_fetch = []
@@ -58,10 +63,14 @@ def build_entity_id_map(fetch_topology_results: List[Iterable[Entity]]) -> Dict[
     result = {}
     for result_set in fetch_topology_results:
         for entity in result_set:
-            # Ensure order of entries to avoid "flipping" when choosing the first one for dimension value
-            entity.dns_names.sort()
-            entity.ip_addresses.sort()
-            entity.tags.sort()
-            entity.listen_ports.sort()
+            sort_entity_lists(entity)
             result[entity.id] = entity
     return result
+
+
+def sort_entity_lists(entity: Entity):
+    # Ensure order of entries to avoid "flipping" when choosing the first one for dimension value
+    entity.dns_names.sort()
+    entity.ip_addresses.sort()
+    entity.tags.sort()
+    entity.listen_ports.sort()
@@ -0,0 +1,149 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Topology kept between polling cycles, per project and service.
+
+Entries younger than the TTL are used as they are. Older entries are still returned right away while
+a background task of the current cycle fetches them again (stale-while-revalidate), only entries past
+the stale window or never fetched block the cycle like fetch_topology does. The entity id map of a
+project is rebuilt only after an extractor returned entities different from the cached ones.
+"""
+import asyncio
+import itertools
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from lib.configuration import config
+from lib.context import MetricsContext
+from lib.entities.model import Entity
+from lib.metrics import GCPService
+from lib.topology.topology import build_entity_id_map, choose_services_for_topology_fetch, fetch_service_topology, \
+    fetch_topology, sort_entity_lists
+from lib.utilities import is_running_in_current_loop
+
+_versions = itertools.count(1)
+
+
+class TopologyCacheEntry:
+    def __init__(self, entities: List[Entity], fetched_at: float) -> None:
+        self.entities = entities
+        self.fetched_at = fetched_at
+        self.version = next(_versions)
+        self.refresh_task: Optional[asyncio.Task] = None
+
+
+class TopologyCache:
+    def __init__(self, ttl_seconds: int, stale_while_revalidate_seconds: int,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.stale_while_revalidate_seconds = max(0, stale_while_revalidate_seconds)
+        self._clock = clock
+        self._entries: Dict[Tuple[str, GCPService], TopologyCacheEntry] = {}
+        self._entity_id_maps: Dict[str, Tuple[Tuple, Dict[str, Entity]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    async def get_topology(self, context: MetricsContext, project_id: str, services: List[GCPService],
+                           disabled_apis: Set[str]) -> Dict[GCPService, Iterable[Entity]]:
+        if not self.enabled:
+            return await fetch_topology(context, project_id, services, disabled_apis)
+
+        now = self._clock()
+        self._evict_expired(now)
+
+        chosen_services = choose_services_for_topology_fetch(context, project_id, services, disabled_apis)
+        # Entities are taken before awaiting, an overlapping polling may evict entries meanwhile
+        topology = {}
+        fetch_tasks = {}
+        for service in chosen_services:
+            entry = self._entries.get((project_id, service))
+            if entry is None:
+                fetch_tasks[service] = asyncio.create_task(fetch_service_topology(context, project_id, service))
+                continue
+            topology[service] = entry.entities
+            if now - entry.fetched_at >= self.ttl_seconds:
+                self._start_refresh(context, project_id, service, entry)
+
+        for service, task in fetch_tasks.items():
+            topology[service] = self._store(project_id, service, await task)
+
+        return {service: topology[service] for service in chosen_services}
+
+    async def wait_for_refreshes(self, project_id: str) -> None:
+        """Wait for background refreshes of the project, they use the session of the cycle which started them."""
+        refresh_tasks = [
+            entry.refresh_task for (entry_project_id, _), entry in self._entries.items()
+            if entry_project_id == project_id and is_running_in_current_loop(entry.refresh_task)
+        ]
+        if refresh_tasks:
+            await asyncio.gather(*refresh_tasks, return_exceptions=True)
+
+    def entity_id_map(self, project_id: str, topology: Dict[GCPService, Iterable[Entity]]) -> Dict[str, Entity]:
+        if not self.enabled:
+            return build_entity_id_map(list(topology.values()))
+
+        entries = [(service, self._entries.get((project_id, service))) for service in topology]
+        versions = tuple((service, entry.version) for service, entry in entries if entry)
+        cached = self._entity_id_maps.get(project_id)
+        if cached and cached[0] == versions:
+            return cached[1]
+
+        entity_id_map = build_entity_id_map([entry.entities for _, entry in entries if entry])
+        self._entity_id_maps[project_id] = (versions, entity_id_map)
+        return entity_id_map
+
+    def _start_refresh(self, context: MetricsContext, project_id: str, service: GCPService,
+                       entry: TopologyCacheEntry) -> None:
+        if is_running_in_current_loop(entry.refresh_task):
+            return
+        entry.refresh_task = asyncio.create_task(self._refresh(context, project_id, service))
+
+    async def _refresh(self, context: MetricsContext, project_id: str, service: GCPService) -> None:
+        try:
+            self._store(project_id, service, await fetch_service_topology(context, project_id, service))
+        except Exception as e:
+            context.log(project_id, f"Failed to refresh topology for {service.name}, cached entities are used,"
+                                    f" reason is {type(e).__name__} {e}")
+
+    def _store(self, project_id: str, service: GCPService, entities: Iterable[Entity]) -> List[Entity]:
+        entities = list(entities)
+        for entity in entities:
+            sort_entity_lists(entity)
+
+        now = self._clock()
+        entry = self._entries.get((project_id, service))
+        if entry is not None and entry.entities == entities:
+            entry.fetched_at = now
+            return entry.entities
+        self._entries[(project_id, service)] = TopologyCacheEntry(entities, now)
+        return entities
+
+    def _evict_expired(self, now: float) -> None:
+        max_age = self.ttl_seconds + self.stale_while_revalidate_seconds
+        for key, entry in list(self._entries.items()):
+            if now - entry.fetched_at >= max_age and not is_running_in_current_loop(entry.refresh_task):
+                del self._entries[key]
+
+        project_ids = {project_id for project_id, _ in self._entries}
+        for project_id in list(self._entity_id_maps):
+            if project_id not in project_ids:
+                del self._entity_id_maps[project_id]
+
+
+topology_cache = TopologyCache(
+    ttl_seconds=config.topology_cache_ttl_seconds(),
+    stale_while_revalidate_seconds=config.topology_cache_stale_while_revalidate_seconds(),
+)
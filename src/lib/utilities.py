@@ -11,10 +11,11 @@
 #     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
+import asyncio
 import os
 from os import listdir
 from os.path import isfile
-from typing import List, Dict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
 
 import yaml
 
@@ -25,6 +26,16 @@ from lib.metrics import GCPService
 NO_GROUPING_CATEGORY = "NO_GROUPING"
 
 
+def is_running_in_current_loop(task: Optional[asyncio.Task]) -> bool:
+    # Tasks of an earlier event loop (e.g. a previous function invocation) will never finish
+    return task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop()
+
+
+def parse_config_list(config_string):
+    """Parse comma-separated config string into a list of stripped values."""
+    return list(filter(None, [s.strip() for s in config_string.split(',')]))
+
+
 def chunks(full_list: List, chunk_size: int) -> List[List]:
     chunk_size = max(1, chunk_size)
     return [full_list[i:i + chunk_size] for i in range(0, len(full_list), chunk_size)]
@@ -48,40 +59,89 @@ def safe_read_yaml(filepath: str, alternative_environ_name: str):
     return yaml_dict
 
 
+class ConfigFileCache:
+    """
+    Parsed config files, read again only when the file's mtime or size changes, or the env var used
+    instead of a missing file. Cached values are shared by all callers and must not be modified.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Tuple[str, str, Optional[Callable]], Tuple[Hashable, Any]] = {}
+
+    @staticmethod
+    def _version(filepath: str, alternative_environ_name: str) -> Hashable:
+        try:
+            file_stat = os.stat(filepath)
+            return file_stat.st_mtime_ns, file_stat.st_size
+        except OSError:
+            return os.environ.get(alternative_environ_name)
+
+    def read_yaml(self, filepath: str, alternative_environ_name: str, process: Optional[Callable[[Any], Any]] = None):
+        key = (filepath, alternative_environ_name, process)
+        version = self._version(filepath, alternative_environ_name)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        loaded_yaml = safe_read_yaml(filepath, alternative_environ_name)
+        value = process(loaded_yaml) if process else loaded_yaml
+        self._entries[key] = (version, value)
+        if entry is not None:
+            LoggingContext(None).log(f"Config file '{filepath}' changed, reloaded it")
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+config_file_cache = ConfigFileCache()
+
+
 def read_activation_yaml():
-    return safe_read_yaml('/code/config/activation/gcp_services.yaml', "ACTIVATION_CONFIG")
+    return config_file_cache.read_yaml('/code/config/activation/gcp_services.yaml', "ACTIVATION_CONFIG")
 
 
 def read_autodiscovery_config_yaml():
-    return safe_read_yaml('/code/config/activation/autodiscovery-config.yaml', "AUTODISCOVERY_RESOURCES_YAML")
+    return config_file_cache.read_yaml('/code/config/activation/autodiscovery-config.yaml',
+                                       "AUTODISCOVERY_RESOURCES_YAML")
 
 
 def read_autodiscovery_block_list_yaml():
-    return safe_read_yaml('/code/config/activation/autodiscovery-block-list.yaml', "AUTODISCOVERY_BLOCK_LIST_YAML")
+    return config_file_cache.read_yaml('/code/config/activation/autodiscovery-block-list.yaml',
+                                       "AUTODISCOVERY_BLOCK_LIST_YAML")
 
 
 def read_autodiscovery_resources_mapping():
-    return safe_read_yaml('./lib/autodiscovery/config/autodiscovery-mapping.yaml', "AUTODISCOVERY_RESOURCES_MAPPING")
+    return config_file_cache.read_yaml('./lib/autodiscovery/config/autodiscovery-mapping.yaml',
+                                       "AUTODISCOVERY_RESOURCES_MAPPING")
 
 
-def read_filter_out_list_yaml() -> list:
-    loaded_yaml = safe_read_yaml("/code/config/activation/metrics-filter-out.yaml", "EXCLUDED_METRICS_AND_DIMENSIONS") or {}
-    excluded_metrics = loaded_yaml.get("filter_out") or []
+def _excluded_metrics(loaded_yaml) -> Tuple[dict, ...]:
+    excluded_metrics = (loaded_yaml or {}).get("filter_out") or []
 
     for metric in excluded_metrics:
-        metric["dimensions"] = set(metric.get("dimensions") or [])
+        metric["dimensions"] = frozenset(metric.get("dimensions") or [])
+
+    return tuple(excluded_metrics)
 
-    return excluded_metrics
 
+def read_filter_out_list_yaml() -> Tuple[dict, ...]:
+    return config_file_cache.read_yaml("/code/config/activation/metrics-filter-out.yaml",
+                                       "EXCLUDED_METRICS_AND_DIMENSIONS", _excluded_metrics)
 
-def read_labels_grouping_by_service_yaml() -> list:
-    loaded_yaml = safe_read_yaml("/code/config/activation/labels-grouping-by-service.yaml", "LABELS_GROUPING_BY_SERVICE") or {}
-    services = loaded_yaml.get("services") or []
+
+def _services_groupings(loaded_yaml) -> Tuple[dict, ...]:
+    services = (loaded_yaml or {}).get("services") or []
 
     for service in services:
-        service["groupings"] = set(service.get("groupings") or [])
+        service["groupings"] = frozenset(service.get("groupings") or [])
 
-    return services
+    return tuple(services)
+
+
+def read_labels_grouping_by_service_yaml() -> Tuple[dict, ...]:
+    return config_file_cache.read_yaml("/code/config/activation/labels-grouping-by-service.yaml",
+                                       "LABELS_GROUPING_BY_SERVICE", _services_groupings)
 
 
 def get_activation_config_per_service(activation_yaml):
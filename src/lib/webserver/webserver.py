@@ -5,6 +5,7 @@ from aiohttp import web
 from aiohttp.web_app import Application
 from aiohttp.web_runner import AppRunner
 
+from lib.clientsession_provider import connection_manager
 from lib.configuration.config import get_int_environment_value
 from lib.context import LoggingContext
 
@@ -21,7 +22,8 @@ def run_webserver_on_asyncio_loop_forever():
         logging_context.log("Setting up webserver... \n")
 
         application: Application = web.Application()
-        application.add_routes([web.get('/health', health_endpoint)])
+        application.add_routes([web.get('/health', health_endpoint),
+                                web.get('/connection_pools', connection_pools_endpoint)])
 
         app_runner: AppRunner = web.AppRunner(application)
         webserver_loop.run_until_complete(app_runner.setup())
@@ -39,6 +41,10 @@ async def health_endpoint(request):
     return web.Response(status=200)
 
 
+async def connection_pools_endpoint(request):
+    return web.json_response(connection_manager.pool_stats())
+
+
 def close_and_cleanup(application: Application, app_runner: AppRunner, webserver_loop: AbstractEventLoop):
     if application is not None:
         webserver_loop.run_until_complete(application.shutdown())
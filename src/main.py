@@ -16,25 +16,28 @@ import asyncio
 import hashlib
 import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set, Iterable, Tuple
-from aiohttp import ClientSession
+from typing import Dict, List, Optional, Set, Tuple
 
 
-from lib.clientsession_provider import init_dt_client_session, init_gcp_client_session
+from lib.asset_inventory import fetch_asset_inventory
+from lib.checkpoints import checkpoints_from_config
+from lib.clientsession_provider import connection_manager, prewarm_connections
 from lib.configuration import config
-from lib.context import MetricsContext, LoggingContext, get_query_interval_minutes
-from lib.credentials import create_token, fetch_dynatrace_api_key, fetch_dynatrace_url, \
-    get_all_accessible_projects
-from lib.entities.model import Entity
-from lib.fast_check import check_dynatrace, check_version
-from lib.gcp_apis import get_disabled_projects_and_disabled_apis_by_project_id
-from lib.metric_ingest import fetch_metric, push_ingest_lines, flatten_and_enrich_metric_results, should_exclude_metric
-from lib.metrics import GCPService, Metric, IngestLine, AutodiscoveryGCPService
+from lib.context import MetricsContext, LoggingContext, DynatraceConnectivity, get_query_interval_minutes, \
+    get_query_timeout_seconds
+from lib.credentials import create_token
+from lib.metric_context import get_metric_context
+from lib.metric_fetching import fetch_and_push_window, fetch_ingest_lines_task
+from lib.metric_ingest import push_ingest_lines, split_ingest_lines_by_project
+from lib.metrics import GCPService
+from lib import metrics_workers
+from lib.polling_deadlines import polling_deadlines_from_config
+from lib.project_inventory import project_inventory
+from lib.replica_sharding import get_replica_shard
 from lib.self_monitoring import log_self_monitoring_metrics, sfm_push_metrics, sfm_create_descriptors_if_missing
 from lib.sfm.for_metrics.metrics_definitions import SfmKeys
-from lib.topology.topology import fetch_topology, build_entity_id_map
 from lib.sfm.api_call_latency import ApiCallLatency
-from lib.utilities import read_filter_out_list_yaml, read_labels_grouping_by_service_yaml, NO_GROUPING_CATEGORY
+from lib.utilities import parse_config_list, read_filter_out_list_yaml
 
 
 # In Cloud Functions/Cloud Run this is reset on cold start but may persist across warm invocations.
@@ -77,7 +80,8 @@ async def async_dynatrace_gcp_extension(services: Optional[List[GCPService]] = N
     """
     Starting point for metrics monitoring main loop.
     """
-    now = datetime.utcnow()
+    # Workers use the time their polling was scheduled by the parent process, so all execution times match
+    now = metrics_workers.scheduled_time() or datetime.utcnow()
     interval_seconds = get_query_interval_minutes() * 60
     timestamp_utc, effective_interval_seconds, snap_action = _snap_execution_time(now, interval_seconds)
 
@@ -93,62 +97,28 @@ async def async_dynatrace_gcp_extension(services: Optional[List[GCPService]] = N
     )
 
     start_time = time.time()
-    await query_metrics(execution_identifier, services, timestamp_utc, effective_interval_seconds)
+    checkpoints = checkpoints_from_config()
+    live_window_start = timestamp_utc - timedelta(seconds=effective_interval_seconds)
+    if checkpoints:
+        # Overlapping pollings don't backfill the window of this one while it's running
+        checkpoints.start_live_window(live_window_start)
+    try:
+        await query_metrics(execution_identifier, services, timestamp_utc, effective_interval_seconds)
+    finally:
+        if checkpoints:
+            checkpoints.finish_live_window(live_window_start)
     elapsed_time = time.time() - start_time
     logging_context.log(f"Execution took {elapsed_time}")
 
 
-async def get_metric_context(
-    gcp_session: ClientSession,
-    dt_session: ClientSession,
-    token: str,
-    logging_context: LoggingContext,
-    timestamp_utc: Optional[datetime] = None,
-    effective_interval_seconds: Optional[int] = None,
-) -> MetricsContext:
-    project_id_owner = config.project_id()
-
-    dynatrace_api_key = await fetch_dynatrace_api_key(
-        gcp_session=gcp_session, project_id=project_id_owner, token=token
-    )
-    dynatrace_url = await fetch_dynatrace_url(
-        gcp_session=gcp_session, project_id=project_id_owner, token=token
-    )
-    check_version(logging_context=logging_context)
-    await check_dynatrace(
-        logging_context=logging_context,
-        project_id=project_id_owner,
-        dt_session=dt_session,
-        dynatrace_url=dynatrace_url,
-        dynatrace_access_key=dynatrace_api_key,
-    )
-
-    query_interval_min = get_query_interval_minutes()
-    interval_seconds = effective_interval_seconds if effective_interval_seconds is not None else 60 * query_interval_min
-
-    context = MetricsContext(
-        gcp_session=gcp_session,
-        dt_session=dt_session,
-        project_id_owner=project_id_owner,
-        token=token,
-        execution_time=timestamp_utc or datetime.utcnow(),
-        execution_interval_seconds=interval_seconds,
-        dynatrace_api_key=dynatrace_api_key,
-        dynatrace_url=dynatrace_url,
-        print_metric_ingest_input=config.print_metric_ingest_input(),
-        self_monitoring_enabled=config.self_monitoring_enabled(),
-        scheduled_execution_id=logging_context.scheduled_execution_id,
-    )
-
-    return context
-
-
 async def query_metrics(execution_id: Optional[str], services: Optional[List[GCPService]] = None, timestamp_utc: Optional[datetime] = None, effective_interval_seconds: Optional[int] = None):
     logging_context = LoggingContext(execution_id)
 
-    async with init_gcp_client_session() as gcp_session, init_dt_client_session() as dt_session:
+    async with connection_manager.gcp_session() as gcp_session, connection_manager.dt_session() as dt_session:
         setup_start_time = time.time()
-        token = await create_token(logging_context, gcp_session)
+        cycle_start = time.monotonic()
+        # The token must last for the whole cycle, which can take until its timeout
+        token = await create_token(logging_context, gcp_session, valid_for_seconds=get_query_timeout_seconds())
 
         if token is None:
             logging_context.log("Cannot proceed without authorization token, stopping the execution")
@@ -162,8 +132,25 @@ async def query_metrics(execution_id: Optional[str], services: Optional[List[GCP
             gcp_session, dt_session, token, logging_context,
             timestamp_utc=timestamp_utc, effective_interval_seconds=effective_interval_seconds
         )
+        context.polling_deadlines = polling_deadlines_from_config(cycle_start, get_query_timeout_seconds())
+        context.checkpoints = checkpoints_from_config()
+
+        if config.inventory_backend() == "asset_inventory" and config.asset_inventory_scope():
+            context.asset_inventory = await fetch_asset_inventory(context, config.asset_inventory_scope(), services)
+
+        if context.asset_inventory is not None:
+            projects_ids = list(context.asset_inventory.project_ids)
+        else:
+            projects_ids = await project_inventory.get_accessible_projects(context, gcp_session, token)
+
+        replica_shard = get_replica_shard()
+        if replica_shard.enabled:
+            projects_ids = replica_shard.assigned_projects(projects_ids, config.metrics_scope_fan_in())
+            context.log(f"Projects assigned to shard {replica_shard.index}/{replica_shard.count}: {len(projects_ids)}")
 
-        projects_ids = await get_all_accessible_projects(context, gcp_session, token)
+        if metrics_workers.is_worker():
+            projects_ids = metrics_workers.assigned_projects(projects_ids, config.metrics_scope_fan_in())
+            context.log(f"Projects assigned to this metrics worker: {len(projects_ids)}")
 
         disabled_projects = set()
         disabled_projects_by_prefix = set()
@@ -174,7 +161,7 @@ async def query_metrics(execution_id: Optional[str], services: Optional[List[GCP
         # Using metrics scope feature, checking disabled apis in every project is not needed
         if not config.scoping_project_support_enabled():
             disabled_projects, disabled_apis_by_project_id = \
-                await get_disabled_projects_and_disabled_apis_by_project_id(context, projects_ids)
+                await project_inventory.get_disabled_projects_and_disabled_apis(context, projects_ids)
 
         disabled_projects.update(parse_config_list(config.excluded_projects()))
         disabled_projects_by_prefix.update(parse_config_list(config.excluded_projects_by_prefix()))
@@ -202,20 +189,36 @@ async def query_metrics(execution_id: Optional[str], services: Optional[List[GCP
                 projects_ids = matching
             context.log("Enabled projects: " + ", ".join(enabled_projects_by_prefix))
 
+        if context.polling_deadlines:
+            projects_ids = context.polling_deadlines.sort_projects(projects_ids)
+
         setup_time = (time.time() - setup_start_time)
         for project_id in projects_ids:
             context.sfm[SfmKeys.setup_execution_time].update(project_id, setup_time)
 
         context.start_processing_timestamp = time.time()
 
+        # DNS lookup and TLS handshakes to Dynatrace are done while GCP data is fetched, not before the first push
+        prewarm_task = None
+        if config.prewarm_dynatrace_connections() and context.dynatrace_connectivity == DynatraceConnectivity.Ok:
+            prewarm_task = asyncio.create_task(
+                prewarm_connections(dt_session, context.dynatrace_url, context.metric_ingest_concurrent_pushes))
+
         excluded_metrics_and_dimensions = read_filter_out_list_yaml()
 
-        process_project_metrics_tasks = [
-            process_project_metrics(context, project_id, services, disabled_apis_by_project_id.get(project_id, set()),
-                                    excluded_metrics_and_dimensions)
-            for project_id
-            in projects_ids
-        ]
+        if config.metrics_scope_fan_in():
+            # One query per metric against the scoping project covers all monitored projects
+            process_project_metrics_tasks = [
+                process_metrics_scope(context, context.project_id_owner, projects_ids, services,
+                                      excluded_metrics_and_dimensions)
+            ]
+        else:
+            process_project_metrics_tasks = [
+                process_project_metrics(context, project_id, services, disabled_apis_by_project_id.get(project_id, set()),
+                                        excluded_metrics_and_dimensions)
+                for project_id
+                in projects_ids
+            ]
         results = await asyncio.gather(*process_project_metrics_tasks, return_exceptions=True)
         # Log any exceptions from project processing (should be rare - process_project_metrics has its own try/except)
         for i, result in enumerate(results):
@@ -223,27 +226,39 @@ async def query_metrics(execution_id: Optional[str], services: Optional[List[GCP
                 context.log(f"Project processing task {i} failed unexpectedly: {type(result).__name__}: {result}")
         context.log(f"Fetched and pushed GCP data in {time.time() - context.start_processing_timestamp} s")
 
+        if context.checkpoints and not config.metrics_scope_fan_in():
+            # Missed windows are fetched after the live data, only in the time left before the next polling
+            backfill_budget_s = cycle_start + get_query_interval_minutes() * 60 - time.monotonic()
+            await backfill_missed_windows(context, projects_ids, services, disabled_apis_by_project_id,
+                                          excluded_metrics_and_dimensions, backfill_budget_s)
+            context.checkpoints.save()
+        if not config.shared_http_sessions():
+            # Refreshes use the session of this cycle, with shared sessions a later cycle uses their result
+            await project_inventory.wait_for_refreshes()
+        if prewarm_task:
+            await prewarm_task
+
         log_self_monitoring_metrics(context)
-        if context.self_monitoring_enabled:
+        if metrics_workers.is_worker():
+            # Pushed once for all workers by the parent process
+            metrics_workers.report_polling(context)
+        elif context.self_monitoring_enabled:
             context.log("Self monitoring update to GCP Monitoring")
             await sfm_create_descriptors_if_missing(context)
             await sfm_push_metrics(context.sfm.values(), context, context.execution_time)
         else:
             context.log("SFM disabled, will not push SFM metrics")
         ApiCallLatency.print_statistics(context)
-        await gcp_session.close()
-        await dt_session.close()
+        connection_manager.log_pool_stats(context)
 
     # Noise on Windows at the end of the logs is caused by https://github.com/aio-libs/aiohttp/issues/4324
 
-def parse_config_list(config_string):
-    """Parse comma-separated config string into a list of stripped values."""
-    return list(filter(None, [s.strip() for s in config_string.split(',')]))
-
 async def process_project_metrics(context: MetricsContext, project_id: str, services: List[GCPService],
                                   disabled_apis: Set[str], excluded_metrics_and_dimensions: list):
     try:
         context.log(project_id, f"Starting processing...")
+        if context.polling_deadlines:
+            context.polling_deadlines.start_project(project_id)
         ingest_lines = await fetch_ingest_lines_task(context, project_id, services, disabled_apis,
                                                      excluded_metrics_and_dimensions)
         fetch_data_time = time.time() - context.start_processing_timestamp
@@ -251,122 +266,87 @@ async def process_project_metrics(context: MetricsContext, project_id: str, serv
         context.log(project_id, f"Finished fetching data in {fetch_data_time}")
         context.log(project_id, f"Ingest lines count: {len(ingest_lines)} lines to push")
         await push_ingest_lines(context, project_id, ingest_lines)
+        # Windows with dropped lines or failed fetches are not pushed completely, they are backfilled later
+        if context.checkpoints and context.dynatrace_connectivity == DynatraceConnectivity.Ok and \
+                not context.sfm[SfmKeys.dynatrace_ingest_lines_dropped_count].value.get(project_id):
+            failed_service_names = context.sfm[SfmKeys.failed_fetch_tasks].failed_services(project_id)
+            pushed_service_names = [service_name for service_name in fetched_service_names(context, project_id, services)
+                                    if service_name not in failed_service_names]
+            context.checkpoints.record_live(project_id, pushed_service_names,
+                                            context.execution_time - context.execution_interval,
+                                            context.execution_time)
     except Exception as e:
         context.t_exception(f"Failed to finish processing due to {e}")
 
 
-async def fetch_ingest_lines_task(context: MetricsContext, project_id: str, services: List[GCPService],
-                                  disabled_apis: Set[str], excluded_metrics_and_dimensions: list) -> List[IngestLine]:
-    # Log the polling time window for debugging
-    base_end_time = context.execution_time
-    base_start_time = base_end_time - context.execution_interval
-    interval_s = int(context.execution_interval.total_seconds())
-    default_interval_s = get_query_interval_minutes() * 60
-    interval_info = f"{interval_s}s" if interval_s == default_interval_s else f"{interval_s}s (catch-up from {default_interval_s}s)"
-    context.log(project_id, 
-        f"=== METRIC POLLING CYCLE === "
-        f"execution_time={base_end_time.strftime('%Y-%m-%d %H:%M:%S')}Z | "
-        f"query_window=[<={base_start_time.strftime('%H:%M:%S')}Z -> <={base_end_time.strftime('%H:%M:%S')}Z] | "
-        f"interval={interval_info}"
-    )
+def fetched_service_names(context: MetricsContext, project_id: str, services: List[GCPService]) -> List[str]:
+    shed_services = context.polling_deadlines.shed_services if context.polling_deadlines else set()
+    return list(dict.fromkeys(service.name for service in services
+                              if service.is_enabled and (project_id, service.name) not in shed_services))
+
+
+async def backfill_missed_windows(context: MetricsContext, projects_ids: List[str], services: List[GCPService],
+                                  disabled_apis_by_project_id: Dict[str, Set[str]],
+                                  excluded_metrics_and_dimensions: list, budget_s: float):
+    backfills = []
+    for project_id in projects_ids:
+        service_names = fetched_service_names(context, project_id, services)
+        for start, end, behind_service_names in context.checkpoints.backfill_windows(project_id, service_names):
+            behind_services = [service for service in services
+                               if service.is_enabled and service.name in behind_service_names]
+            backfills.append(backfill_window(context, project_id, behind_services,
+                                             disabled_apis_by_project_id.get(project_id, set()),
+                                             excluded_metrics_and_dimensions, start, end))
+    if not backfills:
+        return
+    if budget_s <= 0:
+        context.log(f"No time left to backfill {len(backfills)} missed windows, trying in the next polling")
+        return
+
+    context.log(f"Backfilling {len(backfills)} missed windows, at most {round(budget_s)}s")
+    try:
+        await asyncio.wait_for(asyncio.gather(*backfills), budget_s)
+    except asyncio.TimeoutError:
+        context.log("Backfill stopped before the next polling, it continues in the next one")
+
+
+async def backfill_window(context: MetricsContext, project_id: str, services: List[GCPService],
+                          disabled_apis: Set[str], excluded_metrics_and_dimensions: list,
+                          start: datetime, end: datetime):
+    if await fetch_and_push_window(context, project_id, services, disabled_apis, excluded_metrics_and_dimensions,
+                                   start, end):
+        context.checkpoints.record_backfill(project_id, [service.name for service in services], end)
+
 
-    def set_groupings(service: GCPService, metric: Optional[Metric] = None):
-        service_name = service.name
-        if metric and metric.autodiscovered_metric and isinstance(service, AutodiscoveryGCPService):
-            linked = service.metrics_to_linking.get(metric.google_metric)
-            if linked and linked.possible_service_linking:
-                service_name = linked.possible_service_linking[0].name
-            else:
-                service_name = service.metrics_to_resources.get(metric.google_metric)
-
-        groupings = []
-        for configured_service_to_group in configured_services_to_group:
-            if configured_service_to_group.get("service") == service_name:
-                for configured_grouping in configured_service_to_group.get("groupings"):
-                    groupings.append(configured_grouping)
-        if not groupings:
-            groupings.append(NO_GROUPING_CATEGORY)
-
-        return groupings
-
-    fetch_metric_coros = []
-    metrics_metadata = []
-    topology: Dict[GCPService, Iterable[Entity]] = {}
-
-    # Topology fetching: retrieving additional instances info about enabled services
-    # Using metrics scope feature, fetching topology is not needed,
-    # because we can't fetch details from instances in other projects
-    if not config.scoping_project_support_enabled():
-        topology = await fetch_topology(context, project_id, services, disabled_apis)
-
-    # Using metrics scope feature, topology and disabled_apis will be empty, so no filtering is applied
-    # and metrics from all projects are being collected
-    skipped_services_with_no_instances = []
-    skipped_disabled_apis = set()
-    skipped_excluded_metrics = []
-
-    # Grouping by user_labels: per service, users can define groupings (based on user_labels)
-    # by which metrics will be queried. In this way, included labels will be added to metrics as dimensions.
-    # Default behavior: all metrics are collected with no added labels as dimensions.
-    configured_services_to_group = read_labels_grouping_by_service_yaml()
-
-    for service in services:
-        if not service.is_enabled:
-            continue  # skip disabled services
-        if service in topology and not topology[service]:
-            skipped_services_with_no_instances.append(f"{service.name}/{service.feature_set}")
-            continue  # skip fetching the metrics because there are no instances
-
-        for metric in service.metrics:
-            labels_groupings = set_groupings(service, metric)
-            for grouping in labels_groupings:
-                if should_exclude_metric(metric.google_metric, excluded_metrics_and_dimensions):
-                    context.log(f"Skipping fetching all the data for the metric {metric.google_metric}")
-                    continue
-
-                # Fetch metric only if it's metric from extensions or is autodiscovered in project_id
-                if not metric.autodiscovered_metric or project_id in metric.project_ids:
-                    gcp_api_last_index = metric.google_metric.find("/")
-                    api = metric.google_metric[:gcp_api_last_index]
-                    if api in disabled_apis:
-                        skipped_disabled_apis.add(api)
-                        continue  # skip fetching the metrics because service API is disabled
-                    fetch_metric_coro = run_fetch_metric(
-                        context=context, project_id=project_id, service=service, metric=metric,
-                        excluded_metrics_and_dimensions=excluded_metrics_and_dimensions, grouping=grouping
-                    )
-                    fetch_metric_coros.append(fetch_metric_coro)
-
-    context.log(f"Prepared {len(fetch_metric_coros)} fetch metric tasks")
-
-    if skipped_services_with_no_instances:
-        skipped_services_string = ', '.join(skipped_services_with_no_instances)
-        context.log(project_id, f"Skipped fetching metrics for {skipped_services_string} due to no instances detected")
-    if skipped_disabled_apis:
-        skipped_disabled_apis_string = ", ".join(skipped_disabled_apis)
-        context.log(project_id, f"Skipped fetching metrics for disabled APIs: {skipped_disabled_apis_string}")
-
-    if skipped_excluded_metrics:
-        context.log(project_id, f"Skipped fetching for excluded metrics: {', '.join(skipped_excluded_metrics)}")
-
-    fetch_metric_results = await asyncio.gather(*fetch_metric_coros, return_exceptions=True)
-    entity_id_map = build_entity_id_map(list(topology.values()))
-    flat_metric_results = flatten_and_enrich_metric_results(context, fetch_metric_results, entity_id_map)
-
-    flat_metric_results.extend(metrics_metadata)
-    return flat_metric_results
-
-
-async def run_fetch_metric(
-        context: MetricsContext,
-        project_id: str,
-        service: GCPService,
-        metric: Metric,
-        excluded_metrics_and_dimensions: list,
-        grouping: str
-):
+async def process_metrics_scope(context: MetricsContext, scoping_project_id: str, project_ids: List[str],
+                                services: List[GCPService], excluded_metrics_and_dimensions: list):
     try:
-        return await fetch_metric(context, project_id, service, metric, excluded_metrics_and_dimensions, grouping)
+        context.log(scoping_project_id, f"Starting metrics scope processing for {len(project_ids)} monitored projects...")
+        if context.polling_deadlines:
+            context.polling_deadlines.start_project(scoping_project_id)
+        monitored_project_ids = set(project_ids)
+        ingest_lines = await fetch_ingest_lines_task(context, scoping_project_id, services, set(),
+                                                     excluded_metrics_and_dimensions, monitored_project_ids)
+        fetch_data_time = time.time() - context.start_processing_timestamp
+
+        lines_by_project = split_ingest_lines_by_project(ingest_lines, scoping_project_id)
+        skipped_projects = [
+            project_id for project_id in lines_by_project
+            if project_id not in monitored_project_ids and project_id != scoping_project_id
+        ]
+        for project_id in skipped_projects:
+            del lines_by_project[project_id]
+        if skipped_projects:
+            context.log(scoping_project_id, f"Skipped lines of projects not selected for monitoring: {', '.join(skipped_projects)}")
+
+        for project_id, project_lines in lines_by_project.items():
+            context.sfm[SfmKeys.fetch_gcp_data_execution_time].update(project_id, fetch_data_time)
+            context.log(project_id, f"Ingest lines count: {len(project_lines)} lines to push")
+        context.log(scoping_project_id, f"Finished fetching metrics scope data in {fetch_data_time}")
+
+        await asyncio.gather(*[
+            push_ingest_lines(context, project_id, project_lines)
+            for project_id, project_lines in lines_by_project.items()
+        ])
     except Exception as e:
-        context.log(project_id, f"Failed to finish task for [{metric.google_metric}], reason is {type(e).__name__} {e}")
-        return []
+        context.t_exception(f"Failed to finish metrics scope processing due to {e}")
@@ -0,0 +1,122 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+"""
+Re-ingests metrics of a past time range, e.g. after a Dynatrace or network outage. Run it next to the
+metrics mode, with the same environment:
+
+    python run_backfill.py --start 2024-05-01T10:00 --end 2024-05-01T10:45 --projects my-project
+
+Times are UTC. Running it again with the same --state-file continues where it stopped.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from lib.backfill import BackfillState, plan_chunks, run_backfill
+from lib.checkpoints import FileCheckpointStore
+from lib.clientsession_provider import connection_manager
+from lib.configuration import config
+from lib.context import LoggingContext, MetricsContext, get_query_timeout_seconds
+from lib.credentials import create_token
+from lib.dt_extensions.dt_extensions import extensions_fetch
+from lib.metric_context import get_metric_context
+from lib.metric_fetching import fetch_and_push_window
+from lib.project_inventory import project_inventory
+from lib.self_monitoring import log_self_monitoring_metrics
+from lib.utilities import parse_config_list, read_filter_out_list_yaml
+
+logging_context = LoggingContext("BACKFILL")
+
+
+def utc_time(value: str) -> datetime:
+    """ISO time, times with an offset like 2024-05-01T10:00Z are converted to UTC."""
+    time = datetime.fromisoformat(value)
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc).replace(tzinfo=None)
+    return time
+
+
+async def fetch_and_push_window_with_fresh_token(context: MetricsContext, *window) -> bool:
+    # A backfill can run longer than a token lives, every chunk gets one lasting for at least a polling
+    context.token = await create_token(logging_context, context.gcp_session,
+                                       valid_for_seconds=get_query_timeout_seconds()) or context.token
+    return await fetch_and_push_window(context, *window)
+
+
+def parse_arguments(arguments=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Re-ingest GCP metrics of a past time range into Dynatrace")
+    parser.add_argument("--start", required=True, type=utc_time, help="UTC start, e.g. 2024-05-01T10:00")
+    parser.add_argument("--end", required=True, type=utc_time, help="UTC end, e.g. 2024-05-01T10:45")
+    parser.add_argument("--projects", default="", help="comma separated project ids, all accessible ones if empty")
+    parser.add_argument("--services", default="", help="comma separated service names, e.g. gce_instance, "
+                                                       "all configured ones if empty")
+    parser.add_argument("--chunk-minutes", type=int, default=15, help="length of a window fetched at once")
+    parser.add_argument("--parallel-chunks", type=int, default=2, help="number of windows fetched at once")
+    parser.add_argument("--state-file", default="backfill-state.json", help="file keeping the finished windows")
+    return parser.parse_args(arguments)
+
+
+async def backfill(arguments: argparse.Namespace) -> bool:
+    if arguments.start >= arguments.end:
+        logging_context.error(f"Start {arguments.start} must be before end {arguments.end}")
+        return False
+    if arguments.start < datetime.utcnow() - timedelta(hours=1):
+        logging_context.log("Dynatrace doesn't accept data points older than an hour, they are counted as invalid")
+
+    try:
+        async with connection_manager.gcp_session() as gcp_session, connection_manager.dt_session() as dt_session:
+            token = await create_token(logging_context, gcp_session, valid_for_seconds=get_query_timeout_seconds())
+            if not token:
+                logging_context.error("Cannot backfill without authorization token")
+                return False
+
+            extensions_fetch_result = await extensions_fetch(gcp_session, dt_session, token)
+            if not extensions_fetch_result:
+                return False
+            selected_services = set(parse_config_list(arguments.services))
+            services = [service for service in extensions_fetch_result.services
+                        if not selected_services or service.name in selected_services]
+
+            context = await get_metric_context(gcp_session, dt_session, token, logging_context)
+            project_ids = parse_config_list(arguments.projects) or \
+                await project_inventory.get_accessible_projects(context, gcp_session, token)
+            disabled_apis_by_project_id = {}
+            if not config.scoping_project_support_enabled():
+                disabled_projects, disabled_apis_by_project_id = \
+                    await project_inventory.get_disabled_projects_and_disabled_apis(context, project_ids)
+                if disabled_projects:
+                    project_ids = [project_id for project_id in project_ids if project_id not in disabled_projects]
+                    context.log("Disabled projects: " + ", ".join(disabled_projects))
+
+            chunks = plan_chunks(project_ids, arguments.start, arguments.end,
+                                 timedelta(minutes=max(arguments.chunk_minutes, 1)))
+            context.log(f"Backfilling {arguments.start} - {arguments.end} of {len(project_ids)} projects and "
+                        f"{len(services)} services in {len(chunks)} chunks")
+            failed = await run_backfill(context, chunks, services, disabled_apis_by_project_id,
+                                        read_filter_out_list_yaml(), arguments.parallel_chunks,
+                                        BackfillState(FileCheckpointStore(arguments.state_file)),
+                                        fetch_and_push_window_with_fresh_token)
+            log_self_monitoring_metrics(context)
+            return not failed
+    finally:
+        await connection_manager.close()
+
+
+def main():
+    sys.exit(0 if asyncio.run(backfill(parse_arguments())) else 1)
+
+
+if __name__ == '__main__':
+    main()
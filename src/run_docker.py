@@ -14,26 +14,26 @@
 import asyncio
 import multiprocessing
 import platform
+import queue
 import threading
 import time
 from datetime import datetime
-from typing import Optional, List, NamedTuple, Dict
+from typing import Callable, Optional, List, NamedTuple, Dict
 
-from lib import credentials
+from lib import credentials, metrics_workers
 from lib.autodiscovery.autodiscovery import AutodiscoveryContext
 from lib.autodiscovery.autodiscovery_task_executor import AutodiscoveryTaskExecutor
-from lib.clientsession_provider import init_dt_client_session, init_gcp_client_session
+from lib.clientsession_provider import connection_manager
 from lib.configuration import config
-from lib.context import LoggingContext, SfmDashboardsContext, get_query_interval_minutes, SfmContext
+from lib.context import LoggingContext, SfmDashboardsContext, get_query_interval_minutes, SfmContext, \
+    get_query_timeout_seconds
 from lib.credentials import create_token
 from lib.dt_extensions.dt_extensions import extensions_fetch, prepare_services_config_for_next_polling
-from lib.fast_check import LogsFastCheck
 from lib.instance_metadata import InstanceMetadataCheck, InstanceMetadata
-from lib.logs.log_forwarder import run_logs, run_logs_wrapper
-from lib.logs.log_forwarder_variables import PARALLEL_PROCESSES
 from lib.metrics import GCPService
-from lib.self_monitoring import sfm_push_metrics
+from lib.self_monitoring import sfm_push_metrics, sfm_create_descriptors_if_missing
 from lib.sfm.dashboards import import_self_monitoring_dashboard
+from lib.sfm.for_metrics.metric_descriptor import SELF_MONITORING_METRIC_MAP
 from lib.sfm.for_other.loop_timeout_metric import SFMMetricLoopTimeouts
 from lib.webserver.webserver import run_webserver_on_asyncio_loop_forever
 from main import async_dynatrace_gcp_extension
@@ -41,8 +41,12 @@ from operation_mode import OperationMode
 
 OPERATION_MODE = OperationMode.from_environment_string(config.operation_mode()) or OperationMode.Metrics
 QUERY_INTERVAL_SEC = get_query_interval_minutes() * 60
-QUERY_TIMEOUT_SEC = (get_query_interval_minutes() + 2) * 60
+QUERY_TIMEOUT_SEC = get_query_timeout_seconds()
 SFM_ENABLED = config.self_monitoring_enabled()
+MAX_CONCURRENT_POLLINGS = max(config.max_concurrent_pollings(), 1)
+# Imported right at process start, time to first ingest is measured from here
+STARTUP_TIME_S = time.time()
+METRICS_PARALLEL_PROCESSES = max(config.metrics_parallel_processes(), 1)
 
 # USED TO TEST ON WINDOWS MACHINE
 if platform.system() == 'Windows':
@@ -55,7 +59,7 @@ logging_context = LoggingContext(None)
 
 
 async def metrics_pre_launch_check() -> Optional[PreLaunchCheckResult]:
-    async with init_gcp_client_session() as gcp_session, init_dt_client_session() as dt_session:
+    async with connection_manager.gcp_session() as gcp_session, connection_manager.dt_session() as dt_session:
         token = await create_token(logging_context, gcp_session)
         if not token:
             logging_context.log(f'Monitoring disabled. Unable to acquire authorization token.')
@@ -69,7 +73,7 @@ async def metrics_pre_launch_check() -> Optional[PreLaunchCheckResult]:
 
 
 async def run_instance_metadata_check() -> Optional[InstanceMetadata]:
-    async with init_gcp_client_session() as gcp_session:
+    async with connection_manager.gcp_session() as gcp_session:
         token = await create_token(logging_context, gcp_session)
         if token:
             return await InstanceMetadataCheck(gcp_session, token, logging_context).execute()
@@ -81,7 +85,7 @@ async def run_instance_metadata_check() -> Optional[InstanceMetadata]:
 
 async def import_self_monitoring_dashboards(metadata: InstanceMetadata):
     if metadata:
-        async with init_gcp_client_session() as gcp_session:
+        async with connection_manager.gcp_session() as gcp_session:
             token = await create_token(logging_context, gcp_session)
             if token:
                 sfm_dashboards_context = SfmDashboardsContext(project_id_owner=config.project_id(),
@@ -92,38 +96,52 @@ async def import_self_monitoring_dashboards(metadata: InstanceMetadata):
                 await import_self_monitoring_dashboard(context=sfm_dashboards_context)
 
 
+async def create_sfm_context(gcp_session, sfm_metric_map: Dict) -> SfmContext:
+    token = await create_token(logging_context, gcp_session)
+    return SfmContext(
+        project_id_owner=config.project_id(),
+        dynatrace_api_key=await credentials.fetch_dynatrace_api_key(gcp_session, config.project_id(), token),
+        dynatrace_url=await credentials.fetch_dynatrace_url(gcp_session, config.project_id(), token),
+        token=token,
+        scheduled_execution_id=None,
+        self_monitoring_enabled=config.self_monitoring_enabled(),
+        sfm_metric_map=sfm_metric_map,
+        gcp_session=gcp_session,
+    )
+
+
 async def sfm_send_loop_timeouts(finished_before_timeout: bool):
-    async with init_gcp_client_session() as gcp_session:
-        token = await create_token(logging_context, gcp_session)
-        context = SfmContext(
-            project_id_owner=config.project_id(),
-            dynatrace_api_key=await credentials.fetch_dynatrace_api_key(gcp_session, config.project_id(), token),
-            dynatrace_url=await credentials.fetch_dynatrace_url(gcp_session, config.project_id(), token),
-            token=token,
-            scheduled_execution_id=None,
-            self_monitoring_enabled=config.self_monitoring_enabled(),
-            sfm_metric_map={},
-            gcp_session=gcp_session,
-        )
+    async with connection_manager.gcp_session() as gcp_session:
+        context = await create_sfm_context(gcp_session, {})
         timeouts_metric = SFMMetricLoopTimeouts()
         timeouts_metric.update(finished_before_timeout)
         await sfm_push_metrics([timeouts_metric], context, datetime.utcnow())
 
 
-async def run_metrics_fetcher_forever():
-    async def run_single_polling_with_timeout(services):
-        logging_context.log('MAIN_LOOP', f'Single polling started, timeout {QUERY_TIMEOUT_SEC}, polling interval {QUERY_INTERVAL_SEC}')
-        polling_task = async_dynatrace_gcp_extension(services=services)
+async def run_single_polling_with_timeout(services: List[GCPService], polling_number: int):
+    logging_context.log('MAIN_LOOP', f'Single polling started, timeout {QUERY_TIMEOUT_SEC}, polling interval {QUERY_INTERVAL_SEC}')
+    polling_task = async_dynatrace_gcp_extension(services=services)
+    polling_start_s = time.time()
+
+    try:
+        await asyncio.wait_for(polling_task, QUERY_TIMEOUT_SEC)
+        finished_before_timeout = True
+    except asyncio.exceptions.TimeoutError:
+        logging_context.error('MAIN_LOOP', f'Single polling timed out and was stopped, timeout: {QUERY_TIMEOUT_SEC}s')
+        finished_before_timeout = False
+
+    if polling_number == 1:
+        logging_context.log('MAIN_LOOP', f'Time to first ingest: {round(time.time() - STARTUP_TIME_S, 2)}s since startup')
+
+    if metrics_workers.is_worker():
+        metrics_workers.report_timing(polling_number, time.time() - polling_start_s, finished_before_timeout)
+    elif SFM_ENABLED:
+        await sfm_send_loop_timeouts(finished_before_timeout)
 
-        try:
-            await asyncio.wait_for(polling_task, QUERY_TIMEOUT_SEC)
-            if SFM_ENABLED:
-                await sfm_send_loop_timeouts(True)
-        except asyncio.exceptions.TimeoutError:
-            logging_context.error('MAIN_LOOP', f'Single polling timed out and was stopped, timeout: {QUERY_TIMEOUT_SEC}s')
-            if SFM_ENABLED:
-                await sfm_send_loop_timeouts(False)
 
+async def run_metrics_fetcher_forever(dispatch_polling: Optional[Callable[[int, List[GCPService]], None]] = None):
+    """Polling loop, with dispatch_polling the pollings are run by the worker processes instead."""
+    polling_number = 0
     pre_launch_check_result = await metrics_pre_launch_check()
     if not pre_launch_check_result:
         logging_context.log('MAIN_LOOP', 'Pre_launch_check failed, monitoring loop will not start')
@@ -135,8 +153,14 @@ async def run_metrics_fetcher_forever():
 
     if config.metric_autodiscovery():
         autodiscovery_manager = AutodiscoveryContext()
-        autodiscovery_task = await AutodiscoveryTaskExecutor.create(base_services, autodiscovery_manager, extension_versions)
-    
+        # First pollings run without autodiscovered metrics until the first autodiscovery finishes
+        autodiscovery_task = await AutodiscoveryTaskExecutor.create(base_services, autodiscovery_manager, extension_versions,
+                                                                    wait_for_first_autodiscovery=False)
+
+    if MAX_CONCURRENT_POLLINGS > 1 and not config.shared_http_sessions():
+        logging_context.log('MAIN_LOOP', 'Overlapping pollings don\'t share connection limits with SHARED_HTTP_SESSIONS disabled')
+    running_pollings = set()
+
     while True:
         start_time_s = time.time()
 
@@ -147,8 +171,21 @@ async def run_metrics_fetcher_forever():
             services = await autodiscovery_task.process_autodiscovery_result(base_services, extension_versions)
         else:
             services = list(base_services)
-            
-        await run_single_polling_with_timeout(services)
+
+        polling_number += 1
+        if dispatch_polling:
+            dispatch_polling(polling_number, services)
+        elif MAX_CONCURRENT_POLLINGS > 1:
+            # Next polling starts on schedule while previous ones are still running, e.g. pushing,
+            # unless the limit is reached. They share the connection limits of the shared sessions.
+            running_pollings = await wait_for_free_polling_slot(running_pollings)
+            if running_pollings:
+                logging_context.log('MAIN_LOOP', f'Starting polling while {len(running_pollings)} previous still running')
+            # Overlapping pollings share the caches, checkpoints and metric sharding observations. They are changed
+            # without awaiting in between, and windows of pollings still running are not backfilled.
+            running_pollings.add(start_polling_task(services, polling_number))
+        else:
+            await run_single_polling_with_timeout(services, polling_number)
 
         if config.keep_refreshing_extensions_config():
             logging_context.log('MAIN_LOOP', 'Refreshing services config')
@@ -157,11 +194,176 @@ async def run_metrics_fetcher_forever():
         end_time_s = time.time()
 
         polling_duration = end_time_s - start_time_s
-        logging_context.log('MAIN_LOOP', f"Polling finished after {round(polling_duration, 2)}s")
+        if dispatch_polling or MAX_CONCURRENT_POLLINGS > 1:
+            logging_context.log('MAIN_LOOP', f"Polling started after {round(polling_duration, 2)}s")
+        else:
+            logging_context.log('MAIN_LOOP', f"Polling finished after {round(polling_duration, 2)}s")
 
         await sleep_until_next_polling(polling_duration)
 
 
+def start_polling_task(services: List[GCPService], polling_number: int) -> asyncio.Task:
+    polling = asyncio.create_task(run_single_polling_with_timeout(services, polling_number))
+    polling.add_done_callback(log_polling_failure)
+    return polling
+
+
+def log_polling_failure(polling: asyncio.Task):
+    # Exceptions of pollings running in the background are not awaited by the loop
+    if not polling.cancelled() and polling.exception():
+        error = polling.exception()
+        logging_context.error('MAIN_LOOP', f'Polling failed: {type(error).__name__}: {error}')
+
+
+async def wait_for_free_polling_slot(running_pollings: set) -> set:
+    running_pollings = {polling for polling in running_pollings if not polling.done()}
+    if len(running_pollings) >= MAX_CONCURRENT_POLLINGS:
+        logging_context.log('MAIN_LOOP', f'{len(running_pollings)} pollings still running, next one waits for one of them to finish')
+        _, running_pollings = await asyncio.wait(running_pollings, return_when=asyncio.FIRST_COMPLETED)
+    return set(running_pollings)
+
+
+async def run_startup_checks_in_background():
+    """Instance metadata check and dashboards import, the first polling doesn't wait for them."""
+    try:
+        instance_metadata = await run_instance_metadata_check()
+        await import_self_monitoring_dashboards(instance_metadata)
+    except Exception as e:
+        logging_context.error(f'Startup checks failed: {type(e).__name__}: {e}')
+
+
+async def run_metrics_mode():
+    startup_checks_task = asyncio.create_task(run_startup_checks_in_background())
+    try:
+        await run_metrics_fetcher_forever()
+    finally:
+        startup_checks_task.cancel()
+        await connection_manager.close()
+
+
+async def run_logs_startup_checks() -> Optional[InstanceMetadata]:
+    # Logs modules are imported only in logs mode, metrics mode doesn't pay for their import
+    from lib.logs.logs_fast_check import LogsFastCheck
+    try:
+        instance_metadata = await run_instance_metadata_check()
+        await asyncio.gather(import_self_monitoring_dashboards(instance_metadata),
+                             LogsFastCheck(logging_context, instance_metadata).execute())
+        return instance_metadata
+    finally:
+        await connection_manager.close()
+
+
+async def run_worker_pollings(polling_queue: multiprocessing.Queue):
+    """Runs the pollings ordered by the parent process until it sends None."""
+    loop = asyncio.get_running_loop()
+    services = []
+    running_pollings = set()
+    try:
+        while True:
+            try:
+                order = await loop.run_in_executor(None, polling_queue.get, True, 1)
+            except queue.Empty:
+                continue
+            if order is None:
+                break
+            if order.services is not None:
+                services = order.services
+
+            running_pollings = await wait_for_free_polling_slot(running_pollings)
+            # The polling task runs with the order set here
+            metrics_workers.start_polling(order)
+            running_pollings.add(start_polling_task(services, order.polling_number))
+        await asyncio.gather(*running_pollings, return_exceptions=True)
+    finally:
+        await connection_manager.close()
+
+
+def run_metrics_worker_wrapper(worker_index: int, worker_count: int, report_queue: multiprocessing.Queue,
+                               polling_queue: multiprocessing.Queue):
+    metrics_workers.configure_worker(worker_index, worker_count, report_queue)
+    logging_context.log('MAIN_LOOP', f'Metrics worker {worker_index + 1}/{worker_count} started')
+    asyncio.run(run_worker_pollings(polling_queue))
+
+
+def dispatch_to_workers(polling_queues: List[multiprocessing.Queue]) -> Callable[[int, List[GCPService]], None]:
+    sent_services = []
+
+    def dispatch_polling(polling_number: int, services: List[GCPService]):
+        nonlocal sent_services
+        # Services are sent again only when they changed, so workers keep the same objects between pollings
+        changed = len(services) != len(sent_services) or any(
+            service is not sent for service, sent in zip(services, sent_services))
+        if changed:
+            sent_services = services
+        order = metrics_workers.PollingOrder(polling_number, datetime.utcnow(), services if changed else None)
+        for polling_queue in polling_queues:
+            polling_queue.put(order)
+
+    return dispatch_polling
+
+
+async def collect_worker_reports(processes: List[multiprocessing.Process], report_queue: multiprocessing.Queue):
+    loop = asyncio.get_running_loop()
+    pollings = metrics_workers.ReportAggregator(len(processes))
+    timings = metrics_workers.ReportAggregator(len(processes))
+
+    while any(process.is_alive() for process in processes):
+        try:
+            report = await loop.run_in_executor(None, report_queue.get, True, 1)
+        except queue.Empty:
+            continue
+
+        if isinstance(report, metrics_workers.PollingTiming):
+            for polling_number, polling_timings in timings.add(report.polling_number, report):
+                await process_workers_timings(polling_number, polling_timings)
+        else:
+            for _, reports in pollings.add(report.polling_number, report):
+                await process_workers_pollings(reports)
+
+
+async def process_workers_timings(polling_number: int, timings: List[metrics_workers.PollingTiming]):
+    slowest = max(timings, key=lambda timing: timing.duration_s)
+    logging_context.log('MAIN_LOOP', f'Polling {polling_number} finished in {len(timings)} workers, '
+                                     f'slowest worker {slowest.worker_index} after {round(slowest.duration_s, 2)}s')
+    if SFM_ENABLED:
+        await sfm_send_loop_timeouts(all(timing.finished_before_timeout for timing in timings))
+
+
+async def process_workers_pollings(reports: List[metrics_workers.PollingReport]):
+    if not SFM_ENABLED:
+        return
+    sfm = metrics_workers.merge_sfm(reports)
+    async with connection_manager.gcp_session() as gcp_session:
+        context = await create_sfm_context(gcp_session, SELF_MONITORING_METRIC_MAP)
+        context.log(f"Self monitoring update to GCP Monitoring, merged from {len(reports)} workers")
+        await sfm_create_descriptors_if_missing(context)
+        await sfm_push_metrics(sfm.values(), context, reports[0].execution_time)
+
+
+def run_metrics_processes(worker_count: int):
+    report_queue = multiprocessing.Queue()
+    polling_queues = [multiprocessing.Queue() for _ in range(worker_count)]
+    processes = [multiprocessing.Process(target=run_metrics_worker_wrapper,
+                                         args=(i, worker_count, report_queue, polling_queues[i]))
+                 for i in range(worker_count)]
+    [process.start() for process in processes]
+
+    async def run_and_close_connections():
+        startup_checks_task = asyncio.create_task(run_startup_checks_in_background())
+        collect_task = asyncio.create_task(collect_worker_reports(processes, report_queue))
+        try:
+            await run_metrics_fetcher_forever(dispatch_to_workers(polling_queues))
+        finally:
+            # Workers stop after their running pollings, the reports are collected until they exit
+            [polling_queue.put(None) for polling_queue in polling_queues]
+            await collect_task
+            startup_checks_task.cancel()
+            await connection_manager.close()
+
+    asyncio.run(run_and_close_connections())
+    [process.join() for process in processes]
+
+
 async def sleep_until_next_polling(current_polling_duration_s):
     sleep_time = QUERY_INTERVAL_SEC - current_polling_duration_s
     if sleep_time < 0: sleep_time = 0
@@ -178,15 +380,17 @@ def main():
     logging_context.log("GCP Monitor - Dynatrace integration for Google Cloud Platform monitoring\n")
     logging_context.log(f"Release version: {config.release_tag()}")
 
-    instance_metadata = asyncio.run(run_instance_metadata_check())
-    asyncio.run(import_self_monitoring_dashboards(instance_metadata))
-
     logging_context.log(f"Operation mode: {OPERATION_MODE.name}")
 
-    if OPERATION_MODE == OperationMode.Metrics:
-        asyncio.run(run_metrics_fetcher_forever())
+    if OPERATION_MODE == OperationMode.Metrics and METRICS_PARALLEL_PROCESSES > 1:
+        logging_context.log(f"Metrics polling split across {METRICS_PARALLEL_PROCESSES} processes")
+        run_metrics_processes(METRICS_PARALLEL_PROCESSES)
+    elif OPERATION_MODE == OperationMode.Metrics:
+        asyncio.run(run_metrics_mode())
     elif OPERATION_MODE == OperationMode.Logs:
-        asyncio.run(LogsFastCheck(logging_context, instance_metadata).execute())
+        from lib.logs.log_forwarder import run_logs_wrapper
+        from lib.logs.log_forwarder_variables import PARALLEL_PROCESSES
+        instance_metadata = asyncio.run(run_logs_startup_checks())
         processes = [multiprocessing.Process(target=run_logs_wrapper, args=(logging_context, instance_metadata, i))
                      for i in range(PARALLEL_PROCESSES)]
         [process.start() for process in processes]
@@ -0,0 +1,51 @@
+"""
+Startup import time of run_docker per operation mode, measured with python -X importtime in a fresh interpreter.
+
+Run from the repository root: PYTHONPATH=src python tests/benchmarks/import_time_benchmark.py [budget_ms]
+"""
+import os
+import subprocess
+import sys
+from typing import Dict
+
+# Modules the metrics mode must not import, they are loaded only when the logs mode starts
+LOGS_ONLY_MODULES = ["lib.logs.log_forwarder", "lib.logs.logs_processor", "lib.logs.metadata_engine",
+                     "lib.logs.logs_fast_check"]
+DEFAULT_BUDGET_MS = 1500
+TOP_MODULES = 15
+
+
+def import_times_us(module: str, operation_mode: str) -> Dict[str, int]:
+    """Cumulative import time of every module imported by `import module`."""
+    environment = dict(os.environ, OPERATION_MODE=operation_mode)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=environment, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    budget_ms = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    within_budget = True
+    for operation_mode in ["Metrics", "Logs"]:
+        times = import_times_us("run_docker", operation_mode)
+        total_ms = times["run_docker"] / 1000
+        print(f"{operation_mode}: import run_docker {total_ms:.0f} ms (budget {budget_ms} ms)")
+        for name, cumulative in sorted(times.items(), key=lambda item: -item[1])[1:TOP_MODULES + 1]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+        within_budget = within_budget and total_ms <= budget_ms
+
+    loaded_logs_modules = [name for name in LOGS_ONLY_MODULES if name in import_times_us("run_docker", "Metrics")]
+    if loaded_logs_modules:
+        print(f"Metrics mode imports logs modules: {', '.join(loaded_logs_modules)}")
+    sys.exit(0 if within_budget and not loaded_logs_modules else 1)
+
+
+if __name__ == "__main__":
+    main()
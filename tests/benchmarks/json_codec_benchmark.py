@@ -0,0 +1,98 @@
+"""
+Microbenchmarks of JSON call sites, json module vs lib.json_codec with the installed backend.
+
+Run from the repository root: PYTHONPATH=src python tests/benchmarks/json_codec_benchmark.py
+"""
+import base64
+import json
+import timeit
+
+from lib import json_codec
+
+
+def _time_series_page(series_count: int) -> str:
+    return json.dumps({
+        "timeSeries": [
+            {
+                "metric": {"type": "compute.googleapis.com/instance/cpu/utilization", "labels": {"instance_name": f"vm-{i}"}},
+                "resource": {"type": "gce_instance", "labels": {"project_id": "project", "zone": "us-east1-b", "instance_id": str(i)}},
+                "metricKind": "GAUGE",
+                "valueType": "DOUBLE",
+                "points": [
+                    {"interval": {"endTime": f"2024-03-01T10:{minute:02}:00Z"}, "value": {"doubleValue": 0.0123 * minute}}
+                    for minute in range(5)
+                ],
+            }
+            for i in range(series_count)
+        ],
+        "nextPageToken": "token",
+    })
+
+
+def _log_record(i: int) -> dict:
+    return {
+        "insertId": f"insert-{i}",
+        "jsonPayload": {"message": f"request {i} handled", "latency": 0.25, "user": "żółw", "tags": ["a", "b"]},
+        "resource": {"type": "k8s_container", "labels": {"pod_name": f"pod-{i}", "namespace_name": "default"}},
+        "timestamp": "2024-03-01T10:11:12.123456Z",
+        "severity": "INFO",
+    }
+
+
+def _pull_response(message_count: int) -> str:
+    return json.dumps({
+        "receivedMessages": [
+            {"ackId": f"ack-{i}", "message": {"data": base64.b64encode(json.dumps(_log_record(i)).encode()).decode()}}
+            for i in range(message_count)
+        ]
+    })
+
+
+def _dt_log_payload(i: int) -> dict:
+    return {
+        "content": json.dumps(_log_record(i)["jsonPayload"]),
+        "timestamp": "2024-03-01T10:11:12.123456Z",
+        "severity": "INFO",
+        "cloud.provider": "gcp",
+        "gcp.project.id": "project",
+        "gcp.resource.type": "k8s_container",
+        "k8s.pod.name": f"pod-{i}",
+    }
+
+
+def _sfm_time_series(series_count: int) -> dict:
+    return {"timeSeries": [
+        {
+            "resource": {"type": "generic_task", "labels": {"location": "us-east1", "task_id": str(i)}},
+            "metric": {"type": "custom.googleapis.com/dynatrace/metrics/count", "labels": {"dimension": str(i)}},
+            "valueType": "INT64",
+            "metricKind": "GAUGE",
+            "points": [{"interval": {"endTime": "2024-03-01T10:11:12.000000Z"}, "value": {"int64Value": i}}],
+        }
+        for i in range(series_count)
+    ]}
+
+
+CALL_SITES = {
+    "metric_ingest._fetch_time_series_page resp.json": (json.loads, json_codec.loads_api_response, _time_series_page(1000)),
+    "google_api.generic_paging resp.json": (json.loads, json_codec.loads_api_response, _time_series_page(100)),
+    "gcp_client.pull_messages resp.json": (json.loads, json_codec.loads_api_response, _pull_response(1000)),
+    "logs_processor._create_parsed_record": (json.loads, json_codec.loads, json.dumps(_log_record(1))),
+    "logs_processor._process_message payload": (json.dumps, json_codec.dumps, _dt_log_payload(1)),
+    "self_monitoring time series": (json.dumps, json_codec.dumps, _sfm_time_series(200)),
+}
+
+
+def main():
+    print(f"json_codec backend: {json_codec.BACKEND}")
+    for name, (baseline, codec, argument) in CALL_SITES.items():
+        repeat = 5
+        number = timeit.Timer(lambda: baseline(argument)).autorange()[0]
+        baseline_time = min(timeit.repeat(lambda: baseline(argument), number=number, repeat=repeat)) / number
+        codec_time = min(timeit.repeat(lambda: codec(argument), number=number, repeat=repeat)) / number
+        print(f"{name:50} json {baseline_time * 1e6:10.1f} us   codec {codec_time * 1e6:10.1f} us   "
+              f"x{baseline_time / codec_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#     Copyright 2024 Dynatrace LLC
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from lib.context import MetricsContext
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, body: Any = None, status: int = 200, headers: Optional[Dict] = None):
+        self.body = body if body is not None else {}
+        self.status = status
+        self.headers = headers or {}
+
+    async def json(self, loads=None):
+        await asyncio.sleep(0)
+        return self.body
+
+    async def text(self):
+        return str(self.body)
+
+    def release(self):
+        pass
+
+
+class FakeSession:
+    """
+    HTTP session answering with respond(params) of every request, a body or a whole FakeResponse.
+    (url, params) of the requests are kept in requests.
+    """
+
+    def __init__(self, respond: Callable[[Dict], Any] = lambda params: {}, status: int = 200):
+        self.respond = respond
+        self.status = status
+        self.requests = []
+
+    @classmethod
+    def with_pages(cls, pages: Iterable[Any], status: int = 200) -> "FakeSession":
+        """Answers the requests with pages in their order."""
+        pages = iter(pages)
+        return cls(lambda params: next(pages), status)
+
+    @property
+    def params(self):
+        """Params of the last request."""
+        return self.requests[-1][1]
+
+    async def request(self, _method, url, params, headers):
+        await asyncio.sleep(0)
+        params = list(params.items()) if isinstance(params, dict) else list(params)
+        self.requests.append((url, params))
+        response = self.respond(dict(params))
+        return response if isinstance(response, FakeResponse) else FakeResponse(response, self.status)
+
+
+def metrics_context(gcp_session=None, interval_seconds: int = 60,
+                    execution_time: Optional[datetime] = None) -> MetricsContext:
+    return MetricsContext(gcp_session, None, "owner", "token", execution_time or datetime.now(timezone.utc),
+                          interval_seconds, "", "", False, False, None)
@@ -0,0 +1,62 @@
+import asyncio
+
+from lib.entities.extractors import gce_instance
+from lib.entities.ids import get_func_create_entity_id
+from lib.metrics import GCPService
+from unit.fakes import FakeSession, metrics_context
+
+
+_INSTANCE = {"id": "123", "name": "vm-1", "networkInterfaces": [{"networkIP": "10.0.0.1"}], "status": "RUNNING",
+             "machineType": "https://compute.googleapis.com/compute/v1/projects/p/zones/z/machineTypes/e2-small"}
+
+
+def _get_entities(pages, monkeypatch, gce_filter=""):
+    monkeypatch.setenv("GCE_TOPOLOGY_FILTER", gce_filter)
+    session = FakeSession.with_pages(pages)
+    context = metrics_context(session)
+    service = GCPService(service="gce_instance", tech_name="Google Compute Engine", dimensions=[
+        {"key": "instance_id", "value": "label:resource.labels.instance_id"},
+        {"key": "zone", "value": "label:resource.labels.zone"},
+        {"key": "project_id", "value": "label:resource.labels.project_id"},
+    ])
+    entities = asyncio.run(gce_instance.get_gce_instance_entity(context, "my-project", service))
+    return entities, [(url, dict(params)) for url, params in session.requests], service
+
+
+def test_instances_of_all_zones_come_from_one_aggregated_list(monkeypatch):
+    pages = [
+        {
+            "items": {
+                "zones/us-east1-b": {"instances": [_INSTANCE]},
+                "zones/us-east1-c": {"warning": {"code": "NO_RESULTS_ON_PAGE"}},
+                "regions/us-east1": {"warning": {"code": "NO_RESULTS_ON_PAGE"}},
+            },
+            "nextPageToken": "next",
+        },
+        {"items": {"zones/europe-west1-d": {"instances": [{**_INSTANCE, "id": "456", "name": "vm-2"}]}},
+         "unreachables": ["zones/asia-east1-a"]},
+    ]
+
+    entities, requests, service = _get_entities(pages, monkeypatch)
+
+    assert [url for url, _ in requests] == [
+        "https://compute.googleapis.com/compute/v1/projects/my-project/aggregated/instances"] * 2
+    assert requests[0][1]["returnPartialSuccess"] == "true"
+    assert "filter" not in requests[0][1]
+    assert [entity.display_name for entity in entities] == ["vm-1", "vm-2"]
+    assert entities[0].ip_addresses == ["10.0.0.1"]
+
+    # Same ids as created from the former per-zone listing
+    create_zone_entity_id = get_func_create_entity_id({
+        "resource.labels.instance_id": lambda x: x.get("id", ""),
+        "resource.labels.zone": lambda x: "us-east1-b",
+        "resource.labels.project_id": lambda x: "my-project",
+    })
+    assert entities[0].id == create_zone_entity_id(_INSTANCE, service)
+    assert entities[0].id != entities[1].id
+
+
+def test_configured_filter_is_sent(monkeypatch):
+    _, requests, _ = _get_entities([{}], monkeypatch, gce_filter="status = RUNNING")
+
+    assert requests[0][1]["filter"] == "status = RUNNING"
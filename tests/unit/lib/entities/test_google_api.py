@@ -0,0 +1,16 @@
+import asyncio
+
+from lib.entities.google_api import generic_paging
+from unit.fakes import FakeSession, metrics_context
+
+
+def test_generic_paging_sends_caller_params_with_every_page():
+    session = FakeSession.with_pages([{"items": [1, 2], "nextPageToken": "next"}, {"items": [3]}])
+    context = metrics_context(session)
+    list_params = {"maxResults": "500", "fields": "nextPageToken,items(id)"}
+
+    entities = asyncio.run(generic_paging("project", "https://example.com/items", context, lambda page: page["items"], list_params))
+
+    assert entities == [1, 2, 3]
+    assert [dict(params) for _, params in session.requests] == [list_params, {**list_params, "pageToken": "next"}]
+    assert list_params == {"maxResults": "500", "fields": "nextPageToken,items(id)"}
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from lib.backfill import BackfillChunk, BackfillState, plan_chunks, run_backfill
+from lib.checkpoints import FileCheckpointStore
+from lib.context import DynatraceConnectivity, MetricsContext
+from lib.metric_fetching import fetch_and_push_window
+from lib.sfm.for_metrics.metrics_definitions import SfmKeys
+from run_backfill import parse_arguments
+
+minutes = timedelta(minutes=1)
+t0 = datetime(2024, 1, 1, 12, 0)
+
+
+def test_range_is_split_into_chunks_per_project():
+    assert plan_chunks(["project-a", "project-b"], t0, t0 + 40 * minutes, 15 * minutes) == [
+        BackfillChunk("project-a", t0, t0 + 15 * minutes),
+        BackfillChunk("project-a", t0 + 15 * minutes, t0 + 30 * minutes),
+        BackfillChunk("project-a", t0 + 30 * minutes, t0 + 40 * minutes),
+        BackfillChunk("project-b", t0, t0 + 15 * minutes),
+        BackfillChunk("project-b", t0 + 15 * minutes, t0 + 30 * minutes),
+        BackfillChunk("project-b", t0 + 30 * minutes, t0 + 40 * minutes),
+    ]
+
+
+def test_rerun_only_retries_failed_chunks(tmp_path):
+    context = MetricsContext(None, None, "owner", "", datetime.utcnow(), 0, "", "", False, False, None)
+    chunks = plan_chunks(["project-a"], t0, t0 + 60 * minutes, 15 * minutes)
+    fetched = []
+    running = 0
+    max_running = 0
+
+    async def fetch_and_push_window(context, project_id, services, disabled_apis, excluded, start, end):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        fetched.append(start)
+        return start != t0 + 15 * minutes or len(fetched) > 4
+
+    def backfill():
+        state = BackfillState(FileCheckpointStore(str(tmp_path / "state.json")))
+        return asyncio.run(run_backfill(context, chunks, [], {}, [], 2, state, fetch_and_push_window))
+
+    assert backfill() == [chunks[1]]
+    assert max_running == 2
+    assert backfill() == []
+    assert fetched[4:] == [t0 + 15 * minutes]
+
+
+def test_window_with_failed_fetch_fails_and_keeps_live_timings():
+    context = MetricsContext(None, None, "owner", "", datetime.utcnow(), 0, "", "", False, False, None)
+    context.dynatrace_connectivity = DynatraceConnectivity.Ok
+    context.sfm[SfmKeys.push_to_dynatrace_execution_time].update("project-a", 1.0)
+
+    async def fetch_ingest_lines(window_context, project_id, *_):
+        window_context.sfm[SfmKeys.failed_fetch_tasks].update(project_id, "gce_instance")
+        return []
+
+    async def push_ingest_lines(window_context, project_id, _):
+        window_context.sfm[SfmKeys.push_to_dynatrace_execution_time].update(project_id, 5.0)
+
+    with patch("lib.metric_fetching.fetch_ingest_lines_task", new=AsyncMock(side_effect=fetch_ingest_lines)), \
+            patch("lib.metric_fetching.push_ingest_lines", new=AsyncMock(side_effect=push_ingest_lines)):
+        pushed = asyncio.run(fetch_and_push_window(context, "project-a", [], set(), [], t0, t0 + 15 * minutes))
+
+    assert not pushed
+    assert context.sfm[SfmKeys.failed_fetch_tasks].value == {("project-a", "gce_instance"): 1}
+    assert context.sfm[SfmKeys.push_to_dynatrace_execution_time].value == {"project-a": 1.0}
+
+
+def test_times_with_offset_are_converted_to_utc():
+    arguments = parse_arguments(["--start", "2024-05-01T10:00Z", "--end", "2024-05-01T12:45+01:00"])
+
+    assert arguments.start == datetime(2024, 5, 1, 10, 0)
+    assert arguments.end == datetime(2024, 5, 1, 11, 45)
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import main
+from lib.checkpoints import Checkpoints, FileCheckpointStore, ProcessCheckpointStore
+from lib.context import DynatraceConnectivity, MetricsContext
+from lib.sfm.for_metrics.metrics_definitions import SfmKeys
+
+minutes = timedelta(minutes=1)
+t0 = datetime(2024, 1, 1, 12, 0)
+
+
+def _checkpoints(tmp_path):
+    return Checkpoints(FileCheckpointStore(str(tmp_path / "checkpoints.json")), chunk_minutes=15,
+                       max_backfill_minutes=55)
+
+
+def test_restart_gap_is_backfilled_in_chunks(tmp_path):
+    checkpoints = _checkpoints(tmp_path)
+    checkpoints.record_live("project-a", ["gce_instance"], t0 - 3 * minutes, t0)
+    checkpoints.save()
+
+    # Restarted 20 minutes later
+    restarted = _checkpoints(tmp_path)
+    restarted.record_live("project-a", ["gce_instance"], t0 + 20 * minutes, t0 + 23 * minutes)
+    assert restarted.backfill_windows("project-a", ["gce_instance"]) == \
+        [(t0, t0 + 15 * minutes, ["gce_instance"])]
+
+    restarted.record_backfill("project-a", ["gce_instance"], t0 + 15 * minutes)
+    restarted.record_live("project-a", ["gce_instance"], t0 + 23 * minutes, t0 + 26 * minutes)
+    assert restarted.backfill_windows("project-a", ["gce_instance"]) == \
+        [(t0 + 15 * minutes, t0 + 20 * minutes, ["gce_instance"])]
+
+    restarted.record_backfill("project-a", ["gce_instance"], t0 + 20 * minutes)
+    assert restarted.backfill_windows("project-a", ["gce_instance"]) == []
+    assert restarted.checkpoints["project-a/gce_instance"].pushed_until == t0 + 26 * minutes
+
+
+def test_backfill_is_limited_to_max_age_and_unknown_services_are_not_backfilled(tmp_path):
+    checkpoints = _checkpoints(tmp_path)
+    checkpoints.record_live("project-a", ["gce_instance"], t0 - 3 * minutes, t0)
+
+    checkpoints.record_live("project-a", ["gce_instance", "cloudsql_database"], t0 + 120 * minutes,
+                            t0 + 123 * minutes)
+
+    assert checkpoints.backfill_windows("project-a", ["gce_instance", "cloudsql_database"]) == \
+        [(t0 + 65 * minutes, t0 + 80 * minutes, ["gce_instance"])]
+
+
+def test_new_gap_while_backfilling_replaces_the_old_one(tmp_path):
+    checkpoints = _checkpoints(tmp_path)
+    checkpoints.record_live("project-a", ["gce_instance"], t0 - 3 * minutes, t0)
+    checkpoints.record_live("project-a", ["gce_instance"], t0 + 20 * minutes, t0 + 23 * minutes)
+
+    checkpoints.record_live("project-a", ["gce_instance"], t0 + 30 * minutes, t0 + 33 * minutes)
+
+    assert checkpoints.backfill_windows("project-a", ["gce_instance"]) == \
+        [(t0 + 23 * minutes, t0 + 30 * minutes, ["gce_instance"])]
+
+
+def test_checkpoints_of_all_worker_files_are_loaded(tmp_path):
+    base_path = str(tmp_path / "checkpoints.json")
+    for worker_index, (project_id, pushed_until) in enumerate([("project-a", t0), ("project-b", t0)]):
+        checkpoints = Checkpoints(ProcessCheckpointStore(base_path, f"{base_path}.{worker_index}"), 15, 55)
+        checkpoints.record_live(project_id, ["gce_instance"], pushed_until - 3 * minutes, pushed_until)
+        checkpoints.save()
+    # Older file of the single process mode
+    FileCheckpointStore(base_path).save({"project-b/gce_instance": {"pushed_until": "2024-01-01T11:00:00"}})
+
+    # Worker count changed, project-b moved to worker 0
+    moved = Checkpoints(ProcessCheckpointStore(base_path, f"{base_path}.0"), 15, 55)
+    moved.record_live("project-b", ["gce_instance"], t0 + 20 * minutes, t0 + 23 * minutes)
+
+    assert moved.backfill_windows("project-b", ["gce_instance"]) == [(t0, t0 + 15 * minutes, ["gce_instance"])]
+
+
+def test_window_of_older_overlapping_polling_is_not_backfilled(tmp_path):
+    checkpoints = _checkpoints(tmp_path)
+    checkpoints.record_live("project-a", ["gce_instance"], t0 - 3 * minutes, t0)
+    checkpoints.start_live_window(t0)
+    checkpoints.start_live_window(t0 + 3 * minutes)
+
+    # The newer polling finishes first, the window of the older one is still being pushed
+    checkpoints.record_live("project-a", ["gce_instance"], t0 + 3 * minutes, t0 + 6 * minutes)
+    checkpoints.finish_live_window(t0 + 3 * minutes)
+    assert checkpoints.backfill_windows("project-a", ["gce_instance"]) == []
+
+    checkpoints.record_live("project-a", ["gce_instance"], t0, t0 + 3 * minutes)
+    checkpoints.finish_live_window(t0)
+    assert checkpoints.backfill_windows("project-a", ["gce_instance"]) == []
+    assert checkpoints.checkpoints["project-a/gce_instance"].pushed_until == t0 + 6 * minutes
+
+
+def _process_project_metrics(tmp_path, failed_service_name=None, dropped_lines=0):
+    context = MetricsContext(None, None, "owner", "", t0, 180, "", "", False, False, None)
+    context.dynatrace_connectivity = DynatraceConnectivity.Ok
+    context.start_processing_timestamp = 0
+    context.checkpoints = _checkpoints(tmp_path)
+    services = [SimpleNamespace(name="gce_instance", is_enabled=True),
+                SimpleNamespace(name="cloudsql_database", is_enabled=True)]
+
+    async def fetch_ingest_lines(*_):
+        if failed_service_name:
+            context.sfm[SfmKeys.failed_fetch_tasks].update("project-a", failed_service_name)
+        return []
+
+    async def push_ingest_lines(*_):
+        if dropped_lines:
+            context.sfm[SfmKeys.dynatrace_ingest_lines_dropped_count].update("project-a", dropped_lines)
+
+    with patch("main.fetch_ingest_lines_task", new=AsyncMock(side_effect=fetch_ingest_lines)), \
+            patch("main.push_ingest_lines", new=AsyncMock(side_effect=push_ingest_lines)):
+        asyncio.run(main.process_project_metrics(context, "project-a", services, set(), []))
+    return context.checkpoints.checkpoints
+
+
+def test_window_is_not_recorded_for_failed_fetches_or_dropped_lines(tmp_path):
+    assert set(_process_project_metrics(tmp_path)) == {"project-a/gce_instance", "project-a/cloudsql_database"}
+    assert set(_process_project_metrics(tmp_path, failed_service_name="cloudsql_database")) == \
+        {"project-a/gce_instance"}
+    assert _process_project_metrics(tmp_path, dropped_lines=3) == {}
@@ -0,0 +1,123 @@
+import asyncio
+import base64
+
+import pytest
+
+from lib import credentials
+from lib.context import LoggingContext
+from lib.credentials import CredentialProvider
+from unit.fakes import FakeClock, FakeResponse
+
+
+class _FakeSession:
+    def __init__(self):
+        self.urls = []
+        self.release = None
+        self.secret = "https://tenant.live.dynatrace.com"
+
+    async def get(self, url, headers):
+        self.urls.append(url)
+        if self.release:
+            await self.release.wait()
+        if "secretmanager" in url:
+            return FakeResponse({"payload": {"data": base64.b64encode(self.secret.encode()).decode()}})
+        return FakeResponse({"access_token": f"token-{len(self.urls)}", "expires_in": 3599})
+
+
+@pytest.fixture(autouse=True)
+def metadata_server(monkeypatch):
+    monkeypatch.setenv("GOOGLE_APPLICATION_CREDENTIALS", "")
+
+
+def test_token_is_reused_until_refresh_margin():
+    clock = FakeClock()
+    provider = CredentialProvider(300, 0, clock)
+    session = _FakeSession()
+    context = LoggingContext(None)
+
+    async def run():
+        first = await provider.get_token(context, session)
+        clock.now += 3000
+        second = await provider.get_token(context, session)
+        long_cycle = await provider.get_token(context, session, valid_for_seconds=600)
+        clock.now += 300
+        after_margin = await provider.get_token(context, session)
+        return first, second, long_cycle, after_margin
+
+    first, second, long_cycle, after_margin = asyncio.run(run())
+
+    assert first.value == second.value == "token-1"
+    assert first.expires_at == 1000 + 3599
+    assert long_cycle.value == "token-2"
+    assert after_margin.value == "token-2"
+    assert len(session.urls) == 2
+
+
+def test_concurrent_requests_share_one_fetch():
+    provider = CredentialProvider(300, 600, FakeClock())
+    session = _FakeSession()
+    context = LoggingContext(None)
+
+    async def run():
+        session.release = asyncio.Event()
+        tokens = asyncio.gather(*[provider.get_token(context, session) for _ in range(5)])
+        secrets = asyncio.gather(*[provider.get_secret("DYNATRACE_URL", session, "owner", "t") for _ in range(5)])
+        await asyncio.sleep(0)
+        session.release.set()
+        return await tokens, await secrets
+
+    tokens, secrets = asyncio.run(run())
+
+    assert {token.value for token in tokens} == {"token-1"}
+    assert secrets == ["https://tenant.live.dynatrace.com"] * 5
+    assert len(session.urls) == 2
+
+
+def test_secrets_are_kept_for_ttl():
+    clock = FakeClock()
+    provider = CredentialProvider(300, 600, clock)
+    session = _FakeSession()
+
+    async def run():
+        first = await provider.get_secret("DYNATRACE_URL", session, "owner", "t")
+        session.secret = "https://other.live.dynatrace.com"
+        cached = await provider.get_secret("DYNATRACE_URL", session, "owner", "t")
+        clock.now += 600
+        return first, cached, await provider.get_secret("DYNATRACE_URL", session, "owner", "t")
+
+    assert asyncio.run(run()) == ("https://tenant.live.dynatrace.com", "https://tenant.live.dynatrace.com",
+                                  "https://other.live.dynatrace.com")
+    assert len(session.urls) == 2
+
+
+def test_zero_secret_ttl_and_invalidated_token_fetch_again():
+    provider = CredentialProvider(300, 0, FakeClock())
+    session = _FakeSession()
+    context = LoggingContext(None)
+
+    async def run():
+        await provider.get_secret("DYNATRACE_URL", session, "owner", "t")
+        await provider.get_secret("DYNATRACE_URL", session, "owner", "t")
+        token = await provider.get_token(context, session)
+        provider.invalidate_token(token.value)
+        return await provider.get_token(context, session)
+
+    assert asyncio.run(run()).value == "token-4"
+    assert len(session.urls) == 4
+
+
+def test_token_with_expiry_is_refreshed_when_reported_expired(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(credentials, "credential_provider", CredentialProvider(300, 0, clock))
+    session = _FakeSession()
+    context = LoggingContext(None)
+
+    async def run():
+        token_info = await credentials.create_token_with_expiry(context, session, validate=True)
+        clock.now = token_info["expires_at"]
+        return token_info, await credentials.create_token(context, session, validate=True)
+
+    token_info, refreshed_token = asyncio.run(run())
+
+    assert token_info == {"access_token": "token-1", "expires_at": 1000 + 3599 - 300}
+    assert refreshed_token == "token-2"
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from lib import project_inventory as project_inventory_module
+from lib.context import MetricsContext
+from lib.project_inventory import ProjectInventory
+from unit.fakes import FakeClock
+
+
+class FakeApis:
+    def __init__(self):
+        self.projects = ["project-a", "project-b"]
+        self.disabled_apis = {"project-a": {"file.googleapis.com"}, "project-b": {"monitoring.googleapis.com"}, "owner": set()}
+        self.calls = []
+        self.release = None
+
+    async def get_all_accessible_projects(self, context, gcp_session, token):
+        self.calls.append("projects")
+        if self.release:
+            await self.release.wait()
+        return list(self.projects)
+
+    async def get_project_disabled_state(self, context, project_id):
+        self.calls.append(f"disabled:{project_id}")
+        disabled_apis = self.disabled_apis[project_id]
+        return "monitoring.googleapis.com" in disabled_apis, disabled_apis
+
+    async def probe_x_goog_user_project_header(self, context, project_id):
+        self.calls.append(f"header:{project_id}")
+        return project_id == "project-a"
+
+
+@pytest.fixture
+def apis(monkeypatch):
+    fake = FakeApis()
+    monkeypatch.setattr(project_inventory_module, "get_all_accessible_projects", fake.get_all_accessible_projects)
+    monkeypatch.setattr(project_inventory_module, "get_project_disabled_state", fake.get_project_disabled_state)
+    monkeypatch.setattr(project_inventory_module, "probe_x_goog_user_project_header", fake.probe_x_goog_user_project_header)
+    return fake
+
+
+def _context():
+    return MetricsContext(None, None, "owner", "", datetime.utcnow(), 0, "", "", False, False, None)
+
+
+async def _cycle(inventory):
+    context = _context()
+    projects = await inventory.get_accessible_projects(context, None, "token")
+    disabled = await inventory.get_disabled_projects_and_disabled_apis(context, projects + ["owner"])
+    await inventory.wait_for_refreshes()
+    return projects, disabled, context
+
+
+def test_values_are_fetched_once_within_ttl(apis):
+    clock = FakeClock()
+    inventory = ProjectInventory(600, 300, 3600, clock)
+
+    async def run():
+        first = await _cycle(inventory)
+        clock.now += 200
+        second = await _cycle(inventory)
+        return first, second
+
+    (projects, disabled, context), (_, second_disabled, second_context) = asyncio.run(run())
+
+    assert projects == ["project-a", "project-b"]
+    assert disabled == ({"project-b"}, {"project-a": {"file.googleapis.com"}, "owner": set()})
+    assert second_disabled == disabled
+    assert second_context.use_x_goog_user_project_header == {"owner": False, "project-a": True, "project-b": False}
+    assert apis.calls.count("projects") == 1
+    assert "header:owner" not in apis.calls
+    assert apis.calls.count("disabled:project-a") == 1
+
+
+def test_outdated_values_are_returned_and_refreshed_with_own_ttl(apis):
+    clock = FakeClock()
+    inventory = ProjectInventory(600, 300, 3600, clock)
+
+    async def run():
+        await _cycle(inventory)
+        apis.calls.clear()
+        apis.projects = ["project-a", "project-b", "project-c"]
+        apis.disabled_apis["project-a"] = set()
+        apis.disabled_apis["project-c"] = set()
+        apis.release = asyncio.Event()
+        clock.now += 650
+
+        context = _context()
+        stale_projects = await inventory.get_accessible_projects(context, None, "token")
+        stale_disabled = await inventory.get_disabled_projects_and_disabled_apis(context, stale_projects)
+        apis.release.set()
+        await inventory.wait_for_refreshes()
+        refreshed_projects = await inventory.get_accessible_projects(context, None, "token")
+        return stale_projects, stale_disabled, refreshed_projects
+
+    stale_projects, stale_disabled, refreshed_projects = asyncio.run(run())
+
+    assert stale_projects == ["project-a", "project-b"]
+    assert stale_disabled[1]["project-a"] == {"file.googleapis.com"}
+    assert refreshed_projects == ["project-a", "project-b", "project-c"]
+    assert sorted(apis.calls) == ["disabled:project-a", "disabled:project-b", "projects"]
+
+
+def test_zero_ttl_fetches_every_time(apis):
+    inventory = ProjectInventory(0, 0, 0)
+
+    async def run():
+        await _cycle(inventory)
+        await _cycle(inventory)
+
+    asyncio.run(run())
+
+    assert apis.calls.count("projects") == 2
+    assert apis.calls.count("header:project-b") == 2
+
+
+def test_empty_project_list_is_not_kept(apis):
+    inventory = ProjectInventory(600, 300, 3600, FakeClock())
+    apis.projects = []
+
+    async def run():
+        first = await inventory.get_accessible_projects(_context(), None, "token")
+        apis.projects = ["project-a"]
+        return first, await inventory.get_accessible_projects(_context(), None, "token")
+
+    assert asyncio.run(run()) == ([], ["project-a"])
+
+
+def test_failed_refresh_of_project_list_keeps_cached_projects(apis):
+    clock = FakeClock()
+    inventory = ProjectInventory(600, 300, 3600, clock)
+
+    async def run():
+        await _cycle(inventory)
+        apis.projects = []
+        clock.now += 650
+        await _cycle(inventory)
+        return await inventory.get_accessible_projects(_context(), None, "token")
+
+    assert asyncio.run(run()) == ["project-a", "project-b"]
@@ -0,0 +1,59 @@
+import pytest
+
+from lib import replica_sharding
+from lib.replica_sharding import ReplicaShard, parse_shard_index, shard_of
+
+project_ids = [f"project-{i}" for i in range(300)]
+
+
+def test_every_project_has_exactly_one_shard():
+    assignments = [ReplicaShard(index, 3).assigned_projects(project_ids) for index in range(3)]
+
+    assert sorted(sum(assignments, [])) == sorted(project_ids)
+    assert all(len(assigned) > 50 for assigned in assignments)
+
+
+def test_adding_a_shard_only_moves_projects_to_it():
+    before = {project_id: shard_of(project_id, 3) for project_id in project_ids}
+    after = {project_id: shard_of(project_id, 4) for project_id in project_ids}
+
+    moved = [project_id for project_id in project_ids if before[project_id] != after[project_id]]
+    assert all(after[project_id] == 3 for project_id in moved)
+    assert len(moved) < len(project_ids) / 3
+
+
+def test_fan_in_scope_is_polled_by_leader_only():
+    assert ReplicaShard(0, 2).assigned_projects(project_ids, metrics_scope_fan_in=True) == project_ids
+    assert ReplicaShard(1, 2).assigned_projects(project_ids, metrics_scope_fan_in=True) == []
+    assert ReplicaShard(0, 1).assigned_projects(project_ids) == project_ids
+
+
+def test_shard_index_from_env_or_stateful_set_ordinal(monkeypatch):
+    assert parse_shard_index("1", "dynatrace-gcp-monitor-2") == 1
+    assert parse_shard_index("", "dynatrace-gcp-monitor-2") == 2
+    assert parse_shard_index("", "dynatrace-gcp-monitor") is None
+
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    monkeypatch.setenv("SHARD_INDEX", "2")
+    with pytest.raises(ValueError):
+        replica_sharding.replica_shard_from_config()
+
+
+def test_invalid_shard_config_is_resolved_on_first_use(monkeypatch):
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    monkeypatch.setenv("SHARD_INDEX", "2")
+    replica_sharding.get_replica_shard.cache_clear()
+    try:
+        monkeypatch.setenv("OPERATION_MODE", "Logs")
+        assert not replica_sharding.get_replica_shard().enabled
+
+        replica_sharding.get_replica_shard.cache_clear()
+        monkeypatch.setenv("OPERATION_MODE", "Metrics")
+        assert replica_sharding.get_replica_shard().assigned_projects(project_ids) == []
+    finally:
+        replica_sharding.get_replica_shard.cache_clear()
+
+
+def test_sfm_series_are_separate_per_shard():
+    assert ReplicaShard(1, 2).sfm_task_id("gcp-monitor") == "gcp-monitor-shard-1"
+    assert ReplicaShard(0, 1).sfm_task_id("gcp-monitor") == "gcp-monitor"
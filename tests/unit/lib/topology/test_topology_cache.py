@@ -0,0 +1,176 @@
+import asyncio
+import unittest
+from datetime import datetime
+from typing import Dict, List
+
+import pytest
+
+from lib.context import MetricsContext
+from lib.entities.model import EntitiesExtractorData, Entity
+from lib.metrics import GCPService
+from lib.topology.topology_cache import TopologyCache
+from unit.fakes import FakeClock
+
+service_a = GCPService(service="service_a")
+service_b = GCPService(service="service_b")
+
+
+def _entity(entity_id: str, ip_addresses: List[str]) -> Entity:
+    return Entity(id=entity_id, display_name=entity_id, group="group", ip_addresses=ip_addresses, listen_ports=[],
+                  favicon_url="", dtype="type", properties=[], tags=[], dns_names=[])
+
+
+class FakeExtractors:
+    def __init__(self):
+        self.entities: Dict[str, List[Entity]] = {"service_a": [_entity("a1", ["10.0.0.2", "10.0.0.1"])],
+                                                  "service_b": [_entity("b1", [])]}
+        self.calls: List[str] = []
+        self.release = asyncio.Event()
+        self.block = False
+        self.fail = False
+
+    def extractor(self, service_name):
+        async def extract(ctx, project_id, svc_def):
+            self.calls.append(service_name)
+            if self.block:
+                await self.release.wait()
+            if self.fail:
+                raise Exception("API unavailable")
+            return [_entity(e.id, list(e.ip_addresses)) for e in self.entities[service_name]]
+
+        return extract
+
+    def as_extractors(self) -> Dict[str, EntitiesExtractorData]:
+        return {name: EntitiesExtractorData(self.extractor(name), "ok_api") for name in ("service_a", "service_b")}
+
+
+@pytest.fixture
+def extractors():
+    fake = FakeExtractors()
+    with unittest.mock.patch("lib.topology.topology.entities_extractors", new=fake.as_extractors()):
+        yield fake
+
+
+def _context():
+    return MetricsContext(None, None, "", "", datetime.utcnow(), 0, "", "", False, False, None)
+
+
+async def _cycle(cache, context, services=(service_a, service_b)):
+    result = await cache.get_topology(context, "project", list(services), set())
+    await cache.wait_for_refreshes("project")
+    return result, cache.entity_id_map("project", result)
+
+
+def test_fresh_entries_are_reused(extractors):
+    clock = FakeClock()
+    cache = TopologyCache(ttl_seconds=300, stale_while_revalidate_seconds=600, clock=clock)
+
+    async def run():
+        context = _context()
+        first, first_map = await _cycle(cache, context)
+        clock.now += 299
+        second, second_map = await _cycle(cache, context)
+        return first, first_map, second, second_map
+
+    first, first_map, second, second_map = asyncio.run(run())
+
+    assert extractors.calls == ["service_a", "service_b"]
+    assert second == first
+    assert second_map is first_map
+    assert first_map["a1"].ip_addresses == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_stale_entries_are_returned_immediately_and_refreshed_in_background(extractors):
+    clock = FakeClock()
+    cache = TopologyCache(ttl_seconds=300, stale_while_revalidate_seconds=600, clock=clock)
+
+    async def run():
+        context = _context()
+        _, first_map = await _cycle(cache, context)
+        extractors.entities["service_a"] = [_entity("a2", [])]
+        extractors.block = True
+        clock.now += 300
+
+        stale = await cache.get_topology(context, "project", [service_a, service_b], set())
+        assert [e.id for e in stale[service_a]] == ["a1"]
+
+        extractors.release.set()
+        await cache.wait_for_refreshes("project")
+        refreshed_map = cache.entity_id_map("project", stale)
+        refreshed = await cache.get_topology(context, "project", [service_a, service_b], set())
+        return first_map, refreshed_map, refreshed
+
+    first_map, refreshed_map, refreshed = asyncio.run(run())
+
+    assert extractors.calls == ["service_a", "service_b", "service_a", "service_b"]
+    assert set(refreshed_map) == {"a2", "b1"}
+    assert refreshed_map is not first_map
+    assert [e.id for e in refreshed[service_a]] == ["a2"]
+
+
+def test_entity_id_map_is_not_rebuilt_when_refresh_returns_same_entities(extractors):
+    clock = FakeClock()
+    cache = TopologyCache(ttl_seconds=300, stale_while_revalidate_seconds=600, clock=clock)
+
+    async def run():
+        context = _context()
+        _, first_map = await _cycle(cache, context)
+        clock.now += 400
+        _, refreshed_map = await _cycle(cache, context)
+        clock.now += 100
+        await _cycle(cache, context)
+        return first_map, refreshed_map
+
+    first_map, refreshed_map = asyncio.run(run())
+
+    assert refreshed_map is first_map
+    assert extractors.calls.count("service_a") == 2
+
+
+def test_failed_refresh_keeps_cached_entities(extractors):
+    clock = FakeClock()
+    cache = TopologyCache(ttl_seconds=300, stale_while_revalidate_seconds=600, clock=clock)
+
+    async def run():
+        context = _context()
+        await _cycle(cache, context)
+        extractors.fail = True
+        clock.now += 300
+        return await _cycle(cache, context)
+
+    result, entity_id_map = asyncio.run(run())
+
+    assert [e.id for e in result[service_a]] == ["a1"]
+    assert set(entity_id_map) == {"a1", "b1"}
+
+
+def test_entries_past_stale_window_are_fetched_before_returning(extractors):
+    clock = FakeClock()
+    cache = TopologyCache(ttl_seconds=300, stale_while_revalidate_seconds=600, clock=clock)
+
+    async def run():
+        context = _context()
+        await _cycle(cache, context)
+        extractors.entities["service_b"] = []
+        clock.now += 900
+        return await cache.get_topology(context, "project", [service_a, service_b], set())
+
+    result = asyncio.run(run())
+
+    assert result[service_b] == []
+    assert extractors.calls == ["service_a", "service_b", "service_a", "service_b"]
+
+
+def test_disabled_cache_fetches_topology_every_time(extractors):
+    cache = TopologyCache(ttl_seconds=0, stale_while_revalidate_seconds=600)
+
+    async def run():
+        context = _context()
+        await _cycle(cache, context)
+        return await _cycle(cache, context, services=[service_a])
+
+    result, entity_id_map = asyncio.run(run())
+
+    assert extractors.calls == ["service_a", "service_b", "service_a"]
+    assert list(result) == [service_a]
+    assert set(entity_id_map) == {"a1"}
@@ -17,10 +17,12 @@ from datetime import datetime, timedelta, timezone
 
 import pytest
 
+from lib import metric_ingest
 from lib.entities.model import CdProperty
 from lib.metric_ingest import *
 from lib.metric_ingest import _add_aggregated_line, _set_reducer
 from lib.topology.topology import build_entity_id_map
+from unit.fakes import FakeResponse, FakeSession, metrics_context
 
 
 QUERYSTRING_DIMENSION = "querystring"
@@ -273,31 +275,10 @@ def test_exclusion_ignores_entries_without_metric_prefix():
     assert should_exclude_dimension(PERQUERY_EXECUTION_TIME_METRIC, dimension, excluded_metrics) is False
 
 
-class _FakeGcpResponse:
-    def __init__(self, body=None):
-        self.body = body or {}
-
-    async def json(self):
-        await asyncio.sleep(0)
-        return self.body
-
-
-class _FakeGcpSession:
-    def __init__(self, response_body=None):
-        self.params = None
-        self.response_body = response_body
-
-    async def request(self, _method, url, params, headers):
-        await asyncio.sleep(0)
-        _ = (url, headers)
-        self.params = list(params)
-        return _FakeGcpResponse(self.response_body)
-
-
 @pytest.mark.asyncio
 async def test_fetch_metric_fetches_cumulative_source_series_when_dimension_excluded():
-    gcp_session = _FakeGcpSession()
-    context = MetricsContext(gcp_session, None, "owner", "token", datetime.now(timezone.utc), 60, "", "", False, False, None)
+    gcp_session = FakeSession()
+    context = metrics_context(gcp_session)
     service = GCPService(service="cloudsql_database", dimensions=[], metrics=[])
     metric = Metric(
         name="Per query execution time",
@@ -328,7 +309,7 @@ async def test_fetch_metric_fetches_cumulative_source_series_when_dimension_excl
 
 @pytest.mark.asyncio
 async def test_fetch_metric_aggregates_cumulative_values_after_excluding_dimension():
-    gcp_session = _FakeGcpSession(
+    response_body = (
         {
             "timeSeries": [
                 {
@@ -352,7 +333,8 @@ async def test_fetch_metric_aggregates_cumulative_values_after_excluding_dimensi
             ]
         }
     )
-    context = MetricsContext(gcp_session, None, "owner", "token", datetime.now(timezone.utc), 60, "", "", False, False, None)
+    gcp_session = FakeSession(lambda params: response_body)
+    context = metrics_context(gcp_session)
     service = GCPService(service="cloudsql_database", dimensions=[], metrics=[])
     metric = Metric(
         name="Per query execution time",
@@ -382,7 +364,7 @@ async def test_fetch_metric_aggregates_cumulative_values_after_excluding_dimensi
 
 @pytest.mark.asyncio
 async def test_fetch_metric_aggregates_distributions_after_excluding_dimension():
-    gcp_session = _FakeGcpSession(
+    response_body = (
         {
             "timeSeries": [
                 {
@@ -406,7 +388,8 @@ async def test_fetch_metric_aggregates_distributions_after_excluding_dimension()
             ]
         }
     )
-    context = MetricsContext(gcp_session, None, "owner", "token", datetime.now(timezone.utc), 60, "", "", False, False, None)
+    gcp_session = FakeSession(lambda params: response_body)
+    context = metrics_context(gcp_session)
     service = GCPService(service="cloudsql_database", dimensions=[], metrics=[])
     metric = Metric(
         name="Per query latency",
@@ -436,7 +419,7 @@ async def test_fetch_metric_aggregates_distributions_after_excluding_dimension()
 
 @pytest.mark.asyncio
 async def test_fetch_metric_keeps_metric_when_specific_dimension_exclusion_overlaps_broad_exclusion():
-    gcp_session = _FakeGcpSession(
+    response_body = (
         {
             "timeSeries": [
                 {
@@ -459,7 +442,8 @@ async def test_fetch_metric_keeps_metric_when_specific_dimension_exclusion_overl
             ]
         }
     )
-    context = MetricsContext(gcp_session, None, "owner", "token", datetime.now(timezone.utc), 60, "", "", False, False, None)
+    gcp_session = FakeSession(lambda params: response_body)
+    context = metrics_context(gcp_session)
     service = GCPService(service="cloudsql_database", dimensions=[], metrics=[])
     metric = Metric(
         name="Per query execution time",
@@ -496,6 +480,254 @@ async def test_fetch_metric_keeps_metric_when_specific_dimension_exclusion_overl
     assert (GROUP_BY_FIELDS_PARAM, QUERY_HASH_FETCH_KEY) in gcp_session.params
 
 
+def _perquery_execution_time_metric(value_type="INT64"):
+    return Metric(
+        name="Per query execution time",
+        value=f"metric:{PERQUERY_EXECUTION_TIME_METRIC}",
+        key=PERQUERY_EXECUTION_TIME_DT_METRIC,
+        type="count",
+        gcpOptions={"ingestDelay": 0, "samplePeriod": 60, "valueType": value_type, "metricKind": "CUMULATIVE"},
+        dimensions=[
+            {"key": QUERYSTRING_DIMENSION, "value": QUERYSTRING_LABEL_VALUE},
+            {"key": QUERY_HASH_DIMENSION, "value": QUERY_HASH_LABEL_VALUE},
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_metric_reduces_cumulative_series_in_gcp_when_enabled(monkeypatch):
+    monkeypatch.setenv("CUMULATIVE_SERVER_SIDE_REDUCTION", "true")
+    gcp_session = FakeSession()
+    context = metrics_context(gcp_session)
+    service = GCPService(
+        service="cloudsql_database",
+        dimensions=[{"key": "database_id", "value": "label:resource.labels.database_id"}],
+        metrics=[],
+    )
+    metric = _perquery_execution_time_metric()
+
+    await fetch_metric(
+        context,
+        "test-project",
+        service,
+        metric,
+        [{"metric": metric.google_metric, "dimensions": {QUERYSTRING_DIMENSION}}],
+        NO_GROUPING_CATEGORY,
+    )
+
+    assert ("aggregation.perSeriesAligner", "ALIGN_DELTA") in gcp_session.params
+    assert ("aggregation.crossSeriesReducer", "REDUCE_SUM") in gcp_session.params
+    assert (GROUP_BY_FIELDS_PARAM, "resource.labels.database_id") in gcp_session.params
+    assert (GROUP_BY_FIELDS_PARAM, QUERY_HASH_FETCH_KEY) in gcp_session.params
+    assert (GROUP_BY_FIELDS_PARAM, QUERYSTRING_FETCH_KEY) not in gcp_session.params
+
+
+@pytest.mark.asyncio
+async def test_fetch_metric_keeps_local_aggregation_when_excluded_dimension_identifies_entity(monkeypatch):
+    monkeypatch.setenv("CUMULATIVE_SERVER_SIDE_REDUCTION", "true")
+    gcp_session = FakeSession()
+    context = metrics_context(gcp_session)
+    service = GCPService(
+        service="cloudsql_database",
+        dimensions=[{"key": "database_id", "value": "label:resource.labels.database_id"}],
+        metrics=[],
+    )
+    metric = _perquery_execution_time_metric()
+
+    await fetch_metric(
+        context,
+        "test-project",
+        service,
+        metric,
+        [{"metric": metric.google_metric, "dimensions": {"database_id"}}],
+        NO_GROUPING_CATEGORY,
+    )
+
+    assert ("aggregation.crossSeriesReducer", "REDUCE_NONE") in gcp_session.params
+
+
+@pytest.mark.asyncio
+async def test_fetch_metric_keeps_local_aggregation_for_distributions(monkeypatch):
+    monkeypatch.setenv("CUMULATIVE_SERVER_SIDE_REDUCTION", "true")
+    gcp_session = FakeSession()
+    context = metrics_context(gcp_session)
+    service = GCPService(service="cloudsql_database", dimensions=[], metrics=[])
+    metric = _perquery_execution_time_metric("DISTRIBUTION")
+
+    await fetch_metric(
+        context,
+        "test-project",
+        service,
+        metric,
+        [{"metric": metric.google_metric, "dimensions": {QUERYSTRING_DIMENSION}}],
+        NO_GROUPING_CATEGORY,
+    )
+
+    assert ("aggregation.crossSeriesReducer", "REDUCE_NONE") in gcp_session.params
+
+
+def test_distribution_stats_merge_scales_percent_unit_once():
+    first = DistributionStats(0.1, 0.2, 3, 0.45)
+    second = DistributionStats(0.05, 0.3, 2, 0.5)
+
+    assert first.merge(second).to_gauge_line(UNIT_10TO2PERCENT) == "min=5.0,max=30.0,count=5,sum=95.0"
+
+
+def _latency_series(value):
+    return {
+        "timeSeries": [
+            {
+                "valueType": "DISTRIBUTION" if isinstance(value, dict) else "DOUBLE",
+                "metric": {"labels": {}},
+                "resource": {"labels": {}},
+                "points": [
+                    {
+                        "interval": {"endTime": "2026-07-08T17:54:00Z"},
+                        "value": {"distributionValue": value} if isinstance(value, dict) else {"doubleValue": value},
+                    }
+                ],
+            }
+        ]
+    }
+
+
+@pytest.mark.asyncio
+async def test_fetch_metric_queries_percentiles_instead_of_buckets_when_enabled():
+    series_by_reducer = {
+        "REDUCE_PERCENTILE_50": _latency_series(12.5),
+        "REDUCE_PERCENTILE_95": _latency_series(80.0),
+        "REDUCE_PERCENTILE_99": _latency_series(150.0),
+        "REDUCE_SUM": _latency_series({"count": "4", "mean": 25.0}),
+    }
+    gcp_session = FakeSession(lambda params: series_by_reducer[params["aggregation.crossSeriesReducer"]])
+    context = metrics_context(gcp_session)
+    service = GCPService(
+        service="https_lb_rule",
+        dimensions=[],
+        metrics=[{
+            "name": "Total latencies",
+            "value": "metric:loadbalancing.googleapis.com/https/total_latencies",
+            "key": "cloud.gcp.loadbalancing_googleapis_com.https.total_latencies",
+            "type": "gauge",
+            "gcpOptions": {"ingestDelay": 0, "samplePeriod": 60, "valueType": "DISTRIBUTION", "metricKind": "DELTA"},
+        }],
+        activation={"distributionPercentiles": ["loadbalancing.googleapis.com/https/"]},
+    )
+    metric = service.metrics[0]
+
+    lines = await fetch_metric(context, "test-project", service, metric, [], NO_GROUPING_CATEGORY)
+
+    values_by_name = {line.metric_name: line.value for line in lines}
+    assert metric.distribution_percentiles is True
+    assert values_by_name == {
+        f"{metric.dynatrace_name}.p50": 12.5,
+        f"{metric.dynatrace_name}.p95": 80.0,
+        f"{metric.dynatrace_name}.p99": 150.0,
+        f"{metric.dynatrace_name}.count": 4,
+        f"{metric.dynatrace_name}.sum": 100.0,
+    }
+    assert len(gcp_session.requests) == 4
+    fields = [value for _, params in gcp_session.requests for name, value in params if name == "fields"]
+    assert len(fields) == 4
+    assert all("bucket" not in mask for mask in fields)
+
+
+def test_distribution_percentiles_are_not_applied_to_non_distribution_metrics():
+    service = GCPService(
+        service="https_lb_rule",
+        dimensions=[],
+        metrics=[{
+            "name": "Request count",
+            "value": "metric:loadbalancing.googleapis.com/https/request_count",
+            "key": "cloud.gcp.loadbalancing_googleapis_com.https.request_count",
+            "type": "count",
+            "gcpOptions": {"ingestDelay": 0, "samplePeriod": 60, "valueType": "INT64", "metricKind": "DELTA"},
+        }],
+        activation={"distributionPercentiles": ["loadbalancing.googleapis.com/https/"]},
+    )
+
+    assert service.metrics[0].distribution_percentiles is False
+
+
+@pytest.mark.asyncio
+async def test_fetch_metric_groups_by_project_id_in_metrics_scope_fan_in_mode(monkeypatch):
+    monkeypatch.setenv("SCOPING_PROJECT_SUPPORT_ENABLED", "true")
+    monkeypatch.setenv("METRICS_SCOPE_FAN_IN", "true")
+    series = [
+        {
+            "valueType": "INT64",
+            "metric": {"labels": {}},
+            "resource": {"labels": {"project_id": project_id}},
+            "points": [{"interval": {"endTime": "2026-07-08T17:54:00Z"}, "value": {"int64Value": "1"}}],
+        }
+        for project_id in ("project-a", "project-b", "project-b")
+    ]
+    gcp_session = FakeSession(lambda params: {"timeSeries": series})
+    context = metrics_context(gcp_session)
+    service = GCPService(service="cloudsql_database", dimensions=[], metrics=[])
+
+    lines = await fetch_metric(
+        context, "scoping-project", service, _perquery_execution_time_metric(), [], NO_GROUPING_CATEGORY
+    )
+    lines_by_project = split_ingest_lines_by_project(lines, "scoping-project")
+
+    assert (GROUP_BY_FIELDS_PARAM, PROJECT_ID_GROUP_BY_FIELD) in gcp_session.params
+    assert {project_id: len(project_lines) for project_id, project_lines in lines_by_project.items()} == {
+        "project-a": 1,
+        "project-b": 2,
+    }
+
+
+def test_split_ingest_lines_by_project_falls_back_to_scoping_project():
+    line = IngestLine("entity", "cloud.gcp.metric", "gauge", 1, 0, [create_dimension("gcp.resource.type", "x")])
+
+    assert split_ingest_lines_by_project([line], "scoping-project") == {"scoping-project": [line]}
+
+
+def test_promql_queries_from_activation_become_gauge_metrics():
+    service = GCPService(service="cloudsql_database", dimensions=[], metrics=[], activation={"promqlQueries": [
+        {"key": "cloud.gcp.cloudsql.cpu.ratio", "query": "sum(rate(x[5m]))", "unit": UNIT_10TO2PERCENT},
+        {"key": "cloud.gcp.missing.query"},
+    ]})
+
+    assert len(service.promql_metrics) == 1
+    metric = service.promql_metrics[0]
+    assert metric.promql_query == "sum(rate(x[5m]))"
+    assert metric.dynatrace_metric_type == "gauge"
+    assert metric.unit == UNIT_10TO2PERCENT
+
+
+@pytest.mark.asyncio
+async def test_fetch_promql_metric_maps_labels_like_time_series():
+    gcp_session = FakeSession(lambda params: {"status": "success", "data": {"resultType": "matrix", "result": [{
+        "metric": {"__name__": "ratio", "database_id": "db-1", "project_id": "test-project", "state": "up"},
+        "values": [[1783533240, "0.25"], [1783533300, "NaN"]],
+    }]}})
+    context = metrics_context(gcp_session)
+    service = GCPService(
+        service="cloudsql_database",
+        dimensions=[{"key": "database_id", "value": "label:resource.labels.database_id"}],
+        metrics=[],
+        activation={"promqlQueries": [{"key": "cloud.gcp.cloudsql.ratio", "query": "sum by (database_id) (x)"}]},
+    )
+
+    lines = await fetch_promql_metric(context, "test-project", service, service.promql_metrics[0])
+
+    assert ("query", "sum by (database_id) (x)") in gcp_session.params
+    assert ("step", "60s") in gcp_session.params
+    assert len(lines) == 1
+    assert lines[0].value == 0.25
+    assert lines[0].timestamp == 1783533240000
+    assert lines[0].entity_id == create_entity_id(
+        "cloudsql_database", service.dimensions, {"resource": {"labels": {"database_id": "db-1"}}}
+    )
+    dimensions = {dimension.name: dimension.value for dimension in lines[0].dimension_values}
+    assert dimensions["database_id"] == "db-1"
+    assert dimensions["gcp.project.id"] == "test-project"
+    assert dimensions["state"] == "up"
+    assert "__name__" not in dimensions
+
+
 def test_flatten_and_enrich_metric_results_all_additional_dimensions():
     context_mock = MetricsContext(None, None, "", "", datetime.now(timezone.utc), 0, "", "", False, False, None)
     metric_results = [[IngestLine("entity_id", "m1", "count", 1, 10000, [])]]
@@ -574,3 +806,15 @@ def test_extract_value_explicit_buckets_no_overflow():
     result = extract_value(point, DISTRIBUTION_VALUE_KEY, metric)
     assert result is not None
     assert "count=10" in result
+
+
+@pytest.mark.asyncio
+async def test_fetch_time_series_page_retries_after_quota_exceeded():
+    responses = [FakeResponse(status=429, headers={"Retry-After": "0"}), FakeResponse({"timeSeries": [{"points": []}]})]
+    context = metrics_context(FakeSession(lambda params: responses.pop(0)))
+    page = {}
+    series = [single_time_series async for single_time_series in
+              metric_ingest._fetch_time_series_page(context, "url", "test-project", [], {}, page)]
+
+    assert series == [{"points": []}]
+    assert responses == []
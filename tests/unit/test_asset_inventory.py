@@ -0,0 +1,115 @@
+import asyncio
+
+from lib import asset_inventory
+from lib.entities import entities_extractors
+from lib.entities.extractors import cloud_sql, pubsub_subscription
+from lib.metrics import GCPService
+from lib.topology.topology import fetch_service_topology
+from unit.fakes import FakeSession, metrics_context
+
+
+def _project(number, project_id, state="ACTIVE"):
+    return {
+        "assetType": "cloudresourcemanager.googleapis.com/Project",
+        "project": f"projects/{number}",
+        "state": state,
+        "versionedResources": [{"version": "v1", "resource": {"projectId": project_id, "projectNumber": number}}],
+    }
+
+
+def _resource(asset_type, number, data, version="v1"):
+    return {"assetType": asset_type, "project": f"projects/{number}",
+            "versionedResources": [{"version": version, "resource": data}]}
+
+
+_SQL_INSTANCE = {"name": "db", "project": "project-a", "region": "us-east1", "connectionName": "project-a:us-east1:db",
+                 "ipAddresses": [{"ipAddress": "10.1.1.1"}], "settings": {"tier": "db-f1-micro"}}
+
+sql_service = GCPService(service="cloudsql_database", tech_name="Cloud SQL", dimensions=[
+    {"key": "database_id", "value": "label:resource.labels.database_id"},
+    {"key": "region", "value": "label:resource.labels.region"},
+])
+pubsub_service = GCPService(service="pubsub_subscription", tech_name="Pub/Sub", dimensions=[
+    {"key": "subscription_id", "value": "label:resource.labels.subscription_id"},
+    {"key": "project_id", "value": "label:resource.labels.project_id"},
+])
+
+
+def test_projects_and_entities_come_from_search_pages():
+    session = FakeSession.with_pages([
+        {"results": [_project("111", "project-a"), _project("222", "project-b"), _project("333", "gone", "DELETE_REQUESTED"),
+                     _resource("sqladmin.googleapis.com/Instance", "111", _SQL_INSTANCE)],
+         "nextPageToken": "next"},
+        {"results": [_resource("pubsub.googleapis.com/Subscription", "222",
+                               {"name": "projects/222/subscriptions/sub", "topic": "projects/222/topics/t"})]},
+    ])
+    context = metrics_context(session)
+
+    inventory = asyncio.run(asset_inventory.fetch_asset_inventory(
+        context, "organizations/1", [sql_service, pubsub_service]))
+
+    assert inventory.project_ids == ["project-a", "project-b"]
+    assert session.requests[0][0] == "https://cloudasset.googleapis.com/v1/organizations/1:searchAllResources"
+    assert ("assetTypes", "sqladmin.googleapis.com/Instance") in session.requests[0][1]
+    assert ("assetTypes", "compute.googleapis.com/Instance") not in session.requests[0][1]
+    assert ("pageToken", "next") in session.requests[1][1]
+
+    sql_entities = inventory.entities("project-a", sql_service)
+    assert sql_entities == cloud_sql._cloud_sql_resp_to_monitored_entities({"items": [_SQL_INSTANCE]}, sql_service)
+    assert inventory.entities("project-b", sql_service) == []
+
+    pubsub_entities = inventory.entities("project-b", pubsub_service)
+    expected_pubsub_entities = pubsub_subscription._cloud_function_resp_to_monitored_entities(
+        {"subscriptions": [{"name": "projects/project-b/subscriptions/sub", "topic": "projects/222/topics/t"}]},
+        pubsub_service)
+    assert [e.id for e in pubsub_entities] == [e.id for e in expected_pubsub_entities]
+
+
+def test_extractor_is_used_for_services_without_resource_data(monkeypatch):
+    session = FakeSession.with_pages([{"results": [
+        _project("111", "project-a"),
+        {"assetType": "sqladmin.googleapis.com/Instance", "project": "projects/111"},
+    ]}])
+    context = metrics_context(session)
+    context.asset_inventory = asyncio.run(asset_inventory.fetch_asset_inventory(context, "folders/2", [sql_service]))
+
+    extractor_calls = []
+
+    async def sql_extractor(ctx, project_id, svc_def):
+        extractor_calls.append(project_id)
+        return ["from extractor"]
+
+    monkeypatch.setitem(entities_extractors, "cloudsql_database",
+                        entities_extractors["cloudsql_database"].__class__(sql_extractor, "sqladmin.googleapis.com"))
+    entities = asyncio.run(fetch_service_topology(context, "project-a", sql_service))
+
+    assert not context.asset_inventory.covers("project-a", "cloudsql_database")
+    assert entities == ["from extractor"]
+    assert extractor_calls == ["project-a"]
+
+
+def test_failed_search_returns_none():
+    session = FakeSession.with_pages([{"error": {"code": 403, "message": "denied"}}], status=403)
+
+    assert asyncio.run(asset_inventory.fetch_asset_inventory(metrics_context(session), "organizations/1", None)) is None
+
+
+def test_functions_reported_as_both_asset_types_are_mapped_once():
+    function_service = GCPService(service="cloud_function", tech_name="Cloud Functions")
+    v2_data = {"name": "projects/111/locations/us-east1/functions/f", "state": "ACTIVE",
+               "buildConfig": {"entryPoint": "main", "runtime": "python311"}, "serviceConfig": {"availableMemory": "256M"}}
+    v1_data = {"name": "projects/111/locations/us-east1/functions/f", "status": "ACTIVE", "entryPoint": "main",
+               "runtime": "python311", "availableMemoryMb": 256}
+    old_data = {**v1_data, "name": "projects/111/locations/us-east1/functions/old"}
+    inventory = asset_inventory.AssetInventory(["cloud_function"])
+    inventory.add_results([
+        _project("111", "project-a"),
+        _resource("cloudfunctions.googleapis.com/CloudFunction", "111", v1_data),
+        _resource("cloudfunctions.googleapis.com/Function", "111", v2_data, version="v2"),
+        _resource("cloudfunctions.googleapis.com/CloudFunction", "111", old_data),
+    ])
+
+    entities = inventory.entities("project-a", function_service)
+
+    assert [e.display_name for e in entities] == ["f", "old"]
+    assert all(("Available memory", "256M") in e.properties for e in entities)
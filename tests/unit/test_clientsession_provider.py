@@ -0,0 +1,80 @@
+import asyncio
+
+import aiohttp
+
+from lib.clientsession_provider import ConnectionManager, init_gcp_client_session
+
+# Nothing listens there, connecting fails right away
+_REFUSING_URL = "http://127.0.0.1:1/"
+
+
+def _manager(enabled=True, recreate_after_errors=2):
+    return ConnectionManager({"gcp": init_gcp_client_session}, enabled, recreate_after_errors)
+
+
+def test_session_is_shared_between_uses():
+    manager = _manager()
+
+    async def run():
+        async with manager.gcp_session() as first, manager.gcp_session() as concurrent:
+            pass
+        async with manager.gcp_session() as later:
+            stats = manager.pool_stats()
+        await manager.close()
+        return first, concurrent, later, stats
+
+    first, concurrent, later, stats = asyncio.run(run())
+
+    assert first is concurrent is later
+    assert first.closed
+    assert stats["gcp"]["leases"] == 1
+    assert stats["gcp"]["limit"] == 500
+    assert stats["gcp"]["recreated"] == 0
+
+
+def test_disabled_manager_closes_session_after_each_use():
+    manager = _manager(enabled=False)
+
+    async def run():
+        async with manager.gcp_session() as first:
+            pass
+        async with manager.gcp_session() as second:
+            pass
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first is not second
+    assert first.closed and second.closed
+    assert manager.pool_stats() == {}
+
+
+def test_session_is_recreated_after_connection_errors():
+    manager = _manager()
+
+    async def request(session):
+        try:
+            async with session.get(_REFUSING_URL):
+                pass
+        except aiohttp.ClientConnectionError:
+            pass
+
+    async def run():
+        async with manager.gcp_session() as failing:
+            await request(failing)
+            async with manager.gcp_session() as still_shared:
+                pass
+            await request(failing)
+            async with manager.gcp_session() as replacement:
+                closed_while_used = failing.closed
+        recreated = manager.recreated_sessions["gcp"]
+        await manager.close()
+        return failing, still_shared, replacement, closed_while_used, recreated
+
+    failing, still_shared, replacement, closed_while_used, recreated = asyncio.run(run())
+
+    assert still_shared is failing
+    assert replacement is not failing
+    assert not closed_while_used
+    assert failing.closed
+    assert recreated == 1
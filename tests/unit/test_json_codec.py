@@ -0,0 +1,103 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from lib import json_codec
+from lib.context import LogsProcessingContext
+from lib.logs import logs_processor
+
+_LOG_PAYLOAD = {
+    "content": "Łódź: request \"GET /\" took 12 ms   \U0001F600 \\ </script>",
+    "timestamp": "2024-03-01T10:11:12.123456Z",
+    "severity": "INFO",
+    "cloud.provider": "gcp",
+    "gcp.project.id": "dynatrace-gcp-extension",
+    "gcp.resource.type": "k8s_container",
+    "k8s.pod.name": "pod-1",
+    "faas.instance": None,
+    "log.truncated": True,
+}
+
+_SFM_TIME_SERIES = {
+    "timeSeries": [
+        {
+            "resource": {"type": "generic_task", "labels": {"location": "us-east1", "task_id": "1"}},
+            "metric": {"type": "custom.googleapis.com/dynatrace/logs/kilobytes", "labels": {"status": "200"}},
+            "valueType": "DOUBLE",
+            "metricKind": "GAUGE",
+            "points": [{"interval": {"endTime": "2024-03-01T10:11:12.000000Z"}, "value": {"doubleValue": 123.4375}}],
+        },
+        {
+            "metric": {"type": "custom.googleapis.com/dynatrace/logs/count", "labels": {}},
+            "points": [{"value": {"int64Value": 42}}, {"value": {"int64Value": -9223372036854775808}}],
+        },
+    ]
+}
+
+
+@pytest.fixture
+def json_module_backend(monkeypatch):
+    monkeypatch.setattr(json_codec, "orjson", None)
+
+
+def _orjson_dumps(obj):
+    pytest.importorskip("orjson")
+    return json_codec.dumps(obj)
+
+
+@pytest.mark.parametrize("obj", [_LOG_PAYLOAD, _SFM_TIME_SERIES, [_LOG_PAYLOAD, _LOG_PAYLOAD], {1: "a"}, {}, [], 0.1])
+def test_backends_produce_same_bytes(obj, monkeypatch):
+    fast = _orjson_dumps(obj)
+    monkeypatch.setattr(json_codec, "orjson", None)
+
+    assert fast == json_codec.dumps(obj)
+    assert fast.encode("utf-8") == json_codec.dumps(obj).encode("utf-8")
+
+
+@pytest.mark.parametrize("obj", [_LOG_PAYLOAD, _SFM_TIME_SERIES])
+def test_dumps_decodes_to_same_value_as_json_module_output(obj, json_module_backend):
+    assert json.loads(json_codec.dumps(obj)) == json.loads(json.dumps(obj))
+
+
+def test_floats_in_exponent_notation_decode_to_same_value(monkeypatch):
+    values = [1e-05, 1e300, -2.5e16]
+    fast = _orjson_dumps(values)
+    monkeypatch.setattr(json_codec, "orjson", None)
+
+    assert json.loads(fast) == json.loads(json_codec.dumps(values)) == values
+
+
+def test_values_out_of_orjson_range_are_encoded_by_json_module():
+    pytest.importorskip("orjson")
+
+    assert json_codec.dumps({"value": 2 ** 70}) == '{"value":1180591620717411303424}'
+
+
+@pytest.mark.parametrize("text", ['{"value": NaN}', '{"value": 1180591620717411303424}', b'{"a": [1, "\xc5\x82"]}'])
+def test_loads_matches_json_module(text):
+    assert repr(json_codec.loads(text)) == repr(json.loads(text))
+
+
+@pytest.mark.parametrize("text", ['{"int64Value": "9223372036854775807", "doubleValue": 0.5}', b'{"v": [NaN]}'])
+def test_loads_api_response_matches_json_module(text):
+    assert repr(json_codec.loads_api_response(text)) == repr(json.loads(text))
+
+
+@pytest.mark.parametrize("loads", [json_codec.loads, json_codec.loads_api_response])
+def test_loads_raises_value_error_for_invalid_json(loads):
+    with pytest.raises(ValueError):
+        loads("{not json")
+
+
+def test_processed_message_payload_is_compact(json_module_backend):
+    context = LogsProcessingContext(None, None, None)
+    record = {"textPayload": "żółw", "resource": {"type": "unknown"}, "timestamp": datetime.utcnow().isoformat() + "Z"}
+    message = {"data": base64.b64encode(json.dumps(record).encode("utf-8"))}
+
+    job = logs_processor._process_message(context, message, "ack")
+
+    assert job.payload == json.dumps(json.loads(job.payload), separators=(",", ":"), ensure_ascii=False)
+    assert json.loads(json.loads(job.payload)["content"]) == record
+    assert job.bytes_size == len(job.payload.encode("utf-8"))
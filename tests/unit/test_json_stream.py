@@ -0,0 +1,132 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from lib import metric_ingest
+from lib.context import MetricsContext
+from lib.json_stream import JsonArrayStream, iter_json_array
+from lib.metrics import GCPService, Metric
+from lib.utilities import NO_GROUPING_CATEGORY
+
+_BODY = {
+    "timeSeries": [
+        {"resource": {"labels": {"zone": "europe-west1-b"}}, "points": [{"value": {"int64Value": "12"}}]},
+        {"resource": {"labels": {"zone": 'żółw "quoted" \\ ]}'}}, "points": [{"value": {"doubleValue": 0.5}}]},
+        [1, 2.5e-3, True, None],
+        1234567,
+    ],
+    "nextPageToken": "token",
+    "unit": "By",
+}
+
+
+def _feed_in_pieces(text, size):
+    stream = JsonArrayStream("timeSeries")
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(stream.feed(text[start:start + size]))
+    items.extend(stream.feed("", final=True))
+    return items, stream.close()
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 100000])
+def test_items_and_members_match_json_loads_for_any_piece_size(size):
+    text = json.dumps(_BODY, ensure_ascii=False, indent=1) + "\n"
+
+    items, members = _feed_in_pieces(text, size)
+
+    assert items == _BODY["timeSeries"]
+    assert members == {"nextPageToken": "token", "unit": "By"}
+
+
+def test_body_without_array_keeps_all_members():
+    items, members = _feed_in_pieces('{"error": {"code": 403, "message": "denied"}}', 3)
+
+    assert items == []
+    assert members == {"error": {"code": 403, "message": "denied"}}
+
+
+def test_truncated_body_is_rejected():
+    stream = JsonArrayStream("timeSeries")
+    stream.feed('{"timeSeries": [{"a": 1}, {"b"', final=True)
+
+    with pytest.raises(ValueError):
+        stream.close()
+
+
+class _FakeContent:
+    def __init__(self, body: bytes, chunk_size: int):
+        self.chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+
+    async def iter_chunked(self, _size):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class _FakeStreamedResponse:
+    status = 200
+
+    def __init__(self, body, chunk_size=5):
+        self.content = _FakeContent(json.dumps(body, ensure_ascii=False).encode("utf-8"), chunk_size)
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+@pytest.mark.asyncio
+async def test_iter_json_array_decodes_utf8_split_between_chunks():
+    response = _FakeStreamedResponse(_BODY, chunk_size=3)
+    members = {}
+
+    items = [item async for item in iter_json_array(response, "timeSeries", members)]
+
+    assert items == _BODY["timeSeries"]
+    assert members == {"nextPageToken": "token", "unit": "By"}
+    assert response.released
+
+
+class _FakeStreamingGcpSession:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = 0
+
+    async def request(self, _method, url, params, headers):
+        self.requests += 1
+        return _FakeStreamedResponse(self.pages[self.requests - 1])
+
+
+@pytest.mark.asyncio
+async def test_fetch_metric_streams_time_series_pages(monkeypatch):
+    monkeypatch.setattr(metric_ingest, "GCP_JSON_STREAMING", True)
+
+    def series(database_id):
+        return {
+            "valueType": "INT64",
+            "metric": {"labels": {}},
+            "resource": {"labels": {"database_id": database_id}},
+            "points": [{"interval": {"endTime": "2026-07-08T17:54:00Z"}, "value": {"int64Value": "3"}}],
+        }
+
+    gcp_session = _FakeStreamingGcpSession([
+        {"timeSeries": [series("db-1")], "nextPageToken": "next"},
+        {"timeSeries": [series("db-2")]},
+    ])
+    context = MetricsContext(gcp_session, None, "owner", "token", datetime.now(timezone.utc), 60, "", "", False, False, None)
+    service = GCPService(
+        service="cloudsql_database",
+        dimensions=[{"key": "database_id", "value": "label:resource.labels.database_id"}],
+        metrics=[],
+    )
+    metric = Metric(
+        key="cloud.gcp.test.metric",
+        value="metric:cloudsql.googleapis.com/database/test",
+        type="gauge",
+        gcpOptions={"valueType": "INT64", "metricKind": "GAUGE", "samplePeriod": 60, "ingestDelay": 60},
+    )
+
+    lines = await metric_ingest.fetch_metric(context, "project", service, metric, [], NO_GROUPING_CATEGORY)
+
+    assert gcp_session.requests == 2
+    assert [line.value for line in lines] == ["3", "3"]
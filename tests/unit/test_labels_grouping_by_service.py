@@ -1,6 +1,10 @@
+import pytest
+
 from lib.autodiscovery.models import AutodiscoveryResourceLinking
+from lib.metric_ingest import fetch_metric_for_groupings
 from lib.metrics import AutodiscoveryGCPService, GCPService, Metric
 from lib.utilities import NO_GROUPING_CATEGORY
+from unit.fakes import FakeSession, metrics_context
 
 
 def _create_metric(google_metric: str, autodiscovered_metric: bool = False) -> Metric:
@@ -150,3 +154,85 @@ def test_unknown_service_falls_back_to_no_grouping():
     groupings = _set_groupings(service, configured_services_to_group, metric)
 
     assert groupings == [NO_GROUPING_CATEGORY]
+
+
+def _user_labels_series(value_type, user_labels, value):
+    value_key = "int64Value" if value_type == "INT64" else "doubleValue"
+    return {
+        "valueType": value_type,
+        "metric": {"labels": {}},
+        "resource": {"labels": {}},
+        "metadata": {"userLabels": user_labels},
+        "points": [{"interval": {"endTime": "2026-07-08T17:54:00Z"}, "value": {value_key: value}}],
+    }
+
+
+def _grouped_metric(kind: str, value_type: str) -> Metric:
+    return Metric(
+        key="cloud.gcp.test.metric",
+        value="metric:cloudsql.googleapis.com/database/test",
+        type="gauge",
+        dimensions=[],
+        gcpOptions={"valueType": value_type, "metricKind": kind, "samplePeriod": 60, "ingestDelay": 60},
+    )
+
+
+def _user_label_dimensions(line):
+    return {dimension.name: dimension.value for dimension in line.dimension_values if dimension.name in ("env", "team")}
+
+
+@pytest.mark.asyncio
+async def test_single_query_rolls_up_summed_metric_per_grouping():
+    series = [
+        _user_labels_series("INT64", {"env": "prod", "team": "a"}, "1"),
+        _user_labels_series("INT64", {"env": "prod", "team": "b"}, "2"),
+        _user_labels_series("INT64", {"env": "dev", "team": "a"}, "4"),
+    ]
+    gcp_session = FakeSession(lambda params: {"timeSeries": series})
+    context = metrics_context(gcp_session)
+
+    lines = await fetch_metric_for_groupings(
+        context, "test-project", _create_service("cloudsql_database"), _grouped_metric("DELTA", "INT64"), [],
+        ["env", "team", NO_GROUPING_CATEGORY]
+    )
+
+    assert len(gcp_session.requests) == 1
+    group_by_fields = [value for name, value in gcp_session.params if name == "aggregation.groupByFields"]
+    assert group_by_fields == ["metadata.user_labels.env", "metadata.user_labels.team"]
+    rolled_up = sorted((tuple(sorted(_user_label_dimensions(line).items())), int(line.value)) for line in lines)
+    assert rolled_up == [
+        ((), 7),
+        ((("env", "dev"),), 4),
+        ((("env", "prod"),), 3),
+        ((("team", "a"),), 5),
+        ((("team", "b"),), 2),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_single_query_rolls_up_averaged_metric_weighted_by_series_count():
+    series_by_reducer = {
+        "REDUCE_SUM": {"timeSeries": [
+            _user_labels_series("DOUBLE", {"env": "prod", "team": "a"}, 3.0),
+            _user_labels_series("DOUBLE", {"env": "prod", "team": "b"}, 6.0),
+        ]},
+        "REDUCE_COUNT": {"timeSeries": [
+            _user_labels_series("INT64", {"env": "prod", "team": "a"}, "1"),
+            _user_labels_series("INT64", {"env": "prod", "team": "b"}, "2"),
+        ]},
+    }
+    gcp_session = FakeSession(lambda params: series_by_reducer[params["aggregation.crossSeriesReducer"]])
+    context = metrics_context(gcp_session)
+
+    lines = await fetch_metric_for_groupings(
+        context, "test-project", _create_service("cloudsql_database"), _grouped_metric("GAUGE", "DOUBLE"), [],
+        ["env", "team"]
+    )
+
+    assert len(gcp_session.requests) == 2
+    values = {tuple(sorted(_user_label_dimensions(line).items())): line.value for line in lines}
+    assert values == {
+        (("env", "prod"),): 3.0,
+        (("team", "a"),): 3.0,
+        (("team", "b"),): 3.0,
+    }
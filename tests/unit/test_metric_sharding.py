@@ -0,0 +1,122 @@
+import pytest
+
+from lib import metric_ingest
+from lib.metric_sharding import MetricShardPlanner, ShardObservation
+from unit.fakes import FakeClock, FakeSession, metrics_context
+
+_PARAMS = [("filter", 'metric.type = "compute.googleapis.com/instance/cpu/utilization"'), ("pageToken", "")]
+
+
+def _series(**resource_labels):
+    return {"resource": {"labels": resource_labels}, "points": []}
+
+
+def _observation(pages, series):
+    observation = ShardObservation()
+    for _ in range(pages):
+        observation.observe_page()
+    for single_time_series in series:
+        observation.observe_series(single_time_series)
+    return observation
+
+
+def test_query_below_page_threshold_is_not_sharded():
+    planner = MetricShardPlanner(page_threshold=5, max_shards=4)
+    planner.record("key", _observation(5, [_series(zone="a"), _series(zone="b")]))
+
+    assert planner.plan("key") == []
+    assert planner.plan("unknown") == []
+
+
+def test_disabled_planner_never_shards():
+    planner = MetricShardPlanner(page_threshold=0, max_shards=4)
+    planner.record("key", _observation(100, [_series(zone="a"), _series(zone="b")]))
+
+    assert not planner.enabled
+    assert planner.plan("key") == []
+
+
+def test_location_label_values_are_balanced_across_shards_with_remainder():
+    planner = MetricShardPlanner(page_threshold=2, max_shards=8)
+    series = [_series(zone="a")] * 4 + [_series(zone="b")] * 3 + [_series(zone="c")] * 2 + [_series(zone="d")]
+    planner.record("key", _observation(3, series))
+
+    assert planner.plan("key") == [
+        'resource.labels.zone = one_of("a","d")',
+        'resource.labels.zone = one_of("b","c")',
+        'NOT resource.labels.zone = one_of("a","b","c","d")',
+    ]
+
+
+def test_high_cardinality_label_is_split_by_last_character_buckets():
+    planner = MetricShardPlanner(page_threshold=10, max_shards=3)
+    series = [_series(zone="a", instance_id=str(index)) for index in range(20)]
+    planner.record("key", _observation(25, series))
+
+    clauses = planner.plan("key")
+
+    assert len(clauses) == 4
+    assert clauses[0] == 'resource.labels.instance_id = monitoring.regex.full_match(".*[0369cfilorux]")'
+    assert clauses[-1].startswith("NOT resource.labels.instance_id = ")
+
+
+def test_observations_below_threshold_or_too_old_are_not_kept():
+    clock = FakeClock()
+    planner = MetricShardPlanner(page_threshold=2, max_shards=4, observation_max_age_seconds=600, clock=clock)
+    planner.record("big", _observation(5, [_series(zone="a"), _series(zone="b")]))
+    planner.record("small", _observation(1, [_series(zone="a")]))
+
+    assert planner.plan("big") and list(planner._last_observations) == ["big"]
+
+    clock.now += 600
+    planner.record("other", _observation(5, [_series(zone="a"), _series(zone="b")]))
+    assert planner.plan("big") == []
+    assert list(planner._last_observations) == ["other"]
+
+
+def _time_series_pages(pages, failing_shard=None):
+    """Answers by pageToken, shard clauses are ignored so every shard returns all pages."""
+    def respond(params):
+        if failing_shard and params["filter"].endswith(f"({failing_shard})"):
+            raise ConnectionError("shard failed")
+        page_index = int(params["pageToken"] or 0)
+        body = {"timeSeries": pages[page_index]}
+        if page_index + 1 < len(pages):
+            body["nextPageToken"] = str(page_index + 1)
+        return body
+    return respond
+
+
+@pytest.mark.asyncio
+async def test_list_time_series_shards_query_after_it_exceeded_page_threshold(monkeypatch):
+    monkeypatch.setattr(metric_ingest, "shard_planner", MetricShardPlanner(page_threshold=2, max_shards=2))
+    gcp_session = FakeSession(_time_series_pages([[_series(zone="a")], [_series(zone="b")], [_series(zone="b")]]))
+    context = metrics_context(gcp_session)
+
+    first = [ts async for ts in metric_ingest._list_time_series(context, "project", _PARAMS, {})]
+    gcp_session.requests.clear()
+    second = [ts async for ts in metric_ingest._list_time_series(context, "project", _PARAMS, {})]
+
+    assert len(first) == 3
+    # The fake ignores the shard clause, every shard returns all pages
+    assert len(second) == 9
+    requested_filters = [dict(params)["filter"] for _, params in gcp_session.requests]
+    assert all(requested_filter.startswith(f"({_PARAMS[0][1]}) AND (") for requested_filter in requested_filters)
+    shard_clauses = {requested_filter.split(") AND (", 1)[1][:-1] for requested_filter in requested_filters}
+    assert shard_clauses == {
+        'resource.labels.zone = one_of("a")',
+        'resource.labels.zone = one_of("b")',
+        'NOT resource.labels.zone = one_of("a","b")',
+    }
+
+
+@pytest.mark.asyncio
+async def test_failed_shard_fails_the_query(monkeypatch):
+    monkeypatch.setattr(metric_ingest, "shard_planner", MetricShardPlanner(page_threshold=2, max_shards=2))
+    gcp_session = FakeSession(_time_series_pages([[_series(zone="a")], [_series(zone="b")], [_series(zone="b")]],
+                                                 failing_shard='NOT resource.labels.zone = one_of("a","b")'))
+    context = metrics_context(gcp_session)
+    assert len([ts async for ts in metric_ingest._list_time_series(context, "project", _PARAMS, {})]) == 3
+
+    with pytest.raises(ConnectionError):
+        [ts async for ts in metric_ingest._list_time_series(context, "project", _PARAMS, {})]
@@ -0,0 +1,69 @@
+import pickle
+from datetime import datetime
+from unittest.mock import Mock
+
+import run_docker
+
+from lib import metrics_workers
+from lib.context import MetricsContext, DynatraceConnectivity
+from lib.metrics_workers import PollingReport, ReportAggregator, merge_sfm, worker_index_of_project
+from lib.sfm.for_metrics.metrics_definitions import SfmKeys
+
+execution_time = datetime(2024, 1, 1, 12, 0)
+
+
+def _report(worker_index, project, connectivity=DynatraceConnectivity.Ok):
+    context = MetricsContext(None, None, "owner", "", execution_time, 0, "", "", False, False, None)
+    context.sfm[SfmKeys.dynatrace_request_count].increment(200)
+    context.sfm[SfmKeys.dynatrace_ingest_lines_ok_count].update(project, 10)
+    context.sfm[SfmKeys.fetch_gcp_data_execution_time].update(project, 1.5)
+    context.sfm[SfmKeys.dynatrace_connectivity].update(connectivity)
+    # Reports cross the process boundary through a multiprocessing queue
+    return pickle.loads(pickle.dumps(PollingReport(worker_index, 1, execution_time, "", context.sfm)))
+
+
+def test_projects_are_split_by_stable_hash(monkeypatch):
+    project_ids = [f"project-{i}" for i in range(20)]
+    assignments = []
+    for index in range(3):
+        monkeypatch.setattr(metrics_workers, "_worker", metrics_workers._Worker(index, 3, None))
+        assignments.append(metrics_workers.assigned_projects(project_ids))
+
+    assert sorted(sum(assignments, [])) == sorted(project_ids)
+    assert all(assignments)
+    assert assignments[1] == [project_id for project_id in project_ids if worker_index_of_project(project_id, 3) == 1]
+    # With one query for the whole metrics scope only the first worker polls
+    assert metrics_workers.assigned_projects(project_ids, metrics_scope_fan_in=True) == []
+
+
+def test_pollings_missing_reports_are_completed_by_later_polling():
+    aggregator = ReportAggregator(2)
+
+    assert aggregator.add(1, "worker-0") == []
+    assert aggregator.add(2, "worker-0") == []
+    assert aggregator.add(2, "worker-1") == [(1, ["worker-0"]), (2, ["worker-0", "worker-1"])]
+    assert aggregator.add(3, "worker-1") == []
+
+
+def test_sfm_of_workers_is_merged():
+    sfm = merge_sfm([_report(0, "project-a"), _report(1, "project-b", DynatraceConnectivity.Other)])
+
+    assert sfm[SfmKeys.dynatrace_request_count].value == {200: 2}
+    assert sfm[SfmKeys.dynatrace_ingest_lines_ok_count].value == {"project-a": 10, "project-b": 10}
+    assert sfm[SfmKeys.fetch_gcp_data_execution_time].value == {"project-a": 1.5, "project-b": 1.5}
+    assert sfm[SfmKeys.dynatrace_connectivity].value == DynatraceConnectivity.Other
+
+
+def test_workers_get_services_only_when_changed():
+    polling_queues = [Mock(), Mock()]
+    dispatch_polling = run_docker.dispatch_to_workers(polling_queues)
+    services = [Mock(), Mock()]
+
+    dispatch_polling(1, list(services))
+    dispatch_polling(2, list(services))
+    dispatch_polling(3, services[:1])
+
+    orders = [call.args[0] for call in polling_queues[1].put.call_args_list]
+    assert orders == [call.args[0] for call in polling_queues[0].put.call_args_list]
+    assert [order.polling_number for order in orders] == [1, 2, 3]
+    assert [order.services for order in orders] == [services, None, services[:1]]
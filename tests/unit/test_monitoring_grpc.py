@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+grpc = pytest.importorskip("grpc")
+types = pytest.importorskip("google.cloud.monitoring_v3").types
+
+from lib import metric_ingest, monitoring_grpc
+from lib.context import MetricsContext
+from lib.metric_ingest import fetch_metric
+from lib.metrics import GCPService, Metric
+from lib.utilities import NO_GROUPING_CATEGORY
+
+_END_TIME = datetime(2026, 7, 8, 17, 54, tzinfo=timezone.utc)
+_INT64 = 2
+_DISTRIBUTION = 5
+
+
+def _metric(value_type):
+    return Metric(
+        key="cloud.gcp.test.metric",
+        value="metric:cloudsql.googleapis.com/database/test",
+        type="gauge",
+        dimensions=[{"key": "state", "value": "label:metric.labels.state"}],
+        gcpOptions={"valueType": value_type, "metricKind": "GAUGE", "samplePeriod": 60, "ingestDelay": 60},
+    )
+
+
+def _service():
+    return GCPService(
+        service="cloudsql_database",
+        dimensions=[{"key": "database_id", "value": "label:resource.labels.database_id"}],
+        metrics=[],
+    )
+
+
+def _pages():
+    int_series = types.TimeSeries(
+        metric={"type": "cloudsql.googleapis.com/database/test", "labels": {"state": "up"}},
+        resource={"type": "cloudsql_database", "labels": {"database_id": "db-1", "project_id": "project"}},
+        metadata={"user_labels": {"env": "prod"}},
+        value_type=_INT64,
+        points=[{"interval": {"end_time": _END_TIME}, "value": {"int64_value": 42}}],
+    )
+    distribution_series = types.TimeSeries(
+        metric={"type": "cloudsql.googleapis.com/database/test", "labels": {"state": "down"}},
+        resource={"type": "cloudsql_database", "labels": {"database_id": "db-2", "project_id": "project"}},
+        value_type=_DISTRIBUTION,
+        points=[{"interval": {"end_time": _END_TIME}, "value": {"distribution_value": {
+            "count": 4, "mean": 2.5, "bucket_counts": [0, 3, 1],
+            "bucket_options": {"explicit_buckets": {"bounds": [1.0, 2.0, 4.0]}},
+        }}}],
+    )
+    return [
+        types.ListTimeSeriesResponse(time_series=[int_series], next_page_token="page-2"),
+        types.ListTimeSeriesResponse(time_series=[distribution_series]),
+    ]
+
+
+def test_response_to_page_matches_rest_body():
+    page = monitoring_grpc.response_to_page(types.ListTimeSeriesResponse.pb(_pages()[0]))
+
+    assert page == {
+        "timeSeries": [{
+            "valueType": "INT64",
+            "metric": {"type": "cloudsql.googleapis.com/database/test", "labels": {"state": "up"}},
+            "resource": {"type": "cloudsql_database", "labels": {"database_id": "db-1", "project_id": "project"}},
+            "metadata": {"userLabels": {"env": "prod"}},
+            "points": [{"interval": {"endTime": "2026-07-08T17:54:00Z"}, "value": {"int64Value": 42}}],
+        }],
+        "nextPageToken": "page-2",
+    }
+
+
+@pytest.mark.asyncio
+async def test_fetch_metric_pages_through_grpc_stand_in(monkeypatch):
+    requests = []
+    pages = _pages()
+
+    def list_time_series(request, _context):
+        requests.append(request)
+        return types.ListTimeSeriesResponse.pb(pages[1] if request.page_token else pages[0])
+
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler("google.monitoring.v3.MetricService", {
+        "ListTimeSeries": grpc.unary_unary_rpc_method_handler(
+            list_time_series,
+            request_deserializer=types.ListTimeSeriesRequest.pb().FromString,
+            response_serializer=types.ListTimeSeriesResponse.pb().SerializeToString,
+        )
+    }),))
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+
+    monkeypatch.setenv("GCP_MONITORING_GRPC_TARGET", f"127.0.0.1:{port}")
+    monkeypatch.setenv("GCP_MONITORING_GRPC_INSECURE", "true")
+    monkeypatch.setattr(metric_ingest, "METRICS_FETCH_BACKEND", "grpc")
+    monkeypatch.setattr(monitoring_grpc, "_channel", None)
+    context = MetricsContext(None, None, "owner", "token", datetime.now(timezone.utc), 60, "", "", False, False, None)
+
+    try:
+        lines = await fetch_metric(context, "project", _service(), _metric("INT64"), [], NO_GROUPING_CATEGORY)
+    finally:
+        await server.stop(None)
+
+    assert [request.page_token for request in requests] == ["", "page-2"]
+    assert requests[0].name == "projects/project"
+    assert list(requests[0].aggregation.group_by_fields) == ["resource.labels.database_id", "metric.labels.state"]
+    assert [line.value for line in lines] == [42, "min=1.0,max=4.0,count=4,sum=10.0"]
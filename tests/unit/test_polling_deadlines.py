@@ -0,0 +1,85 @@
+import asyncio
+import math
+import time
+from datetime import datetime
+
+from lib.context import MetricsContext
+from lib.metrics import GCPService
+from lib.polling_deadlines import PollingDeadlines, polling_deadlines_from_config
+from lib.sfm.for_metrics.metrics_definitions import SfmKeys
+
+gce_service = GCPService(service="gce_instance")
+sql_service = GCPService(service="cloudsql_database")
+
+
+def _context():
+    return MetricsContext(None, None, "owner", "", datetime.utcnow(), 0, "", "", False, False, None)
+
+
+async def _slow_fetch():
+    await asyncio.sleep(0.2)
+    return ["line"]
+
+
+def test_normal_priority_work_is_shed_before_critical():
+    context = _context()
+
+    async def run():
+        deadlines = PollingDeadlines(start=time.monotonic(), timeout_seconds=0.5, push_reserve_seconds=0.1,
+                                     normal_priority_shed_seconds=0.3, critical_services=["gce_instance"])
+        return await asyncio.gather(
+            deadlines.run_fetch(context, "project-a", gce_service, _slow_fetch()),
+            deadlines.run_fetch(context, "project-a", sql_service, _slow_fetch()),
+        )
+
+    critical_lines, normal_lines = asyncio.run(run())
+
+    assert critical_lines == ["line"]
+    assert normal_lines == []
+    assert context.sfm[SfmKeys.shed_fetch_tasks].value == {("project-a", "normal"): 1}
+
+
+def test_project_and_service_deadlines_apply_to_critical_work():
+    deadlines = PollingDeadlines(start=100, timeout_seconds=300, push_reserve_seconds=60,
+                                 normal_priority_shed_seconds=30, project_deadline_seconds=200,
+                                 critical_projects=["project-a"])
+
+    assert deadlines.fetch_deadline("project-a", "gce_instance") == 300
+    assert deadlines.fetch_deadline("project-b", "gce_instance") == 300
+    deadlines.project_deadline_seconds = 0
+    assert deadlines.fetch_deadline("project-a", "gce_instance") == 340
+    assert deadlines.fetch_deadline("project-b", "gce_instance") == 310
+    deadlines.service_deadline_seconds = 50
+    assert deadlines.fetch_deadline("project-a", "gce_instance") == 150
+
+
+def test_project_and_service_budgets_start_with_their_fetching():
+    now = 100
+    deadlines = PollingDeadlines(start=0, timeout_seconds=300, project_deadline_seconds=200,
+                                 service_deadline_seconds=50, clock=lambda: now)
+
+    deadlines.start_project("project-a")
+    asyncio.run(deadlines.run_fetch(_context(), "project-a", gce_service, _slow_fetch()))
+    now = 120
+    deadlines.start_project("project-a")
+
+    assert deadlines.fetch_deadline("project-a", "gce_instance") == 150
+    assert deadlines.fetch_deadline("project-a", "cloudsql_database") == 50
+    assert deadlines.fetch_deadline("project-b", "gce_instance") == 50
+
+
+def test_critical_projects_come_first():
+    deadlines = PollingDeadlines(start=0, timeout_seconds=300, critical_projects=["project-c"],
+                                 critical_services=["cloudsql_database"])
+
+    assert deadlines.sort_projects(["project-a", "project-c", "project-b"]) == ["project-c", "project-a", "project-b"]
+    assert deadlines.fetch_deadline("project-a", "gce_instance") == math.inf
+
+
+def test_push_is_reserved_by_default(monkeypatch):
+    deadlines = polling_deadlines_from_config(0, 300)
+    # Without critical projects or services everything is normal priority, nothing is shed earlier
+    assert deadlines.fetch_deadline("project-a", "gce_instance") == 300 - 30
+
+    monkeypatch.setenv("POLLING_PUSH_RESERVE_SECONDS", "0")
+    assert polling_deadlines_from_config(0, 300) is None
@@ -7,7 +7,14 @@ import run_docker
 
 
 def asyncio_run_with_timeout(coro, timeout_s):
-    asyncio.run(asyncio.wait_for(coro, timeout_s))
+    async def run():
+        try:
+            await asyncio.wait_for(coro, timeout_s)
+        finally:
+            # Shared sessions belong to the loop of the test
+            await run_docker.connection_manager.close()
+
+    asyncio.run(run())
 
 
 @mock.patch('run_docker.sfm_send_loop_timeouts')
@@ -108,3 +115,86 @@ def test_query_loop_services_dont_accumulate_with_autodiscovery(
         # Must always be 3 (2 base + 1 autodiscovery), never growing across iterations
         assert len(called_services) == 3
 
+
+
+@mock.patch('run_docker.sfm_send_loop_timeouts')
+@mock.patch('run_docker.metrics_pre_launch_check')
+def test_query_loop_overlapping_pollings(
+        mock_metrics_pre_launch_check,
+        mock_sfm_send_loop_timeouts: AsyncMock,
+):
+    mock_metrics_pre_launch_check.return_value = run_docker.PreLaunchCheckResult(services=[], extension_versions={})
+
+    run_docker.SFM_ENABLED = False
+    run_docker.QUERY_INTERVAL_SEC = 1
+    run_docker.QUERY_TIMEOUT_SEC = 10
+    run_docker.MAX_CONCURRENT_POLLINGS = 2
+    query_length_sec = 2.5
+    run_loop_for_sec = 3.5
+
+    # pollings start at 0s and 1s, the one due at 2s waits for the first to finish at 2.5s
+    # without overlapping only the one at 0s and 2.5s would start
+
+    running = []
+    max_running = 0
+
+    async def async_dynatrace_gcp_extension_long_worker_mock(services):
+        nonlocal max_running
+        running.append(services)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(query_length_sec)
+        running.pop()
+
+    try:
+        with mock.patch('run_docker.async_dynatrace_gcp_extension', wraps=async_dynatrace_gcp_extension_long_worker_mock) as mock_async_dynatrace_gcp_extension:
+            try:
+                asyncio_run_with_timeout(run_docker.run_metrics_fetcher_forever(), run_loop_for_sec)
+            except TimeoutError:
+                pass
+
+            assert mock_async_dynatrace_gcp_extension.call_count == 3
+            assert max_running == 2
+    finally:
+        run_docker.MAX_CONCURRENT_POLLINGS = 1
+
+
+@mock.patch('run_docker.logging_context')
+@mock.patch('run_docker.async_dynatrace_gcp_extension')
+def test_failure_of_overlapping_polling_is_logged(
+        mock_async_dynatrace_gcp_extension: AsyncMock,
+        mock_logging_context: Mock,
+):
+    mock_async_dynatrace_gcp_extension.side_effect = RuntimeError("no more sockets")
+    run_docker.SFM_ENABLED = False
+
+    async def run_polling():
+        polling = run_docker.start_polling_task([], 1)
+        await asyncio.wait([polling])
+        await asyncio.sleep(0)
+
+    asyncio.run(run_polling())
+
+    mock_logging_context.error.assert_called_once_with('MAIN_LOOP', 'Polling failed: RuntimeError: no more sockets')
+
+
+@mock.patch('run_docker.async_dynatrace_gcp_extension')
+@mock.patch('run_docker.metrics_pre_launch_check')
+def test_first_polling_does_not_wait_for_startup_checks(
+        mock_metrics_pre_launch_check,
+        mock_async_dynatrace_gcp_extension: AsyncMock,
+):
+    mock_metrics_pre_launch_check.return_value = run_docker.PreLaunchCheckResult(services=[], extension_versions={})
+    run_docker.SFM_ENABLED = False
+    run_docker.QUERY_INTERVAL_SEC = 10
+
+    async def slow_instance_metadata_check():
+        await asyncio.sleep(10)
+
+    with mock.patch('run_docker.run_instance_metadata_check', wraps=slow_instance_metadata_check) as mock_check:
+        try:
+            asyncio_run_with_timeout(run_docker.run_metrics_mode(), 1)
+        except TimeoutError:
+            pass
+
+        mock_check.assert_called_once()
+    assert mock_async_dynatrace_gcp_extension.call_count == 1
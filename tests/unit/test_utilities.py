@@ -1,7 +1,7 @@
 import os
 from unittest.mock import patch
 
-from lib.utilities import safe_read_yaml
+from lib.utilities import ConfigFileCache, safe_read_yaml
 
 
 def test_safe_read_yaml_logs_on_file_error_fallback(tmp_path):
@@ -38,3 +38,37 @@ def test_safe_read_yaml_returns_empty_dict_on_empty_file(tmp_path):
     result = safe_read_yaml(str(yaml_file), "UNUSED_ENV_VAR")
 
     assert result == {}
+
+
+def test_config_file_cache_reads_file_again_only_when_changed(tmp_path):
+    """ConfigFileCache parses a file once and again after its size or mtime changed."""
+    yaml_file = tmp_path / "config.yaml"
+    yaml_file.write_text("services: [a]\n")
+    cache = ConfigFileCache()
+
+    with patch("lib.utilities.safe_read_yaml", wraps=safe_read_yaml) as read:
+        first = cache.read_yaml(str(yaml_file), "UNUSED_ENV_VAR")
+        assert cache.read_yaml(str(yaml_file), "UNUSED_ENV_VAR") is first
+        assert read.call_count == 1
+
+        yaml_file.write_text("services: [a, b]\n")
+
+        assert cache.read_yaml(str(yaml_file), "UNUSED_ENV_VAR") == {"services": ["a", "b"]}
+        assert read.call_count == 2
+
+
+def test_config_file_cache_follows_env_var_of_missing_file(tmp_path):
+    """ConfigFileCache parses the fallback env var again only when its value changed."""
+    non_existent_file = str(tmp_path / "does_not_exist.yaml")
+    cache = ConfigFileCache()
+
+    with patch.dict(os.environ, {"TEST_FALLBACK_VAR": "key: value"}):
+        with patch("lib.utilities.safe_read_yaml", wraps=safe_read_yaml) as read:
+            cache.read_yaml(non_existent_file, "TEST_FALLBACK_VAR")
+            cache.read_yaml(non_existent_file, "TEST_FALLBACK_VAR")
+            assert read.call_count == 1
+
+            os.environ["TEST_FALLBACK_VAR"] = "key: other"
+
+            assert cache.read_yaml(non_existent_file, "TEST_FALLBACK_VAR") == {"key": "other"}
+            assert read.call_count == 2